@@ -0,0 +1,342 @@
+"""Adaptive fetch scheduling: market activity, error backoff, rate budget and calendar.
+
+:class:`AdaptivePollClock` is a drop-in for :class:`pipeline.FixedRateClock`
+that decides when the next chain fetch happens:
+
+* it tightens the interval (down to ``min_interval``) after a frame with a
+  large spot move or per-strike gamma exposure change, and relaxes it (up to
+  ``max_interval``) while the chain is quiet;
+* after failed fetches it backs off exponentially with jitter;
+* fetches draw from a token bucket sized to a share of the broker's rate
+  limit, so bursts of fast polling cannot exhaust the quota;
+* outside the sessions of a :class:`TradingCalendar` it sleeps until the
+  next open instead of polling.
+
+The clock reads time only through ``clock`` (monotonic seconds) and ``now``
+(wall time), and sleeps only through the ``stop_event`` it is given, so it
+can be driven by a simulated clock (``python -m benchmarks.poll_simulation``).
+"""
+
+import datetime
+import functools
+import random
+import threading
+import time
+from typing import Callable, Dict, FrozenSet, Iterable, Optional, Tuple
+
+import pytz
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> datetime.date:
+    """Return the ``n``-th ``weekday`` of the month; negative ``n`` counts from the end."""
+
+    if n > 0:
+        first = datetime.date(year, month, 1)
+        return first + datetime.timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = datetime.date(year + month // 12, month % 12 + 1, 1) - datetime.timedelta(days=1)
+    return last - datetime.timedelta(days=(last.weekday() - weekday) % 7 + 7 * (-n - 1))
+
+
+def _easter(year: int) -> datetime.date:
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)."""
+
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+def _observed(day: datetime.date) -> datetime.date:
+    """Move a fixed-date holiday falling on a weekend to the nearest weekday."""
+
+    if day.weekday() == 5:
+        return day - datetime.timedelta(days=1)
+    if day.weekday() == 6:
+        return day + datetime.timedelta(days=1)
+    return day
+
+
+class TradingCalendar:
+    """US exchange sessions: weekends, NYSE holidays and early closes.
+
+    Holidays follow the NYSE rules (New Year's Day is not moved back to a
+    Friday).  Sessions run from ``open_time`` to ``close_time`` (16:15 by
+    default, when index options stop trading) or ``early_close_time`` on
+    the days before Independence Day and Christmas and after Thanksgiving.
+    ``extra_holidays`` and ``extra_early_closes`` cover unscheduled closures.
+    """
+
+    def __init__(
+        self,
+        timezone: str = "US/Eastern",
+        open_time: datetime.time = datetime.time(9, 30),
+        close_time: datetime.time = datetime.time(16, 15),
+        early_close_time: datetime.time = datetime.time(13, 15),
+        extra_holidays: Iterable[datetime.date] = (),
+        extra_early_closes: Iterable[datetime.date] = (),
+    ):
+        self.timezone = pytz.timezone(timezone)
+        self.open_time = open_time
+        self.close_time = close_time
+        self.early_close_time = early_close_time
+        self.extra_holidays = frozenset(extra_holidays)
+        self.extra_early_closes = frozenset(extra_early_closes)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def holidays(year: int) -> Dict[datetime.date, str]:
+        days = {
+            _nth_weekday(year, 1, 0, 3): "Martin Luther King Jr. Day",
+            _nth_weekday(year, 2, 0, 3): "Washington's Birthday",
+            _easter(year) - datetime.timedelta(days=2): "Good Friday",
+            _nth_weekday(year, 5, 0, -1): "Memorial Day",
+            _observed(datetime.date(year, 7, 4)): "Independence Day",
+            _nth_weekday(year, 9, 0, 1): "Labor Day",
+            _nth_weekday(year, 11, 3, 4): "Thanksgiving Day",
+            _observed(datetime.date(year, 12, 25)): "Christmas Day",
+        }
+        new_year = datetime.date(year, 1, 1)
+        if new_year.weekday() != 5:
+            days[_observed(new_year)] = "New Year's Day"
+        if year >= 2022:
+            days[_observed(datetime.date(year, 6, 19))] = "Juneteenth"
+        return days
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def early_closes(year: int) -> FrozenSet[datetime.date]:
+        holidays = TradingCalendar.holidays(year)
+        candidates = (
+            datetime.date(year, 7, 3),
+            _nth_weekday(year, 11, 3, 4) + datetime.timedelta(days=1),
+            datetime.date(year, 12, 24),
+        )
+        return frozenset(day for day in candidates if day.weekday() < 5 and day not in holidays)
+
+    def is_trading_day(self, day: datetime.date) -> bool:
+        return day.weekday() < 5 and day not in self.holidays(day.year) and day not in self.extra_holidays
+
+    def session(self, day: datetime.date) -> Optional[Tuple[datetime.datetime, datetime.datetime]]:
+        """Return the ``(open, close)`` times of ``day``, or ``None`` if the market is closed."""
+
+        if not self.is_trading_day(day):
+            return None
+        early = day in self.early_closes(day.year) or day in self.extra_early_closes
+        close = self.early_close_time if early else self.close_time
+        return (
+            self.timezone.localize(datetime.datetime.combine(day, self.open_time)),
+            self.timezone.localize(datetime.datetime.combine(day, close)),
+        )
+
+    def _local(self, now: datetime.datetime) -> datetime.datetime:
+        return self.timezone.localize(now) if now.tzinfo is None else now.astimezone(self.timezone)
+
+    def is_open(self, now: datetime.datetime) -> bool:
+        """Whether ``now`` (naive times are in the calendar's timezone) is within a session."""
+
+        now = self._local(now)
+        session = self.session(now.date())
+        return session is not None and session[0] <= now <= session[1]
+
+    def next_open(self, now: datetime.datetime) -> datetime.datetime:
+        """Return ``now`` during a session, otherwise the start of the next one."""
+
+        now = self._local(now)
+        day = now.date()
+        while True:
+            session = self.session(day)
+            if session is not None and now <= session[1]:
+                return max(now, session[0])
+            day += datetime.timedelta(days=1)
+
+
+class AdaptivePollClock:
+    """Schedule fetches by market activity, errors, rate budget and trading calendar.
+
+    Parameters
+    ----------
+    interval, min_interval, max_interval:
+        Starting interval in seconds and its bounds.
+    tighten, relax:
+        Factors applied to the interval after an active or a quiet tick.
+        Ticks in between move the interval halfway back to ``interval``.
+    spot_threshold, change_threshold:
+        A frame scores 1 ("active") for a spot move of ``spot_threshold``
+        (a fraction of spot) or a per-strike exposure change of
+        ``change_threshold`` of the gross per-strike exposure, whichever is
+        larger.  Scores of ``active_level`` or more tighten; scores of
+        ``quiet_level`` or less relax.
+    requests_per_poll, rate_limit, budget, burst_polls:
+        Each fetch costs ``requests_per_poll`` requests; fetches are limited
+        to ``budget`` of ``rate_limit`` requests per second with bursts of
+        ``burst_polls`` fetches.
+    error_backoff, max_backoff:
+        The ``n``-th consecutive failure delays the next fetch by
+        ``error_backoff * 2 ** (n - 1)`` seconds, capped at ``max_backoff``
+        and scaled by a random factor in [0.5, 1), but never by less than
+        the current interval.
+    calendar:
+        :class:`TradingCalendar` whose closed periods are slept through.
+    """
+
+    def __init__(
+        self,
+        interval: float = 5.0,
+        min_interval: float = 1.0,
+        max_interval: float = 30.0,
+        tighten: float = 0.5,
+        relax: float = 1.25,
+        spot_threshold: float = 0.0005,
+        change_threshold: float = 0.02,
+        active_level: float = 1.0,
+        quiet_level: float = 0.25,
+        requests_per_poll: int = 1,
+        rate_limit: float = 2.0,
+        budget: float = 0.8,
+        burst_polls: float = 5.0,
+        error_backoff: float = 2.0,
+        max_backoff: float = 120.0,
+        calendar: Optional[TradingCalendar] = None,
+        clock: Callable[[], float] = time.monotonic,
+        now: Callable[[], datetime.datetime] = lambda: datetime.datetime.now(pytz.utc),
+        rng: Optional[random.Random] = None,
+    ):
+        if not 0 < min_interval <= interval <= max_interval:
+            raise ValueError("Expected 0 < min_interval <= interval <= max_interval")
+        self.base_interval = interval
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.tighten = tighten
+        self.relax = relax
+        self.spot_threshold = spot_threshold
+        self.change_threshold = change_threshold
+        self.active_level = active_level
+        self.quiet_level = quiet_level
+        self.poll_rate = rate_limit * budget / requests_per_poll
+        self.burst_polls = burst_polls
+        self.error_backoff = error_backoff
+        self.max_backoff = max_backoff
+        self.calendar = calendar
+        self.clock = clock
+        self.now = now
+        self.rng = rng or random.Random()
+        self.skipped = 0
+        self.failures = 0
+        self.backoff = 0.0
+        self.closed_seconds = 0.0
+        self._lock = threading.Lock()
+        self._activity: Optional[float] = None
+        self._last_spot: Dict[Optional[str], float] = {}
+        self._last_tick: Optional[float] = None
+        self._tokens = burst_polls
+        self._updated = clock()
+
+    def score(self, frame, key: Optional[str] = None) -> float:
+        """Return the activity score of an analysis frame (see the class parameters)."""
+
+        spot = frame.spot_price
+        previous = self._last_spot.get(key)
+        self._last_spot[key] = spot
+        spot_score = abs(spot - previous) / previous / self.spot_threshold if previous else 0.0
+        gross = sum(abs(value) for value in frame.per_strike_gamma_exposure.values())
+        changes = frame.change_in_gamma_per_strike
+        change_score = max(map(abs, changes.values())) / gross / self.change_threshold if changes and gross else 0.0
+        return max(spot_score, change_score)
+
+    def observe(self, frame, key: Optional[str] = None) -> None:
+        """Record an analysis frame; the most active frame since the last tick sets the pace."""
+
+        with self._lock:
+            activity = self.score(frame, key)
+            self._activity = activity if self._activity is None else max(self._activity, activity)
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.backoff = 0.0
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            delay = min(self.max_backoff, self.error_backoff * 2 ** (self.failures - 1))
+            self.backoff = delay * self.rng.uniform(0.5, 1.0)
+
+    def _adapt(self) -> None:
+        activity, self._activity = self._activity, None
+        if activity is None:
+            return
+        if activity >= self.active_level:
+            self.interval = max(self.min_interval, self.interval * self.tighten)
+        elif activity <= self.quiet_level:
+            self.interval = min(self.max_interval, self.interval * self.relax)
+        else:
+            self.interval += (self.base_interval - self.interval) / 2
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst_polls, self._tokens + (now - self._updated) * self.poll_rate)
+        self._updated = now
+
+    def next_delay(self) -> float:
+        """Seconds until the next fetch may start, ignoring the calendar."""
+
+        with self._lock:
+            now = self.clock()
+            delay = 0.0
+            if self._last_tick is not None:
+                # Backoff only ever slows polling down
+                step = max(self.interval, self.backoff) if self.failures else self.interval
+                delay = self._last_tick + step - now
+                if delay < -step:
+                    self.skipped += int(-delay // step)
+                delay = max(delay, 0.0)
+            self._refill(now)
+            tokens = self._tokens + delay * self.poll_rate
+            if tokens < 1:
+                delay += (1 - tokens) / self.poll_rate
+            return delay
+
+    def wait(self, stop_event: threading.Event) -> bool:
+        """Sleep until the next fetch; return ``False`` if ``stop_event`` was set."""
+
+        with self._lock:
+            self._adapt()
+        while True:
+            if self.calendar is not None:
+                wall = self.now()
+                if not self.calendar.is_open(wall):
+                    closed = (self.calendar.next_open(wall) - wall).total_seconds()
+                    self.closed_seconds += closed
+                    self._last_tick = None  # the first fetch of a session starts at the open
+                    if stop_event.wait(closed):
+                        return False
+            delay = self.next_delay()
+            if delay > 0 and stop_event.wait(delay):
+                return False
+            if stop_event.is_set():
+                return False
+            # The session may have closed during the delay
+            if self.calendar is None or self.calendar.is_open(self.now()):
+                break
+        with self._lock:
+            self._last_tick = self.clock()
+            self._refill(self._last_tick)
+            self._tokens -= 1
+        return True
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "interval": self.interval,
+                "failures": self.failures,
+                "backoff": self.backoff,
+                "skipped": self.skipped,
+                "budget_polls": self._tokens,
+                "closed_seconds": self.closed_seconds,
+            }
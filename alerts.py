@@ -0,0 +1,526 @@
+"""Strike-level change detection and alerting off the analysis path.
+
+:class:`AlertEngine` receives every analysed frame from
+:class:`pipeline.PipelinedRunner` (``observe`` only queues it) and evaluates
+its rules on a worker thread, so alerting adds no latency to fetching,
+analysis or rendering.  Rules are compiled into arrays and evaluated against
+all strikes of a frame at once, as a ``rules x strikes`` matrix:
+
+* ``threshold`` rules compare a strike's ``change`` (the frame's
+  ``change_in_gamma_per_strike``) or ``exposure``, or the frame's ``total``
+  exposure or ``spot`` price, with a fixed level;
+* ``zscore`` rules compare a strike's change with the rolling mean and
+  standard deviation of that strike's previous changes
+  (:class:`StrikeBaselines`);
+* ``flip`` fires when the total gamma exposure changes sign.
+
+A rule fires when its condition becomes true, not on every frame it stays
+true, and at most once per ``cooldown`` seconds for a strike.  Events go to
+every sink: a JSON Lines file, UDP datagrams or an HTTP webhook.
+
+Rules are written as ``[name=]expression[@low-high]``, for example::
+
+    ALERT_RULES='|z|>3,big=|change|>0.5,exposure<-2@5000-5400,total<0,flip'
+    ALERT_SINKS='alerts.jsonl,udp://127.0.0.1:9999' python main.py
+"""
+
+import json
+import queue
+import re
+import socket
+import threading
+import urllib.request
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from metrics import MetricsRegistry
+
+STRIKE_FIELDS: Tuple[str, ...] = ("change", "exposure", "z")
+FRAME_FIELDS: Tuple[str, ...] = ("total", "spot")
+
+_EXPRESSION = re.compile(
+    r"(?P<abs>\|?)(?P<field>change|exposure|z|total|spot)(?P=abs)\s*(?P<op>[<>])\s*(?P<threshold>[-+]?[\d.]+(?:e[-+]?\d+)?)"
+)
+
+
+@dataclass(frozen=True)
+class AlertRule:
+    """One alert condition.
+
+    ``field`` is ``change``, ``exposure`` or ``z`` (the change in standard
+    deviations of the strike's baseline) per strike, or ``total``/``spot``
+    per frame.  ``op`` is ``">"``, ``"<"`` or ``"|>|"`` (absolute value
+    above).  ``strikes`` limits per-strike rules to an inclusive range.
+    ``kind`` is derived: ``threshold``, ``zscore`` or ``flip``.
+    """
+
+    name: str
+    field: str
+    op: str = ">"
+    threshold: float = 0.0
+    strikes: Optional[Tuple[float, float]] = None
+    flip: bool = False
+
+    def __post_init__(self):
+        if self.field not in STRIKE_FIELDS + FRAME_FIELDS:
+            raise ValueError(f"Unknown alert field {self.field!r}; expected one of {STRIKE_FIELDS + FRAME_FIELDS}")
+        if self.op not in (">", "<", "|>|"):
+            raise ValueError(f"Unknown alert operator {self.op!r}")
+
+    @property
+    def kind(self) -> str:
+        if self.flip:
+            return "flip"
+        return "zscore" if self.field == "z" else "threshold"
+
+    @property
+    def per_strike(self) -> bool:
+        return self.field in STRIKE_FIELDS and not self.flip
+
+    def describe(self) -> str:
+        if self.flip:
+            return "total gamma exposure changed sign"
+        if self.op == "|>|":
+            return f"|{self.field}| > {self.threshold:g}"
+        return f"{self.field} {self.op} {self.threshold:g}"
+
+
+def parse_alert_rules(spec: str) -> List[AlertRule]:
+    """Parse ``"|z|>3,big=|change|>0.5,total<0@5000-5400,flip"`` into rules."""
+
+    rules = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, expression = entry.rpartition("=")
+        expression, _, strike_range = expression.partition("@")
+        strikes = None
+        if strike_range:
+            low, _, high = strike_range.partition("-")
+            strikes = (float(low), float(high or low))
+        if expression.strip() == "flip":
+            rules.append(AlertRule(name or entry, "total", flip=True))
+            continue
+        match = _EXPRESSION.fullmatch(expression.strip())
+        if match is None or (match["abs"] and match["op"] != ">"):
+            raise ValueError(f"Invalid alert rule {entry!r}")
+        op = "|>|" if match["abs"] else match["op"]
+        rules.append(AlertRule(name or entry, match["field"], op, float(match["threshold"]), strikes))
+    return rules
+
+
+class AlertEvent(NamedTuple):
+    """A fired rule; ``strike`` is ``None`` for frame-level rules."""
+
+    timestamp: datetime
+    key: Optional[str]
+    rule: str
+    strike: Optional[float]
+    value: float
+    threshold: float
+    message: str
+
+    def to_dict(self) -> Dict:
+        event = self._asdict()
+        event["timestamp"] = self.timestamp.isoformat()
+        return event
+
+
+class StrikeBaselines:
+    """Rolling mean and standard deviation of each strike's last ``window`` changes.
+
+    Strikes get a column the first time they are seen; the values of all
+    columns live in one ``window x strikes`` ring array, so updating and
+    scoring a frame are a few vectorized operations whatever the number of
+    strikes.  Scores need ``min_samples`` previous values.
+    """
+
+    def __init__(self, window: int = 100, min_samples: int = 20):
+        if window < 2:
+            raise ValueError("window must be at least 2")
+        self.window = window
+        self.min_samples = min(min_samples, window)
+        self.strikes = np.empty(0, dtype=np.float64)
+        self._columns: Dict[float, int] = {}
+        self._values = np.full((window, 0), np.nan)
+        self._next = np.zeros(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.strikes)
+
+    def columns(self, strikes: Iterable[float]) -> np.ndarray:
+        """Return the column of each strike, adding columns for new strikes."""
+
+        columns = self._columns
+        indexes = np.fromiter((columns.setdefault(strike, len(columns)) for strike in strikes), dtype=np.int64)
+        added = len(columns) - len(self.strikes)
+        if added:
+            self.strikes = np.fromiter(columns, dtype=np.float64, count=len(columns))
+            self._values = np.hstack((self._values, np.full((self.window, added), np.nan)))
+            self._next = np.concatenate((self._next, np.zeros(added, dtype=np.int64)))
+        return indexes
+
+    def statistics(self, columns: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return ``(count, mean, std)`` of the given columns."""
+
+        values = self._values[:, _selector(columns, len(self.strikes))]
+        valid = np.isfinite(values)
+        count = valid.sum(axis=0)
+        filled = np.where(valid, values, 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = filled.sum(axis=0) / count
+            variance = np.where(valid, (values - mean) ** 2, 0.0).sum(axis=0) / count
+        return count, mean, np.sqrt(variance)
+
+    def zscores(self, columns: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """Score ``values`` against the baselines of ``columns``; ``NaN`` where there is no baseline yet."""
+
+        count, mean, std = self.statistics(columns)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scores = (values - mean) / std
+        return np.where((count >= self.min_samples) & (std > 0), scores, np.nan)
+
+    def update(self, columns: np.ndarray, values: np.ndarray) -> None:
+        """Add the finite ``values`` to the baselines of their ``columns``."""
+
+        finite = np.isfinite(values)
+        columns = columns[finite]
+        self._values[self._next[columns], columns] = values[finite]
+        self._next[columns] = (self._next[columns] + 1) % self.window
+
+
+class _KeyState:
+    """Per-pipeline evaluation state: baselines and which rules are currently true."""
+
+    def __init__(self, strike_rules: int, frame_rules: int, window: int, min_samples: int):
+        self.baselines = StrikeBaselines(window, min_samples)
+        self.active = np.zeros((strike_rules, 0), dtype=bool)
+        self.fired_at = np.zeros((strike_rules, 0))
+        self.frame_active = np.zeros(frame_rules, dtype=bool)
+        self.frame_fired_at = np.full(frame_rules, -np.inf)
+        self.previous_total: Optional[float] = None
+
+    def grow(self) -> None:
+        added = len(self.baselines) - self.active.shape[1]
+        if added:
+            self.active = np.hstack((self.active, np.zeros((len(self.active), added), dtype=bool)))
+            self.fired_at = np.hstack((self.fired_at, np.full((len(self.fired_at), added), -np.inf)))
+
+
+class _CompiledRules(NamedTuple):
+    """Per-strike rules as arrays: rule ``i`` holds where ``transforms[row[i]] > bound[i]``.
+
+    ``transforms`` are the distinct ``(field, absolute, direction)`` views of
+    the strike fields, so ``>``, ``<`` and ``|>|`` all become ``>`` and each
+    view is computed once however many rules share it.
+    """
+
+    transforms: Tuple[Tuple[int, bool, float], ...]
+    row: np.ndarray
+    field: np.ndarray
+    bound: np.ndarray
+    ranged: np.ndarray
+    low: np.ndarray
+    high: np.ndarray
+
+
+def _compile(rules: Sequence[AlertRule]) -> _CompiledRules:
+    transforms: Dict[Tuple[int, bool, float], int] = {}
+    rows, bounds = [], []
+    for rule in rules:
+        direction = -1.0 if rule.op == "<" else 1.0
+        transform = (STRIKE_FIELDS.index(rule.field), rule.op == "|>|", direction)
+        rows.append(transforms.setdefault(transform, len(transforms)))
+        bounds.append(rule.threshold * direction)
+    ranged = [index for index, rule in enumerate(rules) if rule.strikes]
+    return _CompiledRules(
+        tuple(transforms),
+        np.array(rows, dtype=np.int64),
+        np.array([STRIKE_FIELDS.index(rule.field) for rule in rules], dtype=np.int64),
+        np.array(bounds, dtype=np.float64)[:, None],
+        np.array(ranged, dtype=np.int64),
+        np.array([rules[index].strikes[0] for index in ranged], dtype=np.float64)[:, None],
+        np.array([rules[index].strikes[1] for index in ranged], dtype=np.float64)[:, None],
+    )
+
+
+def _selector(columns: np.ndarray, size: int):
+    """Index ``columns`` of ``size`` columns, as a slice (a view) when they are all of them in order."""
+
+    if len(columns) == size and (columns == np.arange(size)).all():
+        return slice(None)
+    return columns
+
+
+class JsonLinesSink:
+    """Append events to a JSON Lines file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", buffering=1)
+
+    def emit(self, events: Sequence[AlertEvent]) -> None:
+        self._file.write("".join(json.dumps(event.to_dict()) + "\n" for event in events))
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class UdpSink:
+    """Send each event as a JSON datagram, e.g. to a local collector or ``nc -ul``."""
+
+    def __init__(self, host: str, port: int):
+        self.address = (host, port)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def emit(self, events: Sequence[AlertEvent]) -> None:
+        for event in events:
+            self._socket.sendto(json.dumps(event.to_dict()).encode(), self.address)
+
+    def close(self) -> None:
+        self._socket.close()
+
+
+class WebhookSink:
+    """POST the events of a frame as a JSON array to ``url``."""
+
+    def __init__(self, url: str, timeout: float = 2.0):
+        self.url = url
+        self.timeout = timeout
+
+    def emit(self, events: Sequence[AlertEvent]) -> None:
+        body = json.dumps([event.to_dict() for event in events]).encode()
+        request = urllib.request.Request(self.url, body, {"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def close(self) -> None:
+        pass
+
+
+class PrintSink:
+    """Print each event's message."""
+
+    def emit(self, events: Sequence[AlertEvent]) -> None:
+        for event in events:
+            print(event.message)
+
+    def close(self) -> None:
+        pass
+
+
+def create_sink(target: str):
+    """Build a sink from ``-`` (stdout), ``udp://host:port``, an ``http(s)://`` URL or a file path."""
+
+    if target == "-":
+        return PrintSink()
+    if target.startswith("udp://"):
+        host, _, port = target[len("udp://"):].rpartition(":")
+        return UdpSink(host, int(port))
+    if target.startswith(("http://", "https://")):
+        return WebhookSink(target)
+    return JsonLinesSink(target)
+
+
+_STOP = object()
+
+
+class AlertEngine:
+    """Evaluate alert rules on analysed frames in a worker thread.
+
+    Parameters
+    ----------
+    rules:
+        :class:`AlertRule` instances, e.g. from :func:`parse_alert_rules`.
+    sinks:
+        Objects with ``emit(events)`` and ``close()``; see :func:`create_sink`.
+    window, min_samples:
+        Length of each strike's rolling baseline and the number of changes
+        it needs before ``z`` rules can fire.
+    cooldown:
+        Minimum seconds, in frame time, between two events of one rule for
+        one strike.
+    queue_size:
+        Frames waiting for evaluation; when the worker falls this far behind
+        the oldest frame is dropped (counted in the ``alerts`` stage).
+    metrics:
+        Registry receiving the ``alerts`` stage latency, drops and the
+        ``alerts_emitted`` counter.
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[AlertRule],
+        sinks: Sequence = (),
+        window: int = 100,
+        min_samples: int = 20,
+        cooldown: float = 0.0,
+        queue_size: int = 64,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        self.rules = tuple(rules)
+        self.sinks = list(sinks)
+        self.window = window
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.strike_rules = [rule for rule in self.rules if rule.per_strike]
+        self.frame_rules = [rule for rule in self.rules if not rule.per_strike]
+        self._compiled = _compile(self.strike_rules)
+        self._states: Dict[Optional[str], _KeyState] = {}
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self.metrics["alerts"]  # reported even before the first frame
+        self.metrics.gauge("alert_queue_depth", self._queue.qsize)
+
+    def observe(self, frame, key: Optional[str] = None) -> None:
+        """Queue ``frame`` (an :class:`pipeline.AnalysisFrame`) for evaluation without waiting."""
+
+        while True:
+            try:
+                self._queue.put_nowait((frame, key))
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    continue
+                self.metrics["alerts"].drop()
+
+    def start(self) -> "AlertEngine":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="alerts", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Evaluate the frames already queued, then stop the worker and close the sinks."""
+
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+        for sink in self.sinks:
+            sink.close()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            frame, key = item
+            try:
+                with self.metrics.time("alerts"):
+                    events = self.evaluate(frame, key)
+            except Exception as e:
+                print(f"An error occurred while evaluating alerts: {e}")
+                continue
+            if events:
+                self.metrics.increment("alerts_emitted", len(events))
+                self.emit(events)
+
+    def emit(self, events: List[AlertEvent]) -> None:
+        for sink in self.sinks:
+            try:
+                sink.emit(events)
+            except Exception as e:
+                print(f"Failed to deliver {len(events)} alerts to {type(sink).__name__}: {e}")
+
+    def evaluate(self, frame, key: Optional[str] = None) -> List[AlertEvent]:
+        """Evaluate every rule on ``frame``, advance the baselines and return the events."""
+
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _KeyState(
+                len(self.strike_rules), len(self.frame_rules), self.window, self.min_samples
+            )
+        seconds = frame.timestamp.timestamp()
+        events = self._evaluate_strikes(frame, key, state, seconds)
+        events.extend(self._evaluate_frame(frame, key, state, seconds))
+        return events
+
+    def _evaluate_strikes(self, frame, key, state: _KeyState, seconds: float) -> List[AlertEvent]:
+        exposure = frame.per_strike_gamma_exposure
+        changes = frame.change_in_gamma_per_strike
+        baselines = state.baselines
+        columns = baselines.columns(exposure)
+        change = np.fromiter((changes.get(strike, np.nan) for strike in exposure), dtype=np.float64, count=len(columns))
+        if not self.strike_rules:
+            baselines.update(columns, change)
+            return []
+        state.grow()
+        strikes = baselines.strikes[columns]
+        values = np.fromiter(exposure.values(), dtype=np.float64, count=len(columns))
+        scores = baselines.zscores(columns, change)
+        baselines.update(columns, change)
+
+        # One row per rule, one column per strike of this frame
+        compiled = self._compiled
+        fields = np.stack((change, values, scores))
+        transformed = np.stack([
+            np.abs(fields[field]) if absolute else fields[field] * direction
+            for field, absolute, direction in compiled.transforms
+        ])
+        with np.errstate(invalid="ignore"):
+            condition = transformed[compiled.row] > compiled.bound
+            if len(compiled.ranged):
+                condition[compiled.ranged] &= (strikes >= compiled.low) & (strikes <= compiled.high)
+        # Strikes usually arrive in the same order every frame; index with views then
+        selector = _selector(columns, state.active.shape[1])
+        fired = condition > state.active[:, selector]
+        state.active[:, selector] = condition
+
+        rule_indexes, positions = np.nonzero(fired)
+        if self.cooldown and len(rule_indexes):
+            strike_columns = columns[positions]
+            cooled = seconds - state.fired_at[rule_indexes, strike_columns] >= self.cooldown
+            rule_indexes, positions = rule_indexes[cooled], positions[cooled]
+            state.fired_at[rule_indexes, strike_columns[cooled]] = seconds
+
+        events = []
+        for rule_index, strike, value, strike_change in zip(
+            rule_indexes.tolist(),
+            strikes[positions].tolist(),
+            fields[compiled.field[rule_indexes], positions].tolist(),
+            change[positions].tolist(),
+        ):
+            rule = self.strike_rules[rule_index]
+            if rule.field == "z":
+                detail = f"change {strike_change:+.4g} is {value:+.1f} sd"
+            else:
+                detail = f"{rule.field} {value:+.4g}"
+            events.append(AlertEvent(
+                frame.timestamp, key, rule.name, strike, value, rule.threshold,
+                f"{key or 'GEX'} {rule.name}: strike {strike:g} {detail} ({rule.describe()})",
+            ))
+        return events
+
+    def _evaluate_frame(self, frame, key, state: _KeyState, seconds: float) -> List[AlertEvent]:
+        total = float(frame.total_gamma_exposure)
+        previous, state.previous_total = state.previous_total, total
+        events = []
+        for index, rule in enumerate(self.frame_rules):
+            value = total if rule.field == "total" else float(frame.spot_price)
+            if rule.flip:
+                condition = previous is not None and previous * total < 0
+                threshold = 0.0
+            else:
+                compared = abs(value) if rule.op == "|>|" else value * (-1.0 if rule.op == "<" else 1.0)
+                bound = rule.threshold * (-1.0 if rule.op == "<" else 1.0)
+                condition = compared > bound
+                threshold = rule.threshold
+            # Sign flips are edges already; levels fire when they are crossed
+            fired = condition and (rule.flip or not state.frame_active[index])
+            fired = fired and seconds - state.frame_fired_at[index] >= self.cooldown
+            state.frame_active[index] = condition
+            if fired:
+                state.frame_fired_at[index] = seconds
+                events.append(AlertEvent(
+                    frame.timestamp, key, rule.name, None, value, threshold,
+                    f"{key or 'GEX'} {rule.name}: {rule.field} {value:+.4g} ({rule.describe()})",
+                ))
+        return events
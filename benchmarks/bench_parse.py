@@ -0,0 +1,84 @@
+"""Decode and encode cost of option chain responses across chain sizes.
+
+Builds :class:`benchmarks.synthetic.SyntheticChain` responses (every contract
+carries the full set of quote fields, of which the analysis reads four) and
+times, per size:
+
+* ``json+flatten``: ``json.loads`` then :func:`gamma_analysis.flatten_option_chain`;
+* ``<backend>+flatten``: the same with the fastest installed JSON backend;
+* ``typed``: :func:`chain_parser.parse_chain_arrays`, straight to arrays;
+* ``dumps`` / ``raw text``: preparing the chain for storage by re-encoding it
+  versus passing the response through.
+
+``cycle`` compares a whole fetch-side pass (decode, flatten, encode) on the
+standard library against :class:`chain_parser.ChainPayload`::
+
+    python -m benchmarks.bench_parse
+    python -m benchmarks.bench_parse --sizes 50x1 1000x20 --repeat 5
+"""
+
+import argparse
+import json
+import time
+
+from benchmarks.synthetic import SyntheticChain
+from chain_parser import JSON_BACKEND, ChainPayload, loads, parse_chain_arrays
+from gamma_analysis import flatten_option_chain
+
+
+def _best_ms(function, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    return min(times) * 1000
+
+
+def run(strikes, expiries, repeat):
+    data = SyntheticChain(strikes, expiries).snapshot()
+    raw = json.dumps(data).encode()
+
+    def stdlib_cycle():
+        decoded = json.loads(raw)
+        flatten_option_chain(decoded)
+        json.dumps(decoded)
+
+    def payload_cycle():
+        payload = ChainPayload(raw)
+        payload.arrays()
+        payload.text
+
+    timings = {
+        "json+flatten": _best_ms(lambda: flatten_option_chain(json.loads(raw)), repeat),
+        f"{JSON_BACKEND}+flatten": _best_ms(lambda: flatten_option_chain(loads(raw)), repeat),
+        "typed": _best_ms(lambda: parse_chain_arrays(raw), repeat),
+        "dumps": _best_ms(lambda: json.dumps(data), repeat),
+        "raw text": _best_ms(lambda: raw.decode("utf-8"), repeat),
+        "cycle json": _best_ms(stdlib_cycle, repeat),
+        "cycle payload": _best_ms(payload_cycle, repeat),
+    }
+    return len(raw), timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", nargs="+", default=["50x1", "200x1", "200x5", "500x10"],
+        help="chain sizes as STRIKESxEXPIRIES",
+    )
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    print(f"JSON backend: {JSON_BACKEND}; best of {args.repeat}, ms")
+    for size in args.sizes:
+        strikes, expiries = (int(part) for part in size.split("x"))
+        nbytes, timings = run(strikes, expiries, args.repeat)
+        print(f"{size} ({2 * strikes * expiries} contracts, {nbytes / 1e6:.2f} MB)")
+        for name, ms in timings.items():
+            print(f"  {name:>16}: {ms:9.3f}")
+        print(f"  cycle speedup: {timings['cycle json'] / timings['cycle payload']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Per-frame rendering cost of the plotters over a simulated session.
+
+Feeds ``--ticks`` synthetic updates (5760 = eight hours at one tick every five
+seconds) through a plotter on the Agg backend and reports the mean frame time
+for each slice of the session.  A flat profile means redraw cost does not grow
+with session length::
+
+    python -m benchmarks.bench_render --mode retained
+    python -m benchmarks.bench_render --mode redraw --ticks 600
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import numpy as np  # noqa: E402
+
+from plotter import create_plotter  # noqa: E402
+
+
+def simulate_ticks(ticks, strikes=50, seed=0, interval=5.0):
+    """Yield ``(timestamp, exposure, change, largest_changes, total, spot)`` ticks."""
+
+    rng = np.random.default_rng(seed)
+    strike_values = [5000.0 + 5 * index for index in range(strikes)]
+    exposure = rng.normal(0, 0.5, strikes)
+    spot = 5200.0
+    start = datetime(2024, 5, 8, 13, 30, tzinfo=timezone.utc)
+    for tick in range(ticks):
+        timestamp = start + timedelta(seconds=interval * tick)
+        change = rng.normal(0, 0.05, strikes)
+        exposure = exposure + change
+        spot += rng.normal(0, 0.5)
+        top = np.argsort(-np.abs(change), kind="stable")[:5]
+        largest_changes = [(strike_values[i], float(change[i]), timestamp) for i in top]
+        yield (
+            timestamp,
+            dict(zip(strike_values, exposure.tolist())),
+            dict(zip(strike_values, change.tolist())),
+            largest_changes,
+            float(exposure.sum()),
+            spot,
+        )
+
+
+def run(mode, ticks, strikes, slices):
+    plotter = create_plotter(mode)
+    frame_times = np.empty(ticks)
+    for tick, (timestamp, exposure, change, largest, total, spot) in enumerate(simulate_ticks(ticks, strikes)):
+        started = time.perf_counter()
+        plotter.update_plot_gamma(exposure)
+        plotter.update_plot_change_in_gamma(change, largest)
+        plotter.update_total_gamma_exposure_plot(timestamp, total, spot)
+        if mode == "redraw":
+            # plt.draw() only schedules a draw; force it so the frame is really rendered.
+            plotter.fig.canvas.draw()
+        frame_times[tick] = time.perf_counter() - started
+    return [chunk.mean() * 1000 for chunk in np.array_split(frame_times, slices)], frame_times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("retained", "redraw"), default="retained")
+    parser.add_argument("--ticks", type=int, default=5760)
+    parser.add_argument("--strikes", type=int, default=50)
+    parser.add_argument("--slices", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    slice_means, frame_times = run(args.mode, args.ticks, args.strikes, args.slices)
+    print(f"{args.mode}: {args.ticks} ticks, {args.strikes} strikes")
+    for index, mean in enumerate(slice_means):
+        print(f"  slice {index + 1}/{args.slices}: {mean:8.2f} ms/frame")
+    print(f"  median {np.median(frame_times) * 1000:.2f} ms, p99 {np.percentile(frame_times, 99) * 1000:.2f} ms")
+    print(f"  last/first slice ratio: {slice_means[-1] / slice_means[0]:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Simulated trading days for the adaptive poll scheduler.
+
+Drives :class:`adaptive_schedule.AdaptivePollClock` and the fixed-rate
+clock through the same session on a simulated clock, so a day runs in
+seconds.  A :class:`benchmarks.synthetic.SyntheticChain` follows a script of
+quiet and volatile regimes, and injected fetch failures exercise the backoff.
+Each poll is analysed by a :class:`pipeline.GammaExposurePipeline`, exactly
+as the runner would, and the frames are fed back to the clock.  The report
+compares requests per regime, the fastest minute against the rate limit and
+the largest spot move that went unobserved between two polls::
+
+    python -m benchmarks.poll_simulation
+    python -m benchmarks.poll_simulation --day 2024-11-29 --failure-rate 0.05
+"""
+
+import argparse
+import contextlib
+import datetime
+import random
+from collections import Counter, deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pytz
+
+from adaptive_schedule import AdaptivePollClock, TradingCalendar
+from benchmarks.synthetic import SyntheticChain
+from pipeline import FixedRateClock, GammaExposurePipeline
+
+EASTERN = pytz.timezone("US/Eastern")
+
+# (minutes after the open, spot volatility per second in points, label)
+DEFAULT_REGIMES: Tuple[Tuple[float, float, str], ...] = (
+    (0, 1.2, "open"),
+    (30, 0.1, "quiet"),
+    (120, 1.5, "burst"),
+    (150, 0.1, "quiet"),
+    (330, 0.8, "close"),
+)
+
+
+class SimulatedClock:
+    """Monotonic and wall time that only advance when something waits."""
+
+    def __init__(self, start: datetime.datetime):
+        self.start = start
+        self.elapsed = 0.0
+
+    def monotonic(self) -> float:
+        return self.elapsed
+
+    def now(self) -> datetime.datetime:
+        return self.start + datetime.timedelta(seconds=self.elapsed)
+
+    def sleep(self, seconds: float) -> None:
+        self.elapsed += max(seconds, 0.0)
+
+
+class SimulatedStopEvent:
+    """Stand-in for the runner's ``threading.Event`` that sleeps on a :class:`SimulatedClock`."""
+
+    def __init__(self, clock: SimulatedClock, until: float):
+        self.clock = clock
+        self.until = until
+
+    def is_set(self) -> bool:
+        return self.clock.elapsed >= self.until
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        remaining = self.until - self.clock.elapsed
+        self.clock.sleep(remaining if timeout is None else min(timeout, remaining))
+        return self.is_set()
+
+
+def regime_at(regimes: Sequence[Tuple[float, float, str]], minutes: float) -> Tuple[float, str]:
+    volatility, label = regimes[0][1:]
+    for start, regime_volatility, regime_label in regimes:
+        if minutes >= start:
+            volatility, label = regime_volatility, regime_label
+    return volatility, label
+
+
+def simulate(
+    make_clock,
+    day: datetime.date,
+    regimes: Sequence[Tuple[float, float, str]] = DEFAULT_REGIMES,
+    failure_rate: float = 0.02,
+    volume_per_second: float = 2.0,
+    start_time: datetime.time = datetime.time(9, 0),
+    end_time: datetime.time = datetime.time(16, 30),
+    seed: int = 0,
+) -> Dict:
+    """Run one simulated day from ``start_time`` to ``end_time`` with the clock from ``make_clock(sim)``."""
+
+    start = EASTERN.localize(datetime.datetime.combine(day, start_time))
+    end = EASTERN.localize(datetime.datetime.combine(day, end_time))
+    sim = SimulatedClock(start)
+    stop = SimulatedStopEvent(sim, (end - start).total_seconds())
+    clock = make_clock(sim)
+    calendar = TradingCalendar()
+    session = calendar.session(day)
+    rng = random.Random(seed)
+    chain = SyntheticChain(strikes=100, full_quotes=False, seed=seed)
+    pipeline = GammaExposurePipeline(show=False)
+
+    # The underlying moves and trades every simulated second, whether or not it is polled
+    moved_to = 0.0
+    stepped_at: Optional[float] = None
+    polls: List[Tuple[float, str]] = []
+    failures = 0
+    last_polled_spot: Optional[float] = None
+    largest_unseen_move = 0.0
+    while clock.wait(stop):
+        opened_at = session[0] if session else start
+        minutes = (sim.now() - opened_at).total_seconds() / 60
+        volatility, label = regime_at(regimes, minutes)
+        if not calendar.is_open(sim.now()):
+            moved_to = sim.elapsed
+            clock.success()  # the fixed clock polls and gets nothing back
+            continue
+        while moved_to < sim.elapsed:
+            chain.spot += rng.gauss(0.0, volatility)
+            moved_to += 1.0
+        polls.append((sim.elapsed, label))
+        if rng.random() < failure_rate:
+            failures += 1
+            clock.failure()
+            continue
+        clock.success()
+        if last_polled_spot is not None:
+            largest_unseen_move = max(largest_unseen_move, abs(chain.spot - last_polled_spot))
+        last_polled_spot = chain.spot
+        # The spot was moved above; step() adds the volume traded since the last poll
+        chain.spot_volatility = 0.0
+        chain.volume_rate = volume_per_second * (sim.elapsed - stepped_at if stepped_at is not None else 1.0)
+        stepped_at = sim.elapsed
+        snapshot = chain.step()
+        with contextlib.redirect_stdout(None):
+            frame = pipeline.analyze(snapshot, sim.now())
+        clock.observe(frame)
+
+    per_regime = Counter(label for _, label in polls)
+    window: deque = deque()
+    busiest_minute = 0
+    for at, _ in polls:
+        window.append(at)
+        while window[0] <= at - 60:
+            window.popleft()
+        busiest_minute = max(busiest_minute, len(window))
+    return {
+        "requests": len(polls),
+        "failures": failures,
+        "per_regime": dict(per_regime),
+        "busiest_minute": busiest_minute,
+        "largest_unseen_move": largest_unseen_move,
+        "first_poll": (start + datetime.timedelta(seconds=polls[0][0])).strftime("%H:%M:%S") if polls else None,
+        "last_poll": (start + datetime.timedelta(seconds=polls[-1][0])).strftime("%H:%M:%S") if polls else None,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--day", type=datetime.date.fromisoformat, default=datetime.date(2024, 5, 8))
+    parser.add_argument("--interval", type=float, default=5.0)
+    parser.add_argument("--rate-limit", type=float, default=2.0, help="broker requests per second")
+    parser.add_argument("--failure-rate", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    clocks = {
+        "fixed": lambda sim: FixedRateClock(args.interval, sim.monotonic),
+        "adaptive": lambda sim: AdaptivePollClock(
+            interval=args.interval,
+            rate_limit=args.rate_limit,
+            calendar=TradingCalendar(),
+            clock=sim.monotonic,
+            now=sim.now,
+            rng=random.Random(args.seed),
+        ),
+    }
+    session = TradingCalendar().session(args.day)
+    if session is None:
+        print(f"{args.day} is not a trading day; the adaptive clock sleeps through it.")
+    else:
+        print(f"{args.day}: session {session[0]:%H:%M}-{session[1]:%H:%M} US/Eastern")
+    for name, make_clock in clocks.items():
+        result = simulate(make_clock, args.day, failure_rate=args.failure_rate, seed=args.seed)
+        regimes = ", ".join(f"{label} {count}" for label, count in sorted(result["per_regime"].items()))
+        print(
+            f"{name:>8}: {result['requests']} requests ({regimes}); {result['failures']} failed; "
+            f"busiest minute {result['busiest_minute']} (limit {args.rate_limit * 60:.0f}); "
+            f"largest unseen move {result['largest_unseen_move']:.1f} pts; "
+            f"polls {result['first_poll']}-{result['last_poll']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""Benchmark suite for the analysis, alerting, rendering and serialization paths.
+
+Every case runs against :class:`benchmarks.synthetic.SyntheticChain` sessions
+at each ``--strikes`` size (50, 500 and 5000 by default), cycling through
+consecutive ticks so per-call work matches a live session.  For each case
+and size the suite reports per-call latency (median and p95), the peak
+memory allocated during one call and what it retains afterwards (both from
+``tracemalloc``).
+
+Results can be saved as a baseline and later runs compared against it; a
+case whose median grows by more than ``--threshold`` fails the run (exit
+status 1).  Baselines are machine specific, so record them on the box that
+runs the comparison::
+
+    python -m benchmarks.suite --save benchmarks/baseline.json
+    python -m benchmarks.suite --compare benchmarks/baseline.json --threshold 0.25
+    python -m benchmarks.suite --cases analysis. --strikes 50 500
+"""
+
+import argparse
+import contextlib
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+from alerts import AlertEngine, parse_alert_rules  # noqa: E402
+from benchmarks.synthetic import generate_session  # noqa: E402
+from chain_parser import ChainPayload, parse_chain_arrays  # noqa: E402
+from db_storage import contract_rows  # noqa: E402
+from gamma_analysis import calculate_gamma_exposure  # noqa: E402
+from incremental_gamma import IncrementalGammaAggregator  # noqa: E402
+
+DEFAULT_STRIKES = (50, 500, 5000)
+START = datetime(2024, 5, 8, 13, 30, tzinfo=timezone.utc)
+
+
+class Session:
+    """Pre-generated ticks of one chain size, in every form the cases consume."""
+
+    def __init__(self, strikes: int, ticks: int):
+        self.strikes = strikes
+        self.chains = generate_session(ticks, strikes=strikes, seed=strikes)
+        self.raw = [json.dumps(chain).encode() for chain in self.chains]
+        self.times = [START + timedelta(seconds=5 * tick) for tick in range(ticks)]
+        self._results = None
+
+    def __len__(self) -> int:
+        return len(self.chains)
+
+    @property
+    def results(self) -> List:
+        """Analysis results of every tick, each measured against the previous one."""
+
+        if self._results is None:
+            previous, self._results = None, []
+            for chain, fetched_at in zip(self.chains, self.times):
+                result = calculate_gamma_exposure(chain, previous, fetched_at)
+                previous = result[1]
+                self._results.append(result)
+        return self._results
+
+
+def _cycling(session: Session, call: Callable[[int], object]) -> Callable[[], object]:
+    """Return a zero-argument callable invoking ``call`` on successive tick indexes."""
+
+    counter = iter(range(sys.maxsize))
+    return lambda: call(next(counter) % len(session))
+
+
+def case_calculate(session):
+    previous = {}
+
+    def call(tick):
+        nonlocal previous
+        result = calculate_gamma_exposure(session.chains[tick], previous, session.times[tick])
+        previous = result[1]
+    return _cycling(session, call)
+
+
+def case_parse_typed(session):
+    return _cycling(session, lambda tick: parse_chain_arrays(session.raw[tick]))
+
+
+def case_incremental(session):
+    aggregator = IncrementalGammaAggregator()
+
+    def call(tick):
+        aggregator.apply_snapshot(session.chains[tick])
+        aggregator.commit(session.times[tick])
+    return _cycling(session, call)
+
+
+def _render_case(render_mode):
+    def case(session):
+        from plotter import create_plotter
+
+        plotter = create_plotter(render_mode)
+        results = session.results
+
+        def call(tick):
+            total, exposure, changes, largest, spot = results[tick]
+            plotter.update_plot_gamma(exposure)
+            plotter.update_plot_change_in_gamma(changes, largest)
+            plotter.update_total_gamma_exposure_plot(session.times[tick], total, spot)
+            if render_mode == "redraw":
+                # plt.draw() only schedules a draw; force the frame to be rendered.
+                plotter.fig.canvas.draw()
+        return _cycling(session, call)
+    return case
+
+
+# 100 z-score and 100 threshold rules, as in a heavily configured session
+ALERT_RULES = ",".join(
+    [f"z{index}=|z|>{2 + index % 20 * 0.1:.1f}" for index in range(100)]
+    + [f"change{index}=|change|>{0.001 * (index + 1):g}" for index in range(100)]
+)
+
+
+def case_alerts(session):
+    from pipeline import AnalysisFrame
+
+    engine = AlertEngine(parse_alert_rules(ALERT_RULES), cooldown=60.0)
+    frames = [AnalysisFrame(fetched_at, *result) for fetched_at, result in zip(session.times, session.results)]
+    return _cycling(session, lambda tick: engine.evaluate(frames[tick]))
+
+
+def case_json_dumps(session):
+    return _cycling(session, lambda tick: json.dumps(session.chains[tick]))
+
+
+def case_payload_text(session):
+    return _cycling(session, lambda tick: ChainPayload(session.raw[tick]).text)
+
+
+def case_contract_rows(session):
+    return _cycling(session, lambda tick: contract_rows(session.chains[tick], session.times[tick]))
+
+
+CASES: Dict[str, Callable[[Session], Callable[[], object]]] = {
+    "analysis.calculate_gamma_exposure": case_calculate,
+    "analysis.parse_chain_arrays": case_parse_typed,
+    "analysis.incremental_commit": case_incremental,
+    "alerts.evaluate": case_alerts,
+    "render.retained": _render_case("retained"),
+    "render.redraw": _render_case("redraw"),
+    "serialize.json_dumps": case_json_dumps,
+    "serialize.payload_text": case_payload_text,
+    "serialize.contract_rows": case_contract_rows,
+}
+
+
+def measure(function: Callable[[], object], repeat: int, warmup: int = 1) -> Dict[str, float]:
+    """Time ``repeat`` calls of ``function`` and trace the memory of one more."""
+
+    for _ in range(warmup):
+        function()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    times.sort()
+
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        function()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "median_ms": statistics.median(times) * 1000,
+        "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))] * 1000,
+        "peak_kb": (peak - before) / 1024,
+        "retained_kb": (after - before) / 1024,
+    }
+
+
+def run(cases: List[str], strikes: List[int], repeat: int, ticks: int) -> Dict[str, Dict[str, float]]:
+    """Return measurements keyed by ``"<case>[<strikes>]"``."""
+
+    results = {}
+    for size in strikes:
+        session = Session(size, ticks)
+        # Larger chains get fewer calls so the suite stays within minutes
+        calls = max(3, repeat * DEFAULT_STRIKES[0] // size) if size > DEFAULT_STRIKES[0] else repeat
+        for name in cases:
+            results[f"{name}[{size}]"] = measure(CASES[name](session), calls)
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    """Return descriptions of the cases whose median regressed beyond ``threshold``."""
+
+    regressions = []
+    for key, measured in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        ratio = measured["median_ms"] / reference["median_ms"] if reference["median_ms"] else 1.0
+        if ratio > 1 + threshold:
+            regressions.append(
+                f"{key}: {measured['median_ms']:.3f} ms vs {reference['median_ms']:.3f} ms baseline ({ratio:.2f}x)"
+            )
+    return regressions
+
+
+def _print_table(results: Dict[str, Dict[str, float]], baseline: Optional[Dict] = None) -> None:
+    print(f"{'case':<44} {'median ms':>10} {'p95 ms':>10} {'peak KB':>10} {'kept KB':>9} {'vs base':>8}")
+    for key, measured in results.items():
+        reference = (baseline or {}).get(key)
+        ratio = f"{measured['median_ms'] / reference['median_ms']:.2f}x" if reference else ""
+        print(
+            f"{key:<44} {measured['median_ms']:10.3f} {measured['p95_ms']:10.3f} "
+            f"{measured['peak_kb']:10.1f} {measured['retained_kb']:9.1f} {ratio:>8}"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", nargs="+", default=[""], help="run cases whose names start with these prefixes")
+    parser.add_argument("--strikes", nargs="+", type=int, default=list(DEFAULT_STRIKES))
+    parser.add_argument("--repeat", type=int, default=30, help="timed calls per case at the smallest size")
+    parser.add_argument("--ticks", type=int, default=20, help="distinct ticks generated per size")
+    parser.add_argument("--save", help="write the results to this JSON baseline")
+    parser.add_argument("--compare", help="compare against this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed median slowdown, as a fraction")
+    args = parser.parse_args(argv)
+
+    cases = [name for name in CASES if any(name.startswith(prefix) for prefix in args.cases)]
+    if not cases:
+        parser.error(f"no case matches {args.cases}; available: {', '.join(CASES)}")
+
+    # calculate_gamma_exposure prints every result
+    with contextlib.redirect_stdout(None):
+        results = run(cases, args.strikes, args.repeat, args.ticks)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)["results"]
+    _print_table(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as handle:
+            json.dump({"python": sys.version.split()[0], "results": results}, handle, indent=2)
+        print(f"Saved baseline to {args.save}.")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
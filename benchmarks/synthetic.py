@@ -0,0 +1,209 @@
+"""Synthetic Schwab/TDA-shaped option chains for benchmarks and offline runs.
+
+:class:`SyntheticChain` produces ``get_option_chain`` responses -- top-level
+underlying fields plus ``callExpDateMap``/``putExpDateMap`` keyed by
+``"YYYY-MM-DD:days"`` and strike -- whose contracts carry the full set of
+quote fields.  Each :meth:`SyntheticChain.step` advances one poll: the spot
+follows a random walk, gamma follows the spot (Black-Scholes gamma at each
+contract's volatility) and volume accumulates fastest near the money, so
+tick-to-tick changes look like a live session::
+
+    chains = SyntheticChain(strikes=500, expiries=2, seed=1)
+    first = chains.snapshot()
+    later = [chains.step() for _ in range(100)]
+"""
+
+import math
+from datetime import date, timedelta
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+
+class SyntheticChain:
+    """An option chain that evolves poll by poll.
+
+    Parameters
+    ----------
+    strikes, expiries:
+        Strikes per expiry (centred on ``spot``, ``strike_step`` apart) and
+        number of daily expiries starting at ``first_expiry``.  Wide chains
+        get a finer step, in multiples of 0.5, so every strike stays positive.
+    spot_volatility:
+        Standard deviation of the spot's move per step, in points.
+    volume_rate:
+        Mean contracts traded per step at the money; trading decays with
+        distance from the spot.
+    volatility_drift:
+        Standard deviation of each contract's implied volatility change per
+        step, in volatility points.
+    full_quotes:
+        Emit every broker quote field; with ``False`` only the fields the
+        analysis reads, for cheaper generation.
+    """
+
+    def __init__(
+        self,
+        strikes: int = 50,
+        expiries: int = 1,
+        symbol: str = "$SPX",
+        spot: float = 5200.0,
+        strike_step: float = 5.0,
+        first_expiry: date = date(2024, 5, 8),
+        spot_volatility: float = 0.5,
+        volume_rate: float = 50.0,
+        volatility_drift: float = 0.05,
+        full_quotes: bool = True,
+        seed: int = 0,
+    ):
+        self.symbol = symbol
+        self.spot = spot
+        self.spot_volatility = spot_volatility
+        self.volume_rate = volume_rate
+        self.volatility_drift = volatility_drift
+        self.full_quotes = full_quotes
+        self.rng = np.random.default_rng(seed)
+        self.ticks = 0
+
+        half_width = max(strikes // 2, 1)
+        if strike_step * half_width > 0.9 * spot:
+            strike_step = max(math.floor(0.9 * spot / half_width * 2) / 2, 0.5)
+        centre = round(spot / strike_step) * strike_step
+        self.strike_values = centre + strike_step * (np.arange(strikes) - strikes // 2)
+        self.expiry_dates = [first_expiry + timedelta(days=day) for day in range(expiries)]
+        # One row per (expiry, strike); calls and puts get separate state
+        shape = (2, expiries, strikes)
+        skew = np.abs(self.strike_values - spot) / spot
+        self.volatility = np.broadcast_to(15.0 + 80.0 * skew, shape).copy()
+        self.volume = self.rng.integers(0, 500, shape).astype(np.float64)
+        self.open_interest = self.rng.integers(0, 50000, shape).astype(np.float64)
+        self.years = np.array([(day + 0.25) / 365.0 for day in range(expiries)])[None, :, None]
+
+    def _gamma(self) -> np.ndarray:
+        sigma = self.volatility / 100.0
+        root_t = np.sqrt(self.years)
+        d1 = (np.log(self.spot / self.strike_values) + 0.5 * sigma ** 2 * self.years) / (sigma * root_t)
+        return np.exp(-0.5 * d1 ** 2) / (self.spot * sigma * root_t * math.sqrt(2 * math.pi))
+
+    def step(self) -> Dict:
+        """Advance one poll and return the new snapshot."""
+
+        self.spot += float(self.rng.normal(0.0, self.spot_volatility))
+        distance = np.abs(self.strike_values - self.spot) / (self.spot * 0.01)
+        rate = self.volume_rate * np.exp(-distance)
+        self.volume += self.rng.poisson(np.broadcast_to(rate, self.volume.shape))
+        self.volatility = np.maximum(
+            self.volatility + self.rng.normal(0.0, self.volatility_drift, self.volatility.shape), 1.0
+        )
+        self.ticks += 1
+        return self.snapshot()
+
+    def __iter__(self) -> Iterator[Dict]:
+        while True:
+            yield self.step()
+
+    def snapshot(self) -> Dict:
+        """Return the current chain as a broker response."""
+
+        gamma = np.round(self._gamma(), 6)
+        maps: Dict[str, Dict] = {"callExpDateMap": {}, "putExpDateMap": {}}
+        for side, (map_name, put_call) in enumerate((("callExpDateMap", "CALL"), ("putExpDateMap", "PUT"))):
+            for index, expiry in enumerate(self.expiry_dates):
+                days = (expiry - self.expiry_dates[0]).days
+                columns = zip(
+                    self.strike_values.tolist(),
+                    gamma[side, index].tolist(),
+                    self.volume[side, index].tolist(),
+                    self.open_interest[side, index].tolist(),
+                    np.round(self.volatility[side, index], 3).tolist(),
+                )
+                maps[map_name][f"{expiry.isoformat()}:{days}"] = {
+                    f"{strike:.1f}": [self._contract(put_call, expiry, days, strike, *values)]
+                    for strike, *values in columns
+                }
+        return {
+            "symbol": self.symbol,
+            "status": "SUCCESS",
+            "strategy": "SINGLE",
+            "interval": 0.0,
+            "isDelayed": False,
+            "isIndex": True,
+            "interestRate": 5.2,
+            "underlyingPrice": round(self.spot, 2),
+            "volatility": 29.0,
+            "daysToExpiration": 0.0,
+            "numberOfContracts": int(self.volume.size),
+            **maps,
+        }
+
+    def _contract(self, put_call, expiry, days, strike, gamma, volume, open_interest, volatility) -> Dict:
+        contract = {
+            "putCall": put_call,
+            "symbol": f"{self.symbol.lstrip('$')}W  {expiry:%y%m%d}{put_call[0]}{int(strike * 1000):08d}",
+            "gamma": gamma,
+            "totalVolume": int(volume),
+            "openInterest": int(open_interest),
+            "volatility": volatility,
+            "strikePrice": strike,
+            "daysToExpiration": days,
+        }
+        if not self.full_quotes:
+            return contract
+        intrinsic = max(self.spot - strike, 0.0) if put_call == "CALL" else max(strike - self.spot, 0.0)
+        price = round(intrinsic + self.spot * volatility / 100.0 * math.sqrt((days + 0.25) / 365.0) * 0.4, 2)
+        contract.update({
+            "description": f"{self.symbol} {expiry:%b %d %Y} {strike:g} {put_call.title()} (Weekly)",
+            "exchangeName": "OPR",
+            "bid": max(round(price - 0.05, 2), 0.0),
+            "ask": round(price + 0.05, 2),
+            "last": price,
+            "mark": price,
+            "bidSize": 10,
+            "askSize": 12,
+            "bidAskSize": "10X12",
+            "lastSize": 1,
+            "highPrice": round(price * 1.2, 2),
+            "lowPrice": round(price * 0.8, 2),
+            "openPrice": 0.0,
+            "closePrice": price,
+            "tradeTimeInLong": 1715189400000 + 5000 * self.ticks,
+            "quoteTimeInLong": 1715189400000 + 5000 * self.ticks,
+            "netChange": 0.0,
+            "delta": 0.5 if put_call == "CALL" else -0.5,
+            "theta": -1.0,
+            "vega": 0.5,
+            "rho": 0.01,
+            "timeValue": round(price - intrinsic, 2),
+            "theoreticalOptionValue": price,
+            "theoreticalVolatility": 29.0,
+            "optionDeliverablesList": [
+                {"symbol": self.symbol, "assetType": "INDEX", "deliverableUnits": 100.0}
+            ],
+            "expirationDate": f"{expiry.isoformat()}T20:00:00.000+00:00",
+            "expirationType": "W",
+            "lastTradingDay": 1715212800000,
+            "multiplier": 100.0,
+            "settlementType": "P",
+            "deliverableNote": "",
+            "percentChange": 0.0,
+            "markChange": 0.0,
+            "markPercentChange": 0.0,
+            "intrinsicValue": round(intrinsic, 2),
+            "extrinsicValue": round(price - intrinsic, 2),
+            "optionRoot": self.symbol.lstrip("$") + "W",
+            "exerciseType": "E",
+            "high52Week": round(price * 3, 2),
+            "low52Week": 0.05,
+            "inTheMoney": intrinsic > 0,
+            "mini": False,
+            "nonStandard": False,
+            "pennyPilot": True,
+        })
+        return contract
+
+
+def generate_session(ticks: int, **kwargs) -> List[Dict]:
+    """Return ``ticks`` consecutive snapshots of a :class:`SyntheticChain` built with ``kwargs``."""
+
+    chain = SyntheticChain(**kwargs)
+    return [chain.step() for _ in range(ticks)]
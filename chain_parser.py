@@ -0,0 +1,165 @@
+"""Decoding of option chain responses on the fetch hot path.
+
+A fetched chain is kept as a :class:`ChainPayload` holding the raw response
+bytes.  Each consumer takes only what it needs, and each form is produced
+once:
+
+* the analysis reads :meth:`ChainPayload.arrays`, which with ``msgspec``
+  installed decodes the bytes straight into the analysed fields, skipping
+  every other field of every contract;
+* storage writes :attr:`ChainPayload.text`, the response itself, so the
+  chain is never re-encoded;
+* consumers needing the full chain use :attr:`ChainPayload.data` (decoded
+  once and shared) or :meth:`ChainPayload.decode` (a private copy).
+
+JSON is decoded with ``orjson`` or ``msgspec`` when installed and the
+standard library otherwise; :data:`JSON_BACKEND` names the one in use.
+``python -m benchmarks.bench_parse`` compares the paths across chain sizes.
+"""
+
+import json
+import math
+from typing import Dict, List, Optional, Union
+
+from gamma_analysis import OptionChainArrays, chain_arrays_from_columns, flatten_option_chain
+
+try:
+    import orjson
+except ModuleNotFoundError:  # pragma: no cover - optional accelerator
+    orjson = None
+
+try:
+    import msgspec
+except ModuleNotFoundError:  # pragma: no cover - optional accelerator
+    msgspec = None
+
+
+if orjson is not None:
+    JSON_BACKEND = "orjson"
+    loads = orjson.loads
+elif msgspec is not None:
+    JSON_BACKEND = "msgspec"
+    loads = msgspec.json.Decoder().decode
+else:
+    JSON_BACKEND = "json"
+    loads = json.loads
+
+
+if msgspec is not None:
+    # Numeric fields may arrive as strings (e.g. "NaN"); those are converted,
+    # or the contract dropped, exactly as in ``flatten_option_chain``.
+    Number = Union[float, str, None]
+
+    class _Contract(msgspec.Struct):
+        gamma: Number
+        totalVolume: Number
+        openInterest: Number = 0
+        volatility: Number = math.nan
+        delta: Number = math.nan
+
+    class _Chain(msgspec.Struct):
+        symbol: Optional[str] = None
+        underlyingPrice: Number = 0
+        callExpDateMap: Dict[str, Dict[str, List[_Contract]]] = {}
+        putExpDateMap: Dict[str, Dict[str, List[_Contract]]] = {}
+
+    _chain_decoder = msgspec.json.Decoder(_Chain)
+else:
+    _chain_decoder = None
+
+
+def _typed_chain_arrays(chain, drop_invalid: bool = True) -> OptionChainArrays:
+    strikes: List[float] = []
+    gammas: List = []
+    volumes: List = []
+    open_interests: List = []
+    volatilities: List = []
+    deltas: List = []
+    signs: List[int] = []
+    expiry_codes: List[int] = []
+    expiries: List[str] = []
+    expiry_index: Dict[str, int] = {}
+
+    for strike_maps, sign in ((chain.callExpDateMap, 1), (chain.putExpDateMap, -1)):
+        for expiry, strike_map in strike_maps.items():
+            code = expiry_index.get(expiry)
+            if code is None:
+                code = expiry_index[expiry] = len(expiries)
+                expiries.append(expiry)
+            for strike, options in strike_map.items():
+                try:
+                    strike_value = float(strike)
+                except (TypeError, ValueError) as exc:
+                    print(f"Strike {strike} included incompatible data: {exc}")
+                    continue
+                count = len(options)
+                strikes.extend([strike_value] * count)
+                gammas.extend([option.gamma for option in options])
+                volumes.extend([option.totalVolume for option in options])
+                open_interests.extend([option.openInterest for option in options])
+                volatilities.extend([option.volatility for option in options])
+                deltas.extend([option.delta for option in options])
+                signs.extend([sign] * count)
+                expiry_codes.extend([code] * count)
+
+    return chain_arrays_from_columns(
+        strikes, gammas, volumes, open_interests, volatilities, signs, expiry_codes, expiries,
+        chain.underlyingPrice, chain.symbol, deltas, drop_invalid,
+    )
+
+
+def parse_chain_arrays(raw: bytes, drop_invalid: bool = True) -> OptionChainArrays:
+    """Decode the analysed fields of a raw option chain response into arrays.
+
+    ``drop_invalid`` is passed to :func:`gamma_analysis.chain_arrays_from_columns`.
+    """
+
+    if _chain_decoder is not None:
+        try:
+            return _typed_chain_arrays(_chain_decoder.decode(raw), drop_invalid)
+        except msgspec.ValidationError:
+            pass  # unexpected shape; the generic path reports it like before
+    return flatten_option_chain(loads(raw), drop_invalid)
+
+
+class ChainPayload:
+    """A fetched option chain, kept as raw response bytes and decoded on demand.
+
+    The decoded forms are cached; ``data`` is shared between consumers and
+    must not be mutated (use :meth:`decode` for a private copy).
+    """
+
+    __slots__ = ("raw", "_data", "_arrays")
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self._data: Optional[Dict] = None
+        # Keyed by ``drop_invalid``
+        self._arrays: Dict[bool, OptionChainArrays] = {}
+
+    @property
+    def data(self) -> Dict:
+        if self._data is None:
+            self._data = loads(self.raw)
+        return self._data
+
+    def decode(self) -> Dict:
+        """Return a newly decoded copy of the chain."""
+
+        return loads(self.raw)
+
+    def arrays(self, drop_invalid: bool = True) -> OptionChainArrays:
+        arrays = self._arrays.get(drop_invalid)
+        if arrays is None:
+            if self._data is not None:
+                arrays = flatten_option_chain(self._data, drop_invalid)
+            else:
+                arrays = parse_chain_arrays(self.raw, drop_invalid)
+            self._arrays[drop_invalid] = arrays
+        return arrays
+
+    @property
+    def text(self) -> str:
+        """The response as text, for storing without re-encoding."""
+
+        return self.raw.decode("utf-8")
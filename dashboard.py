@@ -0,0 +1,349 @@
+"""Headless rendering to files and a local web dashboard.
+
+:class:`HeadlessPlotter` stands in for the matplotlib plotter in the analysis
+process.  Frames are handed to a separate render process, which draws them
+with the Agg backend at no more than ``frame_rate`` frames per second and
+writes the latest image (PNG or SVG) and JSON series to ``frame_dir``.
+Frames arriving faster than that only update the histories
+(:meth:`plotter.RealTimeGammaPlotter.record_frame`), so nothing is lost from
+the time series.
+
+With a ``port`` the render process also serves the latest frame over HTTP.
+Every viewer is sent the same encoded bytes, so viewers cost no redraws:
+
+* ``/`` -- a page showing the latest frame, refreshed in the browser;
+* ``/frame`` -- the latest image;
+* ``/series.json`` -- the latest per-strike data and the total/spot history.
+
+Examples
+--------
+Run the scheduler on a server and watch it from a browser::
+
+    OUTPUT_MODE=headless FRAME_DIR=frames DASHBOARD_PORT=8050 python main.py
+"""
+
+import io
+import json
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+CONTENT_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+_PAGE = """<!DOCTYPE html>
+<html>
+<head><title>Gamma exposure</title></head>
+<body style="margin:0">
+<img id="frame" src="frame" style="max-width:100%">
+<script>
+setInterval(function () {{
+  document.getElementById("frame").src = "frame?" + Date.now();
+}}, {refresh_ms});
+</script>
+</body>
+</html>
+"""
+
+
+@dataclass(frozen=True)
+class RenderConfig:
+    """Settings of the render process."""
+
+    frame_dir: Optional[str] = None
+    frame_format: str = "png"
+    frame_rate: float = 1.0
+    keep_frames: bool = False
+    port: Optional[int] = None
+    host: str = "127.0.0.1"
+    render_mode: str = "retained"
+
+
+class RestoredFrames(NamedTuple):
+    """Cached history sent to the render process (see :meth:`HeadlessPlotter.restore_frames`)."""
+
+    times: np.ndarray
+    totals: np.ndarray
+    spots: np.ndarray
+    change_frames: np.ndarray
+    change_times: np.ndarray
+    change_strikes: np.ndarray
+    change_values: np.ndarray
+
+
+class LatestFrame:
+    """Encoded image and series of the most recently rendered frame, shared with the HTTP threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.index = -1
+        self.image = b""
+        self.content_type = CONTENT_TYPES["png"]
+        self.series = b"{}"
+
+    def publish(self, index: int, image: bytes, content_type: str, series: bytes) -> None:
+        with self._lock:
+            self.index = index
+            self.image = image
+            self.content_type = content_type
+            self.series = series
+
+    def get(self) -> Tuple[int, bytes, str, bytes]:
+        with self._lock:
+            return self.index, self.image, self.content_type, self.series
+
+
+def serve_dashboard(latest: LatestFrame, host: str, port: int, refresh_seconds: float = 1.0) -> ThreadingHTTPServer:
+    """Serve ``latest`` on ``host:port`` from a daemon thread and return the server."""
+
+    page = _PAGE.format(refresh_ms=max(int(refresh_seconds * 1000), 100)).encode()
+
+    class DashboardHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path in ("/", "/index.html"):
+                self._send(page, "text/html; charset=utf-8")
+                return
+            index, image, content_type, series = latest.get()
+            if index < 0 or path not in ("/frame", "/series.json"):
+                self.send_error(404)
+                return
+            # Viewers polling an unchanged frame get a 304 instead of the bytes
+            etag = f'"{index}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            if path == "/frame":
+                self._send(image, content_type, etag)
+            else:
+                self._send(series, "application/json", etag)
+
+        def _send(self, body: bytes, content_type: str, etag: Optional[str] = None) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-cache")
+            if etag:
+                self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), DashboardHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="dashboard-http", daemon=True).start()
+    return server
+
+
+def _finite(values) -> List[Optional[float]]:
+    # JSON has no NaN; gaps in the histories become null
+    return [value if math.isfinite(value) else None for value in values.tolist()]
+
+
+def _time_strings(times) -> List[str]:
+    return np.datetime_as_string(times, unit="ms").tolist()
+
+
+def encode_series(plotter, frame) -> bytes:
+    """Serialise ``frame`` and the plotter's total/spot history to JSON."""
+
+    timestamp, exposure, changes, largest_changes, total_gamma_exposure, spot_price = frame
+    times, totals = plotter.history.series("total_gamma_exposure")
+    _, spots = plotter.history.series("spot_price")
+    return json.dumps({
+        "timestamp": timestamp.isoformat(),
+        "total_gamma_exposure": total_gamma_exposure,
+        "spot_price": spot_price,
+        "per_strike_gamma_exposure": [[strike, value] for strike, value in exposure.items()],
+        "change_in_gamma_per_strike": [[strike, value] for strike, value in changes.items()],
+        "largest_changes": [[strike, change, when.isoformat()] for strike, change, when in largest_changes],
+        "history": {
+            "time": _time_strings(times),
+            "total_gamma_exposure": _finite(totals),
+            "spot_price": _finite(spots),
+        },
+    }).encode()
+
+
+def encode_image(plotter, frame_format: str) -> bytes:
+    """Return the plotter's figure as ``frame_format`` bytes."""
+
+    figure = plotter.fig
+    buffer = io.BytesIO()
+    if frame_format == "png":
+        # The Agg canvas already holds the frame; encode its pixels instead of drawing it again.
+        import matplotlib.image
+
+        if figure.stale:
+            figure.canvas.draw()
+        matplotlib.image.imsave(buffer, figure.canvas.buffer_rgba(), format="png", dpi=figure.dpi)
+    else:
+        figure.savefig(buffer, format=frame_format)
+    return buffer.getvalue()
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    # Readers of the directory never see a partially written file
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as handle:
+        handle.write(data)
+    os.replace(temporary, path)
+
+
+def render_worker(frames, config: RenderConfig) -> None:
+    """Render process: draw frames from ``frames`` until ``None`` arrives."""
+
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from plotter import create_plotter
+
+    plotter = create_plotter(config.render_mode)
+    latest = LatestFrame()
+    server = None
+    if config.port is not None:
+        server = serve_dashboard(latest, config.host, config.port, 1.0 / config.frame_rate)
+    if config.frame_dir:
+        os.makedirs(config.frame_dir, exist_ok=True)
+
+    interval = 1.0 / config.frame_rate
+    next_render = 0.0
+    rendered = 0
+    pending = None
+    finished = False
+    while not finished:
+        timeout = max(next_render - time.monotonic(), 0.0) if pending is not None else None
+        try:
+            frame = frames.get(timeout=timeout)
+        except queue.Empty:
+            pass  # time to draw the pending frame
+        else:
+            if frame is None:
+                finished = True
+            elif isinstance(frame, RestoredFrames):
+                try:
+                    plotter.restore_frames(*frame)
+                except Exception as e:
+                    print(f"An error occurred while restoring cached frames: {e}")
+            else:
+                if pending is not None:
+                    # Superseded before its turn to be drawn
+                    timestamp, _, _, largest_changes, total_gamma_exposure, spot_price = pending
+                    try:
+                        plotter.record_frame(timestamp, largest_changes, total_gamma_exposure, spot_price)
+                    except Exception as e:
+                        print(f"An error occurred while recording a frame: {e}")
+                pending = frame
+        if pending is None or (not finished and time.monotonic() < next_render):
+            continue
+
+        timestamp, exposure, changes, largest_changes, total_gamma_exposure, spot_price = pending
+        try:
+            plotter.update_plot_gamma(exposure)
+            plotter.update_plot_change_in_gamma(changes, largest_changes)
+            plotter.update_total_gamma_exposure_plot(timestamp, total_gamma_exposure, spot_price)
+            image = encode_image(plotter, config.frame_format)
+            series = encode_series(plotter, pending)
+        except Exception as e:
+            print(f"An error occurred while rendering: {e}")
+        else:
+            latest.publish(rendered, image, CONTENT_TYPES[config.frame_format], series)
+            if config.frame_dir:
+                name = f"frame_{rendered:06d}" if config.keep_frames else "latest"
+                _write_atomic(os.path.join(config.frame_dir, f"{name}.{config.frame_format}"), image)
+                _write_atomic(os.path.join(config.frame_dir, "series.json"), series)
+            rendered += 1
+        pending = None
+        next_render = time.monotonic() + interval
+
+    if server is not None:
+        server.shutdown()
+
+
+class HeadlessPlotter:
+    """Plotter interface that forwards frames to an Agg render process.
+
+    The three ``update_*`` calls made by
+    :meth:`pipeline.GammaExposurePipeline.render` are collected into one frame
+    and put on a bounded queue; the analysis side never draws.  Frames are
+    dropped (and counted in :attr:`dropped`) only if the render process falls
+    ``queue_size`` frames behind.
+    """
+
+    def __init__(
+        self,
+        frame_dir: Optional[str] = None,
+        frame_format: str = "png",
+        frame_rate: float = 1.0,
+        keep_frames: bool = False,
+        port: Optional[int] = None,
+        host: str = "127.0.0.1",
+        render_mode: str = "retained",
+        queue_size: int = 256,
+    ):
+        if frame_format not in CONTENT_TYPES:
+            raise ValueError(f"Unknown frame format {frame_format!r}; expected one of {sorted(CONTENT_TYPES)}")
+        if frame_rate <= 0:
+            raise ValueError("frame_rate must be positive")
+        self.config = RenderConfig(frame_dir, frame_format, frame_rate, keep_frames, port, host, render_mode)
+        # Spawned, not forked: the analysis process runs threads and may hold a GUI backend.
+        context = multiprocessing.get_context("spawn")
+        self._frames = context.Queue(queue_size)
+        self._process = context.Process(
+            target=render_worker, args=(self._frames, self.config), name="gamma-render", daemon=True
+        )
+        self._process.start()
+        self._exposure: Dict[float, float] = {}
+        self._changes: Dict[float, float] = {}
+        self._largest_changes: List = []
+        self.dropped = 0
+
+    def update_plot_gamma(self, current_gamma_exposure):
+        self._exposure = current_gamma_exposure
+
+    def update_plot_change_in_gamma(self, change_in_gamma_per_strike, largest_changes):
+        self._changes = change_in_gamma_per_strike
+        self._largest_changes = largest_changes
+
+    def update_total_gamma_exposure_plot(self, time_stamp, total_gamma_exposure, spot_price):
+        frame = (time_stamp, self._exposure, self._changes, self._largest_changes, total_gamma_exposure, spot_price)
+        try:
+            self._frames.put_nowait(frame)
+        except queue.Full:
+            self.dropped += 1
+
+    def restore_frames(self, times, totals, spots, change_frames, change_times, change_strikes, change_values):
+        """Send cached history to the render process, ahead of any frame."""
+
+        # Copied out of the memory maps so they pickle as plain arrays
+        restored = RestoredFrames(*(np.array(column) for column in (
+            times, totals, spots, change_frames, change_times, change_strikes, change_values
+        )))
+        self._frames.put(restored, timeout=10.0)
+
+    def show_plots(self):
+        pass
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Render the last queued frame and stop the render process."""
+
+        if not self._process.is_alive():
+            return
+        try:
+            self._frames.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
@@ -1,27 +1,798 @@
-import psycopg2
+"""Persistence of raw option chain snapshots.
+
+Snapshots are handed to a :class:`SnapshotWriter`, which owns a long-lived
+connection pool and drains a bounded in-memory queue from a background thread
+so that a slow or unavailable database never stalls the polling loop.  Rows
+are written in batches; ``psycopg2`` is used for PostgreSQL and
+:class:`SQLiteConnectionPool` provides a local stand-in for development.
+"""
+
 import json
+import queue
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from chain_parser import ChainPayload
+from gamma_analysis import flatten_option_chain, gamma_exposure_per_contract
+from snapshot_delta import SnapshotDeltaEncoder, apply_delta
+
+try:
+    import psycopg2
+    from psycopg2 import pool as pg_pool
+    from psycopg2.extras import execute_values
+except ModuleNotFoundError:  # pragma: no cover - optional when using SQLite
+    psycopg2 = None
+    pg_pool = None
+    execute_values = None
+
+
+DEFAULT_DB_PARAMS = {
+    "dbname": "spx_options_data",
+    "user": "postgres",
+    "password": "password",
+    "host": "localhost",
+}
+
+SCHEMA_STATEMENTS = {
+    "pyformat": [
+        """
+        CREATE TABLE IF NOT EXISTS spx_options_data (
+            id BIGSERIAL PRIMARY KEY,
+            data JSONB NOT NULL,
+            fetched_at TIMESTAMPTZ NOT NULL
+        )
+        """,
+        # One row per contract per poll.  The table is range partitioned by
+        # ``fetched_at`` so old days can be detached or dropped cheaply; daily
+        # partitions are created on demand by ``ensure_daily_partition``.
+        """
+        CREATE TABLE IF NOT EXISTS spx_option_contracts (
+            fetched_at TIMESTAMPTZ NOT NULL,
+            symbol TEXT,
+            expiry DATE NOT NULL,
+            strike DOUBLE PRECISION NOT NULL,
+            contract_type CHAR(1) NOT NULL,
+            gamma DOUBLE PRECISION,
+            volume DOUBLE PRECISION,
+            open_interest DOUBLE PRECISION,
+            implied_volatility DOUBLE PRECISION,
+            gamma_exposure DOUBLE PRECISION
+        ) PARTITION BY RANGE (fetched_at)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS spx_option_contracts_default
+            PARTITION OF spx_option_contracts DEFAULT
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS spx_option_contracts_fetched_at_strike_idx
+            ON spx_option_contracts (fetched_at, strike)
+        """,
+        # Delta-encoded snapshots (see ``snapshot_delta``).  Payloads are kept
+        # as TEXT rather than JSONB so key order survives and reconstructed
+        # snapshots serialize exactly like the originals.
+        """
+        CREATE TABLE IF NOT EXISTS spx_options_deltas (
+            id BIGSERIAL PRIMARY KEY,
+            fetched_at TIMESTAMPTZ NOT NULL,
+            symbol TEXT,
+            is_keyframe BOOLEAN NOT NULL,
+            payload TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS spx_options_deltas_fetched_at_idx
+            ON spx_options_deltas (fetched_at)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS spx_options_deltas_symbol_fetched_at_idx
+            ON spx_options_deltas (symbol, fetched_at)
+        """,
+    ],
+    "qmark": [
+        """
+        CREATE TABLE IF NOT EXISTS spx_options_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data TEXT NOT NULL,
+            fetched_at TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS spx_option_contracts (
+            fetched_at TEXT NOT NULL,
+            symbol TEXT,
+            expiry TEXT NOT NULL,
+            strike REAL NOT NULL,
+            contract_type TEXT NOT NULL,
+            gamma REAL,
+            volume REAL,
+            open_interest REAL,
+            implied_volatility REAL,
+            gamma_exposure REAL
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS spx_option_contracts_fetched_at_strike_idx
+            ON spx_option_contracts (fetched_at, strike)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS spx_options_deltas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fetched_at TEXT NOT NULL,
+            symbol TEXT,
+            is_keyframe INTEGER NOT NULL,
+            payload TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS spx_options_deltas_fetched_at_idx
+            ON spx_options_deltas (fetched_at)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS spx_options_deltas_symbol_fetched_at_idx
+            ON spx_options_deltas (symbol, fetched_at)
+        """,
+    ],
+}
+
+STORAGE_MODES = ("full", "delta")
+
+CONTRACT_COLUMNS = (
+    "fetched_at",
+    "symbol",
+    "expiry",
+    "strike",
+    "contract_type",
+    "gamma",
+    "volume",
+    "open_interest",
+    "implied_volatility",
+    "gamma_exposure",
+)
+
+SnapshotRow = Tuple[str, Any]
+
+_STOP = object()
+
+
+class SQLiteConnectionPool:
+    """Minimal stand-in for the ``psycopg2`` pool interface backed by SQLite."""
+
+    paramstyle = "qmark"
+
+    def __init__(self, database: str = ":memory:"):
+        self.database = database
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def getconn(self) -> sqlite3.Connection:
+        # SQLite serializes writers anyway, so a single shared connection is
+        # enough and keeps ``:memory:`` databases visible to every caller.
+        self._lock.acquire()
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.database, check_same_thread=False)
+        return self._connection
+
+    def putconn(self, conn: sqlite3.Connection, close: bool = False) -> None:
+        if close and conn is self._connection:
+            conn.close()
+            self._connection = None
+        self._lock.release()
+
+    def closeall(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def create_connection_pool(db_params: Dict[str, Any], minconn: int = 1, maxconn: int = 4):
+    """Create a thread-safe PostgreSQL connection pool for ``db_params``."""
+
+    if pg_pool is None:
+        raise RuntimeError("psycopg2 is required for PostgreSQL storage")
+    return pg_pool.ThreadedConnectionPool(minconn, maxconn, **db_params)
+
+
+def _paramstyle(connection_pool) -> str:
+    return getattr(connection_pool, "paramstyle", "pyformat")
+
+
+def ensure_schema(connection_pool) -> None:
+    """Create the snapshot tables if they do not already exist."""
+
+    conn = connection_pool.getconn()
+    try:
+        cur = conn.cursor()
+        for statement in SCHEMA_STATEMENTS[_paramstyle(connection_pool)]:
+            cur.execute(statement)
+        conn.commit()
+        cur.close()
+    finally:
+        connection_pool.putconn(conn)
+
+
+def _sqlite_timestamp(value: datetime) -> str:
+    """Render ``value`` as naive UTC ISO text so SQLite range filters sort correctly."""
+
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+
+def ensure_daily_partition(cur, day: date) -> None:
+    """Create the ``spx_option_contracts`` partition holding ``day`` (PostgreSQL)."""
+
+    start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    cur.execute(
+        f"CREATE TABLE IF NOT EXISTS spx_option_contracts_{day:%Y%m%d} "
+        "PARTITION OF spx_option_contracts FOR VALUES FROM (%s) TO (%s)",
+        (start, start + timedelta(days=1)),
+    )
+
+
+def contract_rows(data: Union[Dict, ChainPayload], fetched_at: Any) -> List[Tuple]:
+    """Flatten ``data`` into ``spx_option_contracts`` rows (see ``CONTRACT_COLUMNS``)."""
+
+    chain = data.arrays() if isinstance(data, ChainPayload) else flatten_option_chain(data)
+    expiry_dates = [expiry.split(":", 1)[0] for expiry in chain.expiries]
+    exposure = gamma_exposure_per_contract(chain)
+    symbol = chain.symbol
+    return [
+        (fetched_at, symbol, expiry_dates[code], strike, "C" if sign > 0 else "P", gamma, volume, oi, iv, gex)
+        for code, strike, sign, gamma, volume, oi, iv, gex in zip(
+            chain.expiry.tolist(),
+            chain.strike.tolist(),
+            chain.sign.tolist(),
+            chain.gamma.tolist(),
+            chain.volume.tolist(),
+            chain.open_interest.tolist(),
+            chain.implied_volatility.tolist(),
+            exposure.tolist(),
+        )
+    ]
+
+
+def _insert_snapshots(cur, paramstyle: str, rows: List[SnapshotRow]) -> None:
+    if paramstyle == "qmark":
+        cur.executemany(
+            "INSERT INTO spx_options_data (data, fetched_at) VALUES (?, ?)",
+            [(payload, _sqlite_timestamp(fetched_at)) for payload, fetched_at in rows],
+        )
+    else:
+        execute_values(cur, "INSERT INTO spx_options_data (data, fetched_at) VALUES %s", rows)
+
+
+def _insert_deltas(cur, paramstyle: str, rows: List[Tuple[str, Any, bool, Optional[str]]]) -> None:
+    if paramstyle == "qmark":
+        cur.executemany(
+            "INSERT INTO spx_options_deltas (payload, fetched_at, is_keyframe, symbol) VALUES (?, ?, ?, ?)",
+            [
+                (payload, _sqlite_timestamp(fetched_at), int(is_keyframe), symbol)
+                for payload, fetched_at, is_keyframe, symbol in rows
+            ],
+        )
+    else:
+        execute_values(
+            cur, "INSERT INTO spx_options_deltas (payload, fetched_at, is_keyframe, symbol) VALUES %s", rows
+        )
+
+
+def _insert_contracts(cur, paramstyle: str, rows: List[Tuple]) -> None:
+    columns = ", ".join(CONTRACT_COLUMNS)
+    if paramstyle == "qmark":
+        placeholders = ", ".join("?" for _ in CONTRACT_COLUMNS)
+        cur.executemany(
+            f"INSERT INTO spx_option_contracts ({columns}) VALUES ({placeholders})",
+            [(_sqlite_timestamp(row[0]),) + row[1:] for row in rows],
+        )
+    else:
+        execute_values(
+            cur,
+            f"INSERT INTO spx_option_contracts ({columns}) VALUES %s",
+            rows,
+            page_size=1000,
+        )
+
+
+class SnapshotWriter:
+    """Queue option chain snapshots and persist them from a background thread.
+
+    Parameters
+    ----------
+    db_params:
+        PostgreSQL connection parameters used to build a pool lazily on the
+        writer thread.  Ignored when ``connection_pool`` is supplied.
+    connection_pool:
+        An object exposing ``getconn``/``putconn``/``closeall``, such as a
+        ``psycopg2`` pool or :class:`SQLiteConnectionPool`.
+    max_queue:
+        Maximum number of snapshots buffered in memory.  When the queue is
+        full new snapshots are dropped rather than blocking the caller.
+    batch_size:
+        Maximum number of rows written per transaction.
+    max_retries, backoff:
+        A failed batch is retried ``max_retries`` times, sleeping
+        ``backoff * 2 ** attempt`` seconds between attempts.
+    normalize:
+        Also write one ``spx_option_contracts`` row per contract so historical
+        queries do not need to decode the raw JSON snapshots.
+    storage_mode:
+        ``"full"`` stores every snapshot in ``spx_options_data``; ``"delta"``
+        stores a keyframe every ``keyframe_interval`` snapshots and deltas in
+        between in ``spx_options_deltas`` (see :func:`reconstruct_snapshot`).
+        Each symbol of a watchlist is delta-encoded against its own previous
+        snapshot.
+    metrics:
+        Optional :class:`metrics.MetricsRegistry`; each batch write is timed
+        as ``db_write`` and failed attempts count as its errors.
+    """
+
+    def __init__(
+        self,
+        db_params: Optional[Dict[str, Any]] = None,
+        connection_pool=None,
+        max_queue: int = 256,
+        batch_size: int = 32,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+        normalize: bool = True,
+        storage_mode: str = "full",
+        keyframe_interval: int = 60,
+        metrics=None,
+    ):
+        if storage_mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode {storage_mode!r}; expected one of {STORAGE_MODES}")
+        self.db_params = db_params or DEFAULT_DB_PARAMS
+        self.connection_pool = connection_pool
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.normalize = normalize
+        self.storage_mode = storage_mode
+        self.keyframe_interval = keyframe_interval
+        self._encoders: Dict[Optional[str], SnapshotDeltaEncoder] = {}
+        self.metrics = metrics
+        self.stored = 0
+        self.dropped = 0
+        self._schema_ready = False
+        self._partitions: Set[date] = set()
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def pending(self) -> int:
+        """Number of snapshots waiting in the queue."""
+
+        return self._queue.qsize()
+
+    def start(self) -> "SnapshotWriter":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="snapshot-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, data: Union[Dict, ChainPayload], fetched_at: datetime) -> bool:
+        """Queue ``data`` for storage without blocking; return ``False`` if dropped.
+
+        A :class:`chain_parser.ChainPayload` is stored as the raw response.
+        """
+
+        self.start()
+        try:
+            self._queue.put_nowait((data, fetched_at))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            print("Storage queue full; dropping snapshot.")
+            return False
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Flush queued snapshots and stop the writer thread."""
+
+        if self._thread is not None:
+            if self._thread.is_alive():
+                try:
+                    # A full queue is being drained; only wait that long for room
+                    self._queue.put(_STOP, timeout=timeout)
+                except queue.Full:
+                    print("Snapshot writer did not finish flushing before timeout.")
+                    return
+                self._thread.join(timeout)
+                if self._thread.is_alive():
+                    print("Snapshot writer did not finish flushing before timeout.")
+                    return
+            elif self._queue.qsize():
+                print(f"Snapshot writer stopped; {self._queue.qsize()} queued snapshot(s) were not stored.")
+            self._thread = None
+        if self.connection_pool is not None:
+            self.connection_pool.closeall()
+            self.connection_pool = None
+
+    def _ensure_pool(self):
+        if self.connection_pool is None:
+            self.connection_pool = create_connection_pool(self.db_params)
+        if not self._schema_ready:
+            ensure_schema(self.connection_pool)
+            self._schema_ready = True
+        return self.connection_pool
+
+    def _next_batch(self) -> Tuple[List[Tuple[Dict, datetime]], bool]:
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if not batch:
+                continue
+            rows: List[Tuple] = []
+            contracts: List[Tuple] = []
+            for data, fetched_at in batch:
+                try:
+                    rows.append(self._encode(data, fetched_at))
+                except Exception as e:
+                    self.dropped += 1
+                    print(f"Dropping snapshot fetched at {fetched_at} that could not be encoded: {e}")
+                    continue
+                if self.normalize:
+                    # A chain the analysis cannot read is still stored raw
+                    try:
+                        contracts.extend(contract_rows(data, fetched_at))
+                    except Exception as e:
+                        print(f"Skipping contract rows of snapshot fetched at {fetched_at}: {e}")
+            if rows:
+                self._write_with_retry(rows, contracts)
+
+    def _encode(self, data: Union[Dict, ChainPayload], fetched_at: datetime) -> Tuple:
+        if self.storage_mode == "delta":
+            if isinstance(data, ChainPayload):
+                data = data.data
+            symbol = data.get("symbol")
+            encoder = self._encoders.get(symbol)
+            if encoder is None:
+                encoder = self._encoders[symbol] = SnapshotDeltaEncoder(self.keyframe_interval)
+            is_keyframe, payload = encoder.encode(data)
+            try:
+                return json.dumps(payload), fetched_at, is_keyframe, symbol
+            except Exception:
+                # The encoder already holds this chain; restart from a keyframe
+                encoder.reset()
+                raise
+        if isinstance(data, ChainPayload):
+            # Store the response as received instead of re-encoding it
+            return data.text, fetched_at
+        return json.dumps(data), fetched_at
+
+    def _write_with_retry(self, rows: List[Tuple], contracts: List[Tuple] = ()) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self.metrics is None:
+                    self.write_batch(rows, contracts)
+                else:
+                    with self.metrics.time("db_write"):
+                        self.write_batch(rows, contracts)
+                self.stored += len(rows)
+                return
+            except Exception as e:
+                print(f"Failed to store raw options data (attempt {attempt + 1}): {e}")
+                if attempt < self.max_retries:
+                    time.sleep(self.backoff * 2 ** attempt)
+        self.dropped += len(rows)
+        if self.metrics is not None:
+            self.metrics["db_write"].drop(len(rows))
+        # Later deltas would reference snapshots that were never stored.
+        for encoder in self._encoders.values():
+            encoder.reset()
+        print(f"Dropping {len(rows)} snapshot(s) after {self.max_retries + 1} attempts.")
+
+    def write_batch(self, rows: List[Tuple], contracts: Iterable[Tuple] = ()) -> None:
+        """Insert serialized snapshots and their contract rows in one transaction."""
+
+        connection_pool = self._ensure_pool()
+        paramstyle = _paramstyle(connection_pool)
+        contracts = list(contracts)
+        conn = connection_pool.getconn()
+        healthy = False
+        try:
+            cur = conn.cursor()
+            if self.storage_mode == "delta":
+                _insert_deltas(cur, paramstyle, rows)
+            else:
+                _insert_snapshots(cur, paramstyle, rows)
+            new_partitions: Set[date] = set()
+            if contracts and paramstyle != "qmark":
+                days = {row[0].astimezone(timezone.utc).date() for row in contracts}
+                new_partitions = days - self._partitions
+                for day in sorted(new_partitions):
+                    ensure_daily_partition(cur, day)
+            if contracts:
+                _insert_contracts(cur, paramstyle, contracts)
+            conn.commit()
+            cur.close()
+            self._partitions |= new_partitions
+            healthy = True
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:  # pragma: no cover - connection already broken
+                pass
+            raise
+        finally:
+            connection_pool.putconn(conn, close=not healthy)
+
+
+def _to_datetime64(values: List) -> np.ndarray:
+    """Convert database timestamps to naive UTC ``datetime64[us]``."""
+
+    converted = []
+    for value in values:
+        if isinstance(value, datetime) and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        converted.append(value)
+    return np.array(converted, dtype="datetime64[us]")
+
+
+def _query(connection_pool, sql: str, params: Tuple) -> List[Tuple]:
+    if _paramstyle(connection_pool) == "qmark":
+        sql = sql.replace("%s", "?")
+        params = tuple(_sqlite_timestamp(p) if isinstance(p, datetime) else p for p in params)
+    conn = connection_pool.getconn()
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+        cur.close()
+        return rows
+    finally:
+        connection_pool.putconn(conn)
+
+
+def _as_columns(rows: List[Tuple], columns: Tuple[str, ...], as_frame: bool):
+    values = list(zip(*rows)) if rows else [[] for _ in columns]
+    result = {}
+    for name, column in zip(columns, values):
+        if name == "fetched_at":
+            result[name] = _to_datetime64(list(column))
+        elif name in ("symbol", "expiry", "contract_type"):
+            result[name] = np.array([str(v) for v in column], dtype=object)
+        else:
+            result[name] = np.array(column, dtype=np.float64)
+    if as_frame:
+        import pandas as pd
+
+        return pd.DataFrame(result)
+    return result
+
+
+def _filter_contracts(sql: str, params: Tuple, strike: Optional[float], symbol: Optional[str]) -> Tuple[str, Tuple]:
+    if strike is not None:
+        sql += " AND strike = %s"
+        params += (strike,)
+    if symbol is not None:
+        sql += " AND symbol = %s"
+        params += (symbol,)
+    return sql, params
+
+
+def load_contract_history(
+    connection_pool,
+    start: datetime,
+    end: datetime,
+    strike: Optional[float] = None,
+    as_frame: bool = False,
+    symbol: Optional[str] = None,
+):
+    """Return per-contract rows with ``start <= fetched_at < end``.
+
+    The result maps each name in ``CONTRACT_COLUMNS`` to a NumPy array (with
+    ``fetched_at`` as naive UTC ``datetime64``), or a ``pandas.DataFrame``
+    when ``as_frame`` is true.  Pass ``symbol`` to select one underlying
+    when several are stored.
+    """
+
+    sql = f"SELECT {', '.join(CONTRACT_COLUMNS)} FROM spx_option_contracts WHERE fetched_at >= %s AND fetched_at < %s"
+    params: Tuple = (start, end)
+    sql, params = _filter_contracts(sql, params, strike, symbol)
+    sql += " ORDER BY fetched_at, strike"
+    return _as_columns(_query(connection_pool, sql, params), CONTRACT_COLUMNS, as_frame)
+
+
+def load_strike_exposure_history(
+    connection_pool,
+    start: datetime,
+    end: datetime,
+    strike: Optional[float] = None,
+    as_frame: bool = False,
+    symbol: Optional[str] = None,
+):
+    """Return net gamma exposure per ``(fetched_at, strike)`` within a time window."""
+
+    sql = (
+        "SELECT fetched_at, strike, SUM(gamma_exposure) FROM spx_option_contracts "
+        "WHERE fetched_at >= %s AND fetched_at < %s"
+    )
+    params: Tuple = (start, end)
+    sql, params = _filter_contracts(sql, params, strike, symbol)
+    sql += " GROUP BY fetched_at, strike ORDER BY fetched_at, strike"
+    columns = ("fetched_at", "strike", "gamma_exposure")
+    return _as_columns(_query(connection_pool, sql, params), columns, as_frame)
+
+
+def _from_db_timestamp(value: Any) -> datetime:
+    if isinstance(value, str):
+        # SQLite rows hold naive UTC ISO text (see ``_sqlite_timestamp``).
+        return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+    return value
+
+
+def iter_raw_snapshots(
+    connection_pool,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    itersize: int = 100,
+    symbol: Optional[str] = None,
+) -> Iterable[Tuple[datetime, Dict]]:
+    """Stream ``(fetched_at, snapshot)`` from ``spx_options_data`` in fetch order.
+
+    PostgreSQL rows are read through a server-side cursor so only ``itersize``
+    snapshots are held in memory at a time.  ``symbol`` keeps only chains
+    whose ``symbol`` field matches, for tables shared by several underlyings.
+    """
+
+    paramstyle = _paramstyle(connection_pool)
+    placeholder = "?" if paramstyle == "qmark" else "%s"
+    clauses, params = [], []
+    for bound, operator in ((start, ">="), (end, "<=")):
+        if bound is not None:
+            clauses.append(f"fetched_at {operator} {placeholder}")
+            params.append(_sqlite_timestamp(bound) if paramstyle == "qmark" else bound)
+    if symbol is not None:
+        field = "json_extract(data, '$.symbol')" if paramstyle == "qmark" else "data->>'symbol'"
+        clauses.append(f"{field} = {placeholder}")
+        params.append(symbol)
+    sql = "SELECT fetched_at, data FROM spx_options_data"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY fetched_at, id"
+
+    conn = connection_pool.getconn()
+    try:
+        if paramstyle == "qmark":
+            cur = conn.cursor()
+        else:
+            cur = conn.cursor(name="iter_raw_snapshots")
+            cur.itersize = itersize
+        cur.execute(sql, tuple(params))
+        for fetched_at, data in cur:
+            # JSONB columns arrive decoded; TEXT columns need parsing.
+            if isinstance(data, (str, bytes)):
+                data = json.loads(data)
+            yield _from_db_timestamp(fetched_at), data
+        cur.close()
+        conn.rollback()
+    finally:
+        connection_pool.putconn(conn)
+
+
+def latest_snapshots_before(
+    connection_pool,
+    at: datetime,
+    since: Optional[datetime] = None,
+    symbol: Optional[str] = None,
+) -> List[Tuple[datetime, Dict]]:
+    """Return the last ``spx_options_data`` snapshot of each symbol fetched before ``at``.
+
+    ``since`` bounds how far back to look.  Used to seed analysis state when
+    a time range is processed on its own.
+    """
+
+    paramstyle = _paramstyle(connection_pool)
+    field = "json_extract(data, '$.symbol')" if paramstyle == "qmark" else "data->>'symbol'"
+    sql = "FROM spx_options_data WHERE fetched_at < %s"
+    params: Tuple = (at,)
+    if since is not None:
+        sql += " AND fetched_at >= %s"
+        params += (since,)
+    if symbol is not None:
+        sql += f" AND {field} = %s"
+        params += (symbol,)
+    if paramstyle == "qmark":
+        # SQLite returns the bare columns of the row holding MAX(fetched_at)
+        sql = f"SELECT MAX(fetched_at), data {sql} GROUP BY {field} ORDER BY {field}"
+    else:
+        sql = f"SELECT DISTINCT ON ({field}) fetched_at, data {sql} ORDER BY {field}, fetched_at DESC, id DESC"
+    return [
+        (_from_db_timestamp(fetched_at), json.loads(data) if isinstance(data, (str, bytes)) else data)
+        for fetched_at, data in _query(connection_pool, sql, params)
+    ]
+
+
+def _delta_records(
+    connection_pool, start: datetime, end: datetime, symbol: Optional[str]
+) -> Iterable[Tuple[datetime, Optional[str], Dict]]:
+    """Yield ``(fetched_at, symbol, snapshot)`` for delta-encoded rows up to ``end``.
+
+    Rows are read from the oldest of the latest keyframes at or before
+    ``start`` of every symbol (only ``symbol`` when given), and each symbol's
+    deltas are applied to its own previous snapshot.
+    """
+
+    symbol_filter = " AND symbol = %s" if symbol is not None else ""
+    symbol_params: Tuple = (symbol,) if symbol is not None else ()
+    rows = _query(
+        connection_pool,
+        "SELECT fetched_at, symbol, is_keyframe, payload FROM spx_options_deltas "
+        "WHERE id >= COALESCE((SELECT MIN(id) FROM (SELECT MAX(id) AS id FROM spx_options_deltas "
+        f"WHERE is_keyframe = %s AND fetched_at <= %s{symbol_filter} GROUP BY symbol) AS keyframes), 0) "
+        f"AND fetched_at <= %s{symbol_filter} ORDER BY id",
+        (True, start) + symbol_params + (end,) + symbol_params,
+    )
+    snapshots: Dict[Optional[str], Dict] = {}
+    for fetched_at, row_symbol, is_keyframe, payload in rows:
+        decoded = json.loads(payload)
+        if is_keyframe:
+            snapshot = decoded
+        elif row_symbol not in snapshots:
+            continue  # deltas preceding the symbol's first stored keyframe cannot be decoded
+        else:
+            snapshot = apply_delta(snapshots[row_symbol], decoded)
+        snapshots[row_symbol] = snapshot
+        yield _from_db_timestamp(fetched_at), row_symbol, snapshot
+
+
+def iter_delta_snapshots(
+    connection_pool, start: datetime, end: datetime, symbol: Optional[str] = None
+) -> Iterable[Tuple[datetime, Dict]]:
+    """Yield ``(fetched_at, snapshot)`` for delta-encoded rows with ``start <= fetched_at <= end``.
+
+    Decoding starts from the latest keyframe at or before ``start`` so every
+    yielded snapshot is fully materialized.  ``symbol`` keeps only chains of
+    that underlying.
+    """
+
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    for fetched_at, _, snapshot in _delta_records(connection_pool, start, end, symbol):
+        if fetched_at >= start:
+            yield fetched_at, snapshot
+
+
+def reconstruct_snapshot(connection_pool, at: datetime, symbol: Optional[str] = None) -> Optional[Dict]:
+    """Materialize the most recent delta-encoded snapshot (of ``symbol``) stored at or before ``at``."""
+
+    snapshot = None
+    for _, _, snapshot in _delta_records(connection_pool, at, at, symbol):
+        pass
+    return snapshot
+
 
 def store_raw_options_data(db_params, data, now):
+    """Synchronously store a single snapshot using a short-lived connection."""
+
     try:
-        # Optionally, print a snapshot of the data to be stored for inspection
-        print("Snapshot of data to be stored:")
-        print(json.dumps(data, indent=4, sort_keys=True)[:3000])  # Prints the first 1000 characters of the JSON data
-        
-        # Connect to the PostgreSQL database
         conn = psycopg2.connect(**db_params)
         cur = conn.cursor()
-        
-        # Insert the data into the spx_options_data table
         cur.execute("INSERT INTO spx_options_data (data, fetched_at) VALUES (%s, %s)", (json.dumps(data), now))
-        
-        # Commit the transaction
         conn.commit()
-        
-        # Indicate successful storage
         print("Data stored successfully.")
-        
-        # Close the cursor and connection
         cur.close()
         conn.close()
     except Exception as e:
-        print(f"Failed to store raw options data: {e}")
\ No newline at end of file
+        print(f"Failed to store raw options data: {e}")
@@ -0,0 +1,359 @@
+"""Local cache of analysed frames in memory-mapped columnar files.
+
+A restarted scheduler would otherwise come back with empty plots, and
+rebuilding the day from ``spx_options_data`` means re-parsing every stored
+chain (and a reachable database).  :class:`FrameCache` appends each
+:class:`pipeline.AnalysisFrame` to raw NumPy column files, one directory per
+session day, and :meth:`FrameCache.load` maps a day back without parsing
+anything, so the pipeline and plotter warm-start in milliseconds.
+
+Layout of ``<directory>/<YYYY-MM-DD>/``:
+
+* one row per frame: ``time``, ``total_gamma_exposure``, ``spot_price``,
+  the end offsets ``strike_end``/``change_end`` into the tables below and
+  the chain-wide total of each exposure metric (``exposure_vanna`` and so
+  on, ``NaN`` for metrics the pipeline does not compute);
+* one row per frame and strike: ``strike``, ``gamma_exposure`` and
+  ``change_in_gamma`` (``NaN`` for strikes without a previous value);
+* one row per largest change: ``change_time``, ``change_strike``, ``change``;
+* ``rows.i8``: the format version and the committed row count of each table.
+
+Columns are written before the counts, so a process killed mid-append
+leaves the previous frame as the last complete one.  ``time`` only grows,
+which makes it the timestamp index (see :meth:`CachedFrames.index`).  Days
+written in an older format are not loaded and start afresh on the next
+append.
+Writes reach the page cache immediately and survive a crashed process;
+files are flushed to disk every ``flush_interval`` seconds and on close.
+"""
+
+import datetime
+import math
+import os
+import re
+import shutil
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pytz
+
+from greek_exposure import EXPOSURE_METRICS
+from timeseries import to_datetime64
+
+FORMAT_VERSION = 2
+EASTERN = pytz.timezone("US/Eastern")
+
+FRAME_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("time", "datetime64[us]"),
+    ("total_gamma_exposure", "float64"),
+    ("spot_price", "float64"),
+    ("strike_end", "int64"),
+    ("change_end", "int64"),
+) + tuple((f"exposure_{name}", "float64") for name in EXPOSURE_METRICS)
+STRIKE_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("strike", "float64"),
+    ("gamma_exposure", "float64"),
+    ("change_in_gamma", "float64"),
+)
+CHANGE_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("change_time", "datetime64[us]"),
+    ("change_strike", "float64"),
+    ("change", "float64"),
+)
+# Tables in the order of their counts in ``rows.i8``
+TABLES = (FRAME_COLUMNS, STRIKE_COLUMNS, CHANGE_COLUMNS)
+
+
+def session_day(timestamp: datetime.datetime) -> datetime.date:
+    """Return the US/Eastern date of ``timestamp``; naive times are taken as US/Eastern."""
+
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(EASTERN)
+    return timestamp.date()
+
+
+def cache_directory(root: str, key: Optional[str]) -> str:
+    """Return the cache directory below ``root`` for the watchlist job ``key``."""
+
+    return os.path.join(root, re.sub(r"[^A-Za-z0-9_.-]+", "_", key)) if key else root
+
+
+def _read_counts(day_directory: str) -> Optional[np.ndarray]:
+    path = os.path.join(day_directory, "rows.i8")
+    if not os.path.exists(path):
+        return None
+    counts = np.fromfile(path, dtype=np.int64, count=1 + len(TABLES))
+    if len(counts) != 1 + len(TABLES) or counts[0] != FORMAT_VERSION:
+        raise ValueError(f"{day_directory} is not a version {FORMAT_VERSION} frame cache")
+    return counts[1:]
+
+
+class _MappedColumn:
+    """Append-only column file, mapped with headroom and remapped larger as it fills."""
+
+    initial_capacity = 4096
+
+    def __init__(self, path: str, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        if not os.path.exists(path):
+            open(path, "wb").close()
+        self.capacity = os.path.getsize(path) // self.dtype.itemsize
+        self.array: Optional[np.memmap] = None
+        if self.capacity:
+            self.array = np.memmap(path, dtype=self.dtype, mode="r+", shape=(self.capacity,))
+
+    def write(self, start: int, values) -> None:
+        end = start + len(values)
+        if end > self.capacity:
+            self._grow(end)
+        self.array[start:end] = values
+
+    def _grow(self, rows: int) -> None:
+        capacity = max(rows, 2 * self.capacity, self.initial_capacity)
+        # Dropping the old map keeps its dirty pages in the page cache; no flush needed
+        self.array = None
+        with open(self.path, "r+b") as handle:
+            handle.truncate(capacity * self.dtype.itemsize)
+        self.capacity = capacity
+        self.array = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=(capacity,))
+
+    def flush(self) -> None:
+        if self.array is not None:
+            self.array.flush()
+
+
+class _DayWriter:
+    """Appends frames to the column files of one day."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        try:
+            counts = _read_counts(directory)
+        except ValueError as e:
+            # Only a cache: replace a day written in another format
+            print(f"Discarding frame cache: {e}")
+            shutil.rmtree(directory)
+            os.makedirs(directory)
+            counts = None
+        self.columns = {
+            name: _MappedColumn(os.path.join(directory, f"{name}.bin"), dtype)
+            for table in TABLES
+            for name, dtype in table
+        }
+        path = os.path.join(directory, "rows.i8")
+        if counts is None:
+            np.array([FORMAT_VERSION] + [0] * len(TABLES), dtype=np.int64).tofile(path)
+        self._rows = np.memmap(path, dtype=np.int64, mode="r+", shape=(1 + len(TABLES),))
+
+    def append(self, frame) -> None:
+        frames, strike_rows, change_rows = (int(count) for count in self._rows[1:])
+        exposure = frame.per_strike_gamma_exposure
+        changes = frame.change_in_gamma_per_strike
+        strikes = np.fromiter(exposure, dtype=np.float64, count=len(exposure))
+        values = np.fromiter(exposure.values(), dtype=np.float64, count=len(exposure))
+        change = np.fromiter((changes.get(strike, np.nan) for strike in exposure), dtype=np.float64, count=len(exposure))
+        largest = frame.largest_changes
+
+        columns = self.columns
+        columns["strike"].write(strike_rows, strikes)
+        columns["gamma_exposure"].write(strike_rows, values)
+        columns["change_in_gamma"].write(strike_rows, change)
+        if largest:
+            columns["change_time"].write(change_rows, [to_datetime64(timestamp) for _, _, timestamp in largest])
+            columns["change_strike"].write(change_rows, [strike for strike, _, _ in largest])
+            columns["change"].write(change_rows, [value for _, value, _ in largest])
+        columns["time"].write(frames, [to_datetime64(frame.timestamp)])
+        columns["total_gamma_exposure"].write(frames, [frame.total_gamma_exposure])
+        columns["spot_price"].write(frames, [frame.spot_price])
+        columns["strike_end"].write(frames, [strike_rows + len(strikes)])
+        columns["change_end"].write(frames, [change_rows + len(largest)])
+        totals = frame.exposures.totals() if frame.exposures is not None else {}
+        for name in EXPOSURE_METRICS:
+            columns[f"exposure_{name}"].write(frames, [totals.get(name, np.nan)])
+        # Commit: counts are updated only once every column holds the frame
+        self._rows[1:] = (frames + 1, strike_rows + len(strikes), change_rows + len(largest))
+
+    def flush(self) -> None:
+        for column in self.columns.values():
+            column.flush()
+        self._rows.flush()
+
+
+class CachedFrames:
+    """Read-only, memory-mapped view of the frames cached for one day.
+
+    Every column of :data:`FRAME_COLUMNS`, :data:`STRIKE_COLUMNS` and
+    :data:`CHANGE_COLUMNS` is an attribute holding a NumPy array of its
+    committed rows.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        counts = _read_counts(directory)
+        if counts is None:
+            raise FileNotFoundError(f"No frame cache in {directory}")
+        for table, rows in zip(TABLES, counts):
+            for name, dtype in table:
+                if rows:
+                    array = np.memmap(os.path.join(directory, f"{name}.bin"), dtype=dtype, mode="r", shape=(int(rows),))
+                else:
+                    array = np.empty(0, dtype=dtype)
+                setattr(self, name, array)
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def index(self, timestamp) -> int:
+        """Return the index of the last frame at or before ``timestamp`` (``-1`` if none)."""
+
+        return int(np.searchsorted(self.time, to_datetime64(timestamp), side="right")) - 1
+
+    def _strike_rows(self, index: int) -> slice:
+        return slice(int(self.strike_end[index - 1]) if index > 0 else 0, int(self.strike_end[index]))
+
+    def per_strike(self, index: int = -1) -> Tuple[Dict[float, float], Dict[float, float]]:
+        """Return the per-strike exposure and change dictionaries of frame ``index``."""
+
+        index = index % len(self)
+        rows = self._strike_rows(index)
+        strikes = self.strike[rows].tolist()
+        changes = self.change_in_gamma[rows]
+        changed = np.isfinite(changes)
+        exposure = dict(zip(strikes, self.gamma_exposure[rows].tolist()))
+        change = dict(zip(np.asarray(strikes)[changed].tolist(), changes[changed].tolist()))
+        return exposure, change
+
+    def change_frames(self) -> np.ndarray:
+        """Index of the frame each largest-change row belongs to."""
+
+        per_frame = np.diff(self.change_end, prepend=0)
+        return np.repeat(np.arange(len(self)), per_frame)
+
+    def restore_pipeline(self, pipeline) -> None:
+        """Resume ``pipeline`` from the last cached frame, so the next change is against it.
+
+        Incremental pipelines diff contracts rather than strikes and start
+        from their next full snapshot instead.
+        """
+
+        if not len(self):
+            return
+        exposure, change = self.per_strike()
+        pipeline.current_gamma_exposure = exposure
+        pipeline.previous_gamma_exposure = exposure.copy()
+        pipeline.change_in_gamma_per_strike = change
+        pipeline.exposure_totals = {
+            name: float(getattr(self, f"exposure_{name}")[-1])
+            for name in pipeline.exposure_metrics
+            if math.isfinite(getattr(self, f"exposure_{name}")[-1])
+        }
+
+    def restore_plotter(self, plotter) -> None:
+        """Refill the plotter's time series and change statistics with the cached frames."""
+
+        if len(self):
+            plotter.restore_frames(
+                self.time,
+                self.total_gamma_exposure,
+                self.spot_price,
+                self.change_frames(),
+                self.change_time,
+                self.change_strike,
+                self.change,
+            )
+
+
+class FrameCache:
+    """Append analysed frames to per-day memory-mapped column files.
+
+    Parameters
+    ----------
+    directory:
+        Root of this cache; each session day is a subdirectory.  Use one
+        cache (see :func:`cache_directory`) per watchlist job.
+    retention_days:
+        Day directories older than this many days are deleted when the cache
+        opens and whenever a new day starts.
+    flush_interval:
+        Seconds between flushes of the mapped files to disk.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        retention_days: int = 5,
+        flush_interval: float = 60.0,
+        clock=time.monotonic,
+    ):
+        self.directory = directory
+        self.retention_days = retention_days
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.day: Optional[datetime.date] = None
+        self._writer: Optional[_DayWriter] = None
+        self._flushed_at = clock()
+        os.makedirs(directory, exist_ok=True)
+        self.evict()
+
+    def days(self) -> List[datetime.date]:
+        """Cached session days, oldest first."""
+
+        days = []
+        for name in os.listdir(self.directory):
+            try:
+                days.append(datetime.date.fromisoformat(name))
+            except ValueError:
+                continue
+        return sorted(days)
+
+    def day_directory(self, day: datetime.date) -> str:
+        return os.path.join(self.directory, day.isoformat())
+
+    def load(self, day: Optional[datetime.date] = None) -> Optional[CachedFrames]:
+        """Map the frames cached for ``day`` (default today, US/Eastern); ``None`` if there are none."""
+
+        day = day or datetime.datetime.now(EASTERN).date()
+        directory = self.day_directory(day)
+        try:
+            if _read_counts(directory) is None:
+                return None
+        except ValueError as e:
+            print(f"Ignoring frame cache: {e}")
+            return None
+        return CachedFrames(directory)
+
+    def append(self, frame) -> None:
+        """Add ``frame`` (a :class:`pipeline.AnalysisFrame`) to its day's files."""
+
+        day = session_day(frame.timestamp)
+        if day != self.day:
+            self.close()
+            self._writer = _DayWriter(self.day_directory(day))
+            self.day = day
+            self.evict(day)
+        self._writer.append(frame)
+        if self.clock() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def evict(self, today: Optional[datetime.date] = None) -> List[datetime.date]:
+        """Delete days older than ``retention_days`` before ``today``; return the deleted days."""
+
+        today = today or datetime.datetime.now(EASTERN).date()
+        cutoff = today - datetime.timedelta(days=self.retention_days)
+        evicted = [day for day in self.days() if day < cutoff and day != self.day]
+        for day in evicted:
+            shutil.rmtree(self.day_directory(day), ignore_errors=True)
+        return evicted
+
+    def flush(self) -> None:
+        if self._writer is not None:
+            self._writer.flush()
+        self._flushed_at = self.clock()
+
+    def close(self) -> None:
+        self.flush()
+        self._writer = None
+        self.day = None
@@ -1,7 +1,9 @@
 """Utilities for calculating gamma exposure metrics."""
 
 import datetime
-from typing import Dict, Tuple, List, Optional
+from typing import Dict, Tuple, List, NamedTuple, Optional, Union
+
+import numpy as np
 
 
 GammaCalculationResult = Tuple[
@@ -12,71 +14,259 @@ GammaCalculationResult = Tuple[
     float,
 ]
 
+CONTRACT_SIZE = 100
+
+
+class OptionChainArrays(NamedTuple):
+    """Columnar view of an option chain, one row per contract."""
+
+    strike: np.ndarray
+    gamma: np.ndarray
+    volume: np.ndarray
+    open_interest: np.ndarray
+    implied_volatility: np.ndarray
+    delta: np.ndarray
+    sign: np.ndarray
+    expiry: np.ndarray
+    expiries: Tuple[str, ...]
+    spot_price: float
+    symbol: Optional[str] = None
+
+
+# Fields of :class:`OptionChainArrays` holding one value per contract
+_CONTRACT_COLUMNS = ("strike", "gamma", "volume", "open_interest", "implied_volatility", "delta", "sign", "expiry")
+
+
+def _as_float_array(values: List, label: str, valid: Optional[np.ndarray] = None) -> np.ndarray:
+    """Convert ``values`` to float64, marking unusable rows invalid.
+
+    Unconvertible entries become ``NaN``.  When a ``valid`` mask is supplied,
+    rows that are not finite after conversion (including ``None`` and
+    ``"NaN"``) are marked invalid, as the per-contract loop used to skip them.
+    """
+
+    try:
+        converted = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        converted = np.empty(len(values), dtype=np.float64)
+        for index, value in enumerate(values):
+            try:
+                converted[index] = float(value)
+            except (TypeError, ValueError):
+                converted[index] = np.nan
+    if valid is not None:
+        finite = np.isfinite(converted)
+        if not finite.all():
+            for index in np.flatnonzero(~finite & valid).tolist():
+                print(f"Contract {index} included incompatible {label}: {values[index]!r}")
+            valid &= finite
+    return converted
+
+
+def flatten_option_chain(data: Dict, drop_invalid: bool = True) -> OptionChainArrays:
+    """Flatten ``callExpDateMap``/``putExpDateMap`` into contract-level arrays.
+
+    Strike keys are converted once per strike rather than once per contract,
+    and rows whose numeric fields cannot be interpreted are dropped (see
+    :func:`chain_arrays_from_columns` for ``drop_invalid``).
+    """
+
+    strikes: List[float] = []
+    gammas: List = []
+    volumes: List = []
+    open_interests: List = []
+    volatilities: List = []
+    deltas: List = []
+    signs: List[int] = []
+    expiry_codes: List[int] = []
+    expiries: List[str] = []
+    expiry_index: Dict[str, int] = {}
+
+    for map_name, sign in (("callExpDateMap", 1), ("putExpDateMap", -1)):
+        for expiry, strike_map in data.get(map_name, {}).items():
+            code = expiry_index.get(expiry)
+            if code is None:
+                code = expiry_index[expiry] = len(expiries)
+                expiries.append(expiry)
+            for strike, options in strike_map.items():
+                try:
+                    strike_value = float(strike)
+                except (TypeError, ValueError) as exc:
+                    print(f"Strike {strike} included incompatible data: {exc}")
+                    continue
+                for option in options:
+                    strikes.append(strike_value)
+                    gammas.append(option["gamma"])
+                    volumes.append(option["totalVolume"])
+                    open_interests.append(option.get("openInterest", 0))
+                    volatilities.append(option.get("volatility", np.nan))
+                    deltas.append(option.get("delta", np.nan))
+                    signs.append(sign)
+                    expiry_codes.append(code)
+
+    return chain_arrays_from_columns(
+        strikes, gammas, volumes, open_interests, volatilities, signs, expiry_codes, expiries,
+        data.get("underlyingPrice", 0), data.get("symbol"), deltas, drop_invalid,
+    )
+
+
+def chain_arrays_from_columns(
+    strikes: List[float],
+    gammas: List,
+    volumes: List,
+    open_interests: List,
+    volatilities: List,
+    signs: List[int],
+    expiry_codes: List[int],
+    expiries: List[str],
+    spot_price: float,
+    symbol: Optional[str] = None,
+    deltas: Optional[List] = None,
+    drop_invalid: bool = True,
+) -> OptionChainArrays:
+    """Build :class:`OptionChainArrays` from per-contract column lists, dropping invalid rows.
+
+    Missing ``deltas`` are ``NaN``.  Rows without a finite strike are always
+    dropped; with ``drop_invalid=False`` rows whose gamma or volume is not
+    finite are kept (as ``NaN``) for callers that fill them in themselves,
+    and :func:`valid_contracts` drops them later.
+    """
+
+    valid = np.ones(len(strikes), dtype=bool)
+    strike = _as_float_array(strikes, "strike", valid)
+    gamma = _as_float_array(gammas, "gamma", valid if drop_invalid else None)
+    volume = _as_float_array(volumes, "volume", valid if drop_invalid else None)
+    open_interest = _as_float_array(open_interests, "open interest")
+    implied_volatility = _as_float_array(volatilities, "volatility")
+    delta = _as_float_array(deltas, "delta") if deltas is not None else np.full(len(strikes), np.nan)
+    columns = (
+        strike,
+        gamma,
+        volume,
+        open_interest,
+        implied_volatility,
+        delta,
+        np.asarray(signs, dtype=np.int8),
+        np.asarray(expiry_codes, dtype=np.int32),
+    )
+    if not valid.all():
+        columns = tuple(column[valid] for column in columns)
+
+    return OptionChainArrays(
+        *columns,
+        expiries=tuple(expiries),
+        spot_price=spot_price,
+        symbol=symbol,
+    )
+
+
+def valid_contracts(chain: OptionChainArrays) -> OptionChainArrays:
+    """Drop the contracts whose gamma or volume is not finite, as flattening does by default."""
+
+    valid = np.isfinite(chain.gamma) & np.isfinite(chain.volume)
+    if valid.all():
+        return chain
+    return chain._replace(**{name: getattr(chain, name)[valid] for name in _CONTRACT_COLUMNS})
+
+
+class StrikeExposure(NamedTuple):
+    """Per-strike gamma exposure maintained outside a full option chain, e.g. from streamed quotes."""
+
+    per_strike_gamma_exposure: Dict[float, float]
+    spot_price: float
+
+
+def gamma_exposure_scale(spot_price: float) -> float:
+    """Return the factor turning ``sign * gamma * volume`` into $Bn per 1% move at ``spot_price``."""
+
+    return spot_price * spot_price * CONTRACT_SIZE * 0.01 / 1000000000
+
+
+def gamma_exposure_per_contract(chain: OptionChainArrays) -> np.ndarray:
+    """Return the signed gamma exposure ($Bn per 1% move) of every contract."""
+
+    # ``underlyingPrice`` may be a JSON integer; int8 signs must not meet a Python int
+    spot_price = float(chain.spot_price)
+    return (
+        chain.sign
+        * spot_price
+        * chain.gamma
+        * chain.volume
+        * CONTRACT_SIZE
+        * spot_price
+        * 0.01
+        / 1000000000
+    )
+
+
+def aggregate_by_strike(strikes: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Sum ``values`` per unique strike, ordered by first appearance."""
+
+    unique_strikes, first_index, inverse = np.unique(
+        strikes, return_index=True, return_inverse=True
+    )
+    totals = np.bincount(inverse.ravel(), weights=values, minlength=len(unique_strikes))
+    order = np.argsort(first_index, kind="stable")
+    return unique_strikes[order], totals[order]
+
 
 def calculate_gamma_exposure(
-    data: Dict,
+    data: Union[Dict, OptionChainArrays],
     previous_gamma_exposure: Optional[Dict[float, float]] = None,
+    calculation_time: Optional[datetime.datetime] = None,
 ) -> GammaCalculationResult:
-    """Compute gamma exposure statistics for the provided option chain data."""
+    """Compute gamma exposure statistics for the provided option chain data.
+
+    ``data`` is an option chain or its already flattened arrays.
+    ``calculation_time`` stamps the largest changes and defaults to now; pass
+    the snapshot's fetch time when replaying recorded data.
+    """
+
+    chain = data if isinstance(data, OptionChainArrays) else flatten_option_chain(data)
+    strikes, exposures = aggregate_by_strike(chain.strike, gamma_exposure_per_contract(chain))
+    return summarize_gamma_exposure(
+        strikes, exposures, chain.spot_price, previous_gamma_exposure, calculation_time
+    )
+
+
+def summarize_gamma_exposure(
+    strikes: np.ndarray,
+    exposures: np.ndarray,
+    spot_price: float,
+    previous_gamma_exposure: Optional[Dict[float, float]] = None,
+    calculation_time: Optional[datetime.datetime] = None,
+) -> GammaCalculationResult:
+    """Build the :data:`GammaCalculationResult` for per-strike ``exposures``.
+
+    Shared by :func:`calculate_gamma_exposure` and callers that maintain
+    per-strike exposure themselves (see :class:`StrikeExposure`).
+    """
 
     previous_gamma_exposure = previous_gamma_exposure or {}
-    per_strike_gamma_exposure: Dict[float, float] = {}
-    change_in_gamma_per_strike: Dict[float, float] = {}
-    time_of_change_per_strike: Dict[float, datetime.datetime] = {}
-    contract_size = 100
-    spot_price = data.get("underlyingPrice", 0)
-    calculation_time = datetime.datetime.now()
-
-    def add_gamma_exposure(option_type: str, strike: str, gamma: float, volume: float) -> None:
-        try:
-            multiplier = 1 if option_type == "call" else -1
-            gamma_exposure = (
-                multiplier
-                * spot_price
-                * gamma
-                * volume
-                * contract_size
-                * spot_price
-                * 0.01
-                / 1000000000
-            )
-            strike_value = float(strike)
-
-            per_strike_gamma_exposure[strike_value] = (
-                per_strike_gamma_exposure.get(strike_value, 0.0) + gamma_exposure
-            )
-
-            if strike_value in previous_gamma_exposure and previous_gamma_exposure[strike_value] != 0:
-                previous_exposure = previous_gamma_exposure[strike_value]
-                change = per_strike_gamma_exposure[strike_value] - previous_exposure
-                change_in_gamma_per_strike[strike_value] = change
-                time_of_change_per_strike[strike_value] = calculation_time
-
-        except Exception as exc:  # pragma: no cover - defensive logging
-            print(f"Strike {strike} included incompatible data: {exc}")
-
-    for _, strikes in data.get("callExpDateMap", {}).items():
-        for strike, options in strikes.items():
-            for option in options:
-                add_gamma_exposure("call", strike, option["gamma"], option["totalVolume"])
-
-    for _, strikes in data.get("putExpDateMap", {}).items():
-        for strike, options in strikes.items():
-            for option in options:
-                add_gamma_exposure("put", strike, option["gamma"], option["totalVolume"])
+    calculation_time = calculation_time or datetime.datetime.now()
+    strikes = np.asarray(strikes, dtype=np.float64)
+    exposures = np.asarray(exposures, dtype=np.float64)
+    strike_list = strikes.tolist()
+    per_strike_gamma_exposure: Dict[float, float] = dict(zip(strike_list, exposures.tolist()))
+
+    previous = np.fromiter(
+        (previous_gamma_exposure.get(strike, 0.0) for strike in strike_list),
+        dtype=np.float64,
+        count=len(strike_list),
+    )
+    has_previous = previous != 0
+    changed_strikes = strikes[has_previous]
+    changes = exposures[has_previous] - previous[has_previous]
+    change_in_gamma_per_strike: Dict[float, float] = dict(
+        zip(changed_strikes.tolist(), changes.tolist())
+    )
 
     total_gamma_exposure = sum(per_strike_gamma_exposure.values())
     print(total_gamma_exposure)
-    largest_changes_with_time = sorted(
-        change_in_gamma_per_strike.items(), key=lambda item: abs(item[1]), reverse=True
-    )[:5]
+    top = np.argsort(-np.abs(changes), kind="stable")[:5]
     largest_changes = [
-        (
-            strike,
-            change,
-            time_of_change_per_strike[strike],
-        )
-        for strike, change in largest_changes_with_time
+        (strike, change, calculation_time)
+        for strike, change in zip(changed_strikes[top].tolist(), changes[top].tolist())
     ]
     print(largest_changes)
 
@@ -0,0 +1,237 @@
+"""Gamma, delta, vanna and charm exposure per strike and expiry in one pass.
+
+:func:`calculate_exposures` flattens a chain once, evaluates every requested
+metric for all contracts as NumPy columns and aggregates them with a single
+grouping by ``(expiry, strike)``.  The result is one structured array, so
+adding a metric costs one more column rather than another pass over the
+chain.
+
+Metrics (all in $Bn, positioned like gamma exposure: dealers long the calls
+and short the puts):
+
+* ``gamma``: gamma exposure weighted by volume, per 1% move (the figure of
+  :func:`gamma_analysis.calculate_gamma_exposure`, except that contracts
+  without a usable broker gamma are modelled rather than dropped);
+* ``gamma_oi``: the same weighted by open interest;
+* ``delta``: delta notional of the open interest;
+* ``vanna``: change of that delta notional per volatility point;
+* ``charm``: change of that delta notional per calendar day.
+
+Broker gamma and delta are used where present.  Missing ones (including the
+``-999`` sentinel), and vanna and charm, which brokers do not send, come
+from a batched Black-Scholes evaluation at each contract's implied
+volatility.  Contracts whose greeks cannot be determined, or whose volume or
+open interest is missing or negative, contribute nothing to the metrics
+weighted by it.
+"""
+
+import datetime
+import math
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pytz
+
+from gamma_analysis import CONTRACT_SIZE, OptionChainArrays, flatten_option_chain, gamma_exposure_scale
+
+try:
+    from scipy.special import ndtr as _ndtr
+except ModuleNotFoundError:  # pragma: no cover - optional accelerator
+    _ndtr = None
+
+EXPOSURE_METRICS: Tuple[str, ...] = ("gamma", "gamma_oi", "delta", "vanna", "charm")
+
+EASTERN = pytz.timezone("US/Eastern")
+# Contracts stop trading at the close; later times are clamped to this much time left
+MIN_YEARS = 1.0 / (365.0 * 24.0 * 60.0)
+_INV_SQRT_2PI = 1.0 / math.sqrt(2.0 * math.pi)
+
+
+class BlackScholesGreeks(NamedTuple):
+    """Greeks per contract; ``charm`` is the change of delta per year."""
+
+    delta: np.ndarray
+    gamma: np.ndarray
+    vanna: np.ndarray
+    charm: np.ndarray
+
+
+def _norm_pdf(x: np.ndarray) -> np.ndarray:
+    return np.exp(-0.5 * x * x) * _INV_SQRT_2PI
+
+
+def _norm_cdf(x: np.ndarray) -> np.ndarray:
+    if _ndtr is not None:
+        return _ndtr(x)
+    # Abramowitz & Stegun 26.2.17, absolute error below 7.5e-8
+    z = np.abs(x)
+    t = 1.0 / (1.0 + 0.2316419 * z)
+    poly = t * (0.319381530 + t * (-0.356563782 + t * (1.781477937 + t * (-1.821255978 + t * 1.330274429))))
+    upper = _norm_pdf(z) * poly
+    return np.where(x >= 0, 1.0 - upper, upper)
+
+
+def black_scholes_greeks(
+    spot: float,
+    strike: np.ndarray,
+    years: np.ndarray,
+    volatility: np.ndarray,
+    is_call: np.ndarray,
+    rate: float = 0.0,
+    dividend: float = 0.0,
+) -> BlackScholesGreeks:
+    """Evaluate Black-Scholes greeks for arrays of contracts.
+
+    ``volatility`` is a fraction (0.15 for 15%).  Rows with a non-positive
+    volatility or time come back as ``NaN``.
+    """
+
+    strike = np.asarray(strike, dtype=np.float64)
+    years = np.asarray(years, dtype=np.float64)
+    sigma = np.where(np.asarray(volatility, dtype=np.float64) > 0, volatility, np.nan)
+    years = np.where(years > 0, years, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        deviation = sigma * np.sqrt(years)
+        d1 = (np.log(spot / strike) + (rate - dividend + 0.5 * sigma * sigma) * years) / deviation
+        d2 = d1 - deviation
+        carry = np.exp(-dividend * years)
+        pdf = _norm_pdf(d1)
+        cdf = _norm_cdf(d1)
+        delta = carry * np.where(is_call, cdf, cdf - 1.0)
+        gamma = carry * pdf / (spot * deviation)
+        vanna = -carry * pdf * d2 / sigma
+        decay = carry * pdf * (2.0 * (rate - dividend) * years - d2 * deviation) / (2.0 * years * deviation)
+        charm = np.where(is_call, dividend * carry * cdf, dividend * carry * (cdf - 1.0)) - decay
+    return BlackScholesGreeks(delta, gamma, vanna, charm)
+
+
+def expiry_years(expiries: Sequence[str], as_of: datetime.datetime) -> np.ndarray:
+    """Return the time, in years, from ``as_of`` to the 4 PM US/Eastern close of each expiry.
+
+    ``expiries`` are chain keys (``"YYYY-MM-DD:days"``); naive ``as_of``
+    times are taken as US/Eastern.
+    """
+
+    if as_of.tzinfo is None:
+        as_of = EASTERN.localize(as_of)
+    years = np.empty(len(expiries), dtype=np.float64)
+    for index, key in enumerate(expiries):
+        expiry = datetime.date.fromisoformat(key.split(":", 1)[0])
+        close = EASTERN.localize(datetime.datetime.combine(expiry, datetime.time(16)))
+        years[index] = (close - as_of).total_seconds() / (365.0 * 86400.0)
+    return np.maximum(years, MIN_YEARS)
+
+
+class ExposureResult(NamedTuple):
+    """Exposure metrics of one chain.
+
+    ``table`` has one row per ``(expiry, strike)`` with an ``expiry`` code
+    into ``expiries``, the ``strike`` and a float column per metric, ordered
+    by first appearance in the chain.
+    """
+
+    table: np.ndarray
+    metrics: Tuple[str, ...]
+    expiries: Tuple[str, ...]
+    spot_price: float
+
+    def by_strike(self) -> np.ndarray:
+        """Sum the table over expiries; one row per strike, in order of first appearance."""
+
+        strikes, first_index, inverse = np.unique(self.table["strike"], return_index=True, return_inverse=True)
+        order = np.argsort(first_index, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        inverse = rank[inverse.ravel()]
+        result = np.zeros(len(strikes), dtype=_dtype(self.metrics, per_expiry=False))
+        result["strike"] = strikes[order]
+        for name in self.metrics:
+            result[name] = np.bincount(inverse, weights=self.table[name], minlength=len(strikes))
+        return result
+
+    def totals(self) -> Dict[str, float]:
+        return {name: float(self.table[name].sum()) for name in self.metrics}
+
+
+def _dtype(metrics: Sequence[str], per_expiry: bool = True) -> np.dtype:
+    fields = [("expiry", np.int32)] if per_expiry else []
+    return np.dtype(fields + [("strike", np.float64)] + [(name, np.float64) for name in metrics])
+
+
+def _contract_exposures(
+    chain: OptionChainArrays,
+    metrics: Sequence[str],
+    as_of: datetime.datetime,
+    rate: float,
+    dividend: float,
+) -> Dict[str, np.ndarray]:
+    spot = float(chain.spot_price)
+    # Brokers send -999 for greeks they could not compute
+    gamma = np.where(chain.gamma >= 0.0, chain.gamma, np.nan)
+    delta = np.where(np.abs(chain.delta) <= 1.0, chain.delta, np.nan)
+    needs_model = (
+        bool({"vanna", "charm"} & set(metrics))
+        or ("delta" in metrics and np.isnan(delta).any())
+        or (bool({"gamma", "gamma_oi"} & set(metrics)) and not np.isfinite(gamma).all())
+    )
+    if needs_model:
+        years = expiry_years(chain.expiries, as_of)[chain.expiry]
+        model = black_scholes_greeks(
+            spot, chain.strike, years, chain.implied_volatility / 100.0, chain.sign > 0, rate, dividend
+        )
+        gamma = np.where(np.isfinite(gamma), gamma, model.gamma)
+        delta = np.where(np.isnan(delta), model.delta, delta)
+
+    sign = chain.sign
+    notional = CONTRACT_SIZE * spot / 1000000000
+    volume = np.where(np.isfinite(chain.volume) & (chain.volume >= 0.0), chain.volume, 0.0)
+    open_interest = np.where(np.isfinite(chain.open_interest) & (chain.open_interest >= 0.0), chain.open_interest, 0.0)
+    columns = {
+        "gamma": lambda: sign * gamma * volume * gamma_exposure_scale(spot),
+        "gamma_oi": lambda: sign * gamma * open_interest * gamma_exposure_scale(spot),
+        "delta": lambda: sign * delta * open_interest * notional,
+        "vanna": lambda: sign * model.vanna * 0.01 * open_interest * notional,
+        "charm": lambda: sign * model.charm / 365.0 * open_interest * notional,
+    }
+    return {name: np.nan_to_num(columns[name](), nan=0.0, posinf=0.0, neginf=0.0) for name in metrics}
+
+
+def calculate_exposures(
+    data: Union[Dict, OptionChainArrays],
+    metrics: Sequence[str] = EXPOSURE_METRICS,
+    as_of: Optional[datetime.datetime] = None,
+    rate: float = 0.0,
+    dividend: float = 0.0,
+) -> ExposureResult:
+    """Compute ``metrics`` per expiry and strike for an option chain or its flattened arrays.
+
+    ``as_of`` (default now) sets the time to expiry of the model greeks;
+    ``rate`` and ``dividend`` are continuously compounded annual rates.
+    Contracts with an invalid gamma or volume are kept when flattening
+    ``data`` so their greeks can be modelled; pass arrays flattened with
+    ``drop_invalid=False`` for the same.
+    """
+
+    metrics = tuple(metrics)
+    unknown = set(metrics) - set(EXPOSURE_METRICS)
+    if unknown:
+        raise ValueError(f"Unknown exposure metrics {sorted(unknown)}; expected some of {EXPOSURE_METRICS}")
+    chain = data if isinstance(data, OptionChainArrays) else flatten_option_chain(data, drop_invalid=False)
+    as_of = as_of or datetime.datetime.now(EASTERN)
+    values = _contract_exposures(chain, metrics, as_of, rate, dividend)
+
+    # Group contracts by (expiry, strike), keeping the order of first appearance
+    strikes, strike_index = np.unique(chain.strike, return_inverse=True)
+    keys = chain.expiry.astype(np.int64) * len(strikes) + strike_index.ravel()
+    unique_keys, first_index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first_index, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    inverse = rank[inverse.ravel()]
+
+    table = np.zeros(len(unique_keys), dtype=_dtype(metrics))
+    table["expiry"] = chain.expiry[first_index[order]]
+    table["strike"] = chain.strike[first_index[order]]
+    for name, column in values.items():
+        table[name] = np.bincount(inverse, weights=column, minlength=len(unique_keys))
+    return ExposureResult(table, metrics, chain.expiries, chain.spot_price)
@@ -0,0 +1,284 @@
+"""Incremental per-strike gamma exposure aggregation.
+
+:class:`IncrementalGammaAggregator` keeps per-strike exposure, the total and
+the largest changes between updates, adjusting only the strikes that an
+update touches.  It produces the same :data:`gamma_analysis.GammaCalculationResult`
+as :func:`gamma_analysis.calculate_gamma_exposure` and can be fed full option
+chains, contract-level updates or per-strike updates from streamed quotes.
+"""
+
+import datetime
+import math
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sortedcontainers import SortedList
+
+from gamma_analysis import GammaCalculationResult, gamma_exposure_scale
+
+
+class StrikeWeightUpdate(NamedTuple):
+    """Changed per-strike ``sign * gamma * volume`` sums ("weights") and the spot price.
+
+    With ``reset`` the update lists every strike in chain order and strikes
+    missing from it are removed.
+    """
+
+    weights: Dict[float, float]
+    spot_price: float
+    removed: Tuple[float, ...] = ()
+    reset: bool = False
+
+    def merged(self, newer: "StrikeWeightUpdate") -> "StrikeWeightUpdate":
+        """Combine with a later update; applying the result equals applying both in order."""
+
+        if newer.reset:
+            return newer
+        weights = dict(self.weights)
+        weights.update(newer.weights)
+        for strike in newer.removed:
+            weights.pop(strike, None)
+        removed = tuple(strike for strike in dict.fromkeys(self.removed + newer.removed) if strike not in weights)
+        return StrikeWeightUpdate(weights, newer.spot_price, removed, self.reset)
+
+
+def _contract_weight(option: Dict, sign: int) -> Optional[float]:
+    try:
+        weight = sign * float(option["gamma"]) * float(option["totalVolume"])
+    except (KeyError, TypeError, ValueError):
+        return None  # dropped like the invalid rows of a full calculation
+    return weight if math.isfinite(weight) else None
+
+
+class IncrementalGammaAggregator:
+    """Maintain gamma exposure statistics under partial updates.
+
+    Exposure of a strike is its weight (``sum(sign * gamma * volume)`` over
+    its contracts) times :func:`gamma_analysis.gamma_exposure_scale` of the
+    spot price.  Updates mark strikes as touched; :meth:`commit` then
+    re-evaluates only the touched strikes plus those touched by the previous
+    commit (whose change falls back to zero), keeps the total as
+    ``scale * sum(weights)`` in O(1) and maintains the ``top_k`` largest
+    absolute changes in a :class:`sortedcontainers.SortedList`.
+
+    The bookkeeping of a commit therefore costs O(touched * log(strikes)),
+    plus O(strikes) to copy the per-strike exposure and changes it returns
+    (callers keep results across commits).  A spot price move rescales every
+    strike, so commits following one re-evaluate all strikes.
+
+    The running weight sum is recomputed exactly every ``resync_every``
+    commits to bound floating point drift.
+    """
+
+    def __init__(self, top_k: int = 5, resync_every: int = 1000):
+        self.top_k = top_k
+        self.resync_every = resync_every
+        self.spot_price = 0
+        self._scale = 0.0
+        self._weights: Dict[float, float] = {}
+        self._weight_sum = 0.0
+        self._exposure: Dict[float, float] = {}
+        self._changes: Dict[float, float] = {}
+        self._ranked = SortedList()
+        self._rank_keys: Dict[float, Tuple[float, int, float]] = {}
+        self._order: Dict[float, int] = {}
+        self._contracts: Dict[Hashable, Tuple[float, float]] = {}
+        self._strike_contracts: Dict[float, Dict[Hashable, float]] = {}
+        self._touched: Set[float] = set()
+        self._last_touched: Set[float] = set()
+        self._rescaled = False
+        self._rescaled_last = False
+        self._commits = 0
+
+    def __len__(self) -> int:
+        return len(self._weights)
+
+    @property
+    def total_gamma_exposure(self) -> float:
+        return self._scale * self._weight_sum
+
+    # -- updates -----------------------------------------------------------------
+
+    def set_spot(self, spot_price) -> None:
+        if spot_price == self.spot_price:
+            return
+        self.spot_price = spot_price
+        try:
+            scale = gamma_exposure_scale(float(spot_price))
+        except (TypeError, ValueError):
+            scale = 0.0
+        if scale != self._scale:
+            self._scale = scale
+            self._rescaled = True
+
+    def set_strike_weight(self, strike: float, weight: Optional[float]) -> None:
+        """Set the weight of ``strike``; ``None`` or a non-finite weight removes the strike."""
+
+        if weight is not None and not math.isfinite(weight):
+            weight = None
+        previous = self._weights.get(strike)
+        if weight is None:
+            if previous is None:
+                return
+            del self._weights[strike]
+            self._weight_sum -= previous
+        else:
+            if previous == weight:
+                return
+            if previous is None:
+                self._order.setdefault(strike, len(self._order))
+            self._weights[strike] = weight
+            self._weight_sum += weight - (previous or 0.0)
+        self._touched.add(strike)
+
+    def update_contract(self, contract_id: Hashable, strike: float, weight: Optional[float]) -> None:
+        """Set the weight of one contract (``None`` or non-finite removes it) and re-aggregate its strike."""
+
+        if weight is not None and not math.isfinite(weight):
+            weight = None
+        previous = self._contracts.get(contract_id)
+        if previous == (strike, weight):
+            return
+        if previous is not None:
+            old_strike = previous[0]
+            bucket = self._strike_contracts[old_strike]
+            del bucket[contract_id]
+            del self._contracts[contract_id]
+            if old_strike != strike:
+                self._set_from_contracts(old_strike)
+        if weight is not None:
+            self._contracts[contract_id] = (strike, weight)
+            self._strike_contracts.setdefault(strike, {})[contract_id] = weight
+        self._set_from_contracts(strike)
+
+    def _set_from_contracts(self, strike: float) -> None:
+        bucket = self._strike_contracts.get(strike)
+        if not bucket:
+            self._strike_contracts.pop(strike, None)
+            self.set_strike_weight(strike, None)
+        else:
+            # Summing the strike's few contracts avoids accumulating error
+            self.set_strike_weight(strike, sum(bucket.values()))
+
+    def apply_update(self, update: StrikeWeightUpdate) -> None:
+        """Apply a per-strike update, e.g. from :class:`streaming.LiveOptionChain`."""
+
+        self.set_spot(update.spot_price)
+        if update.reset:
+            for strike in [strike for strike in self._weights if strike not in update.weights]:
+                self.set_strike_weight(strike, None)
+        for strike, weight in update.weights.items():
+            self.set_strike_weight(strike, weight)
+        for strike in update.removed:
+            self.set_strike_weight(strike, None)
+        if update.reset:
+            self._reorder(list(update.weights))
+
+    def apply_snapshot(self, data: Dict) -> None:
+        """Diff a full option chain against the current state and apply the changed contracts."""
+
+        self.set_spot(data.get("underlyingPrice", 0))
+        seen: Set[Hashable] = set()
+        strike_order: Dict[float, None] = {}
+        for map_name, sign in (("callExpDateMap", 1), ("putExpDateMap", -1)):
+            for expiry, strike_map in data.get(map_name, {}).items():
+                for strike, options in strike_map.items():
+                    try:
+                        strike_value = float(strike)
+                    except (TypeError, ValueError):
+                        continue
+                    if not math.isfinite(strike_value):
+                        continue
+                    for index, option in enumerate(options):
+                        weight = _contract_weight(option, sign)
+                        if weight is None:
+                            continue
+                        strike_order[strike_value] = None
+                        contract_id = option.get("symbol") or (sign, expiry, strike_value, index)
+                        seen.add(contract_id)
+                        self.update_contract(contract_id, strike_value, weight)
+        for contract_id in [contract_id for contract_id in self._contracts if contract_id not in seen]:
+            self.update_contract(contract_id, self._contracts[contract_id][0], None)
+        self._reorder(list(strike_order))
+
+    def _reorder(self, strikes: List[float]) -> None:
+        """Adopt ``strikes`` as the chain order, used to break ties between equal changes.
+
+        Only does work when the strike list differs from the current order.
+        """
+
+        if list(self._order) == strikes:
+            return
+        self._order = {strike: index for index, strike in enumerate(strikes)}
+        self._exposure = {strike: self._exposure[strike] for strike in strikes if strike in self._exposure}
+        self._ranked = SortedList()
+        self._rank_keys = {}
+        for strike, change in self._changes.items():
+            self._rank(strike, change)
+
+    # -- evaluation --------------------------------------------------------------
+
+    def _rank(self, strike: float, change: Optional[float]) -> None:
+        key = self._rank_keys.pop(strike, None)
+        if key is not None:
+            self._ranked.remove(key)
+        if change is None:
+            return
+        key = (-abs(change), self._order.get(strike, len(self._order)), strike)
+        self._rank_keys[strike] = key
+        self._ranked.add(key)
+
+    def commit(self, timestamp: Optional[datetime.datetime] = None) -> GammaCalculationResult:
+        """Close the current update and return the same result as a full calculation."""
+
+        timestamp = timestamp or datetime.datetime.now()
+        full = self._rescaled or self._rescaled_last
+        if full:
+            # Touched strikes include those removed, which ``_reorder`` may
+            # already have dropped from ``_exposure`` but not from ``_changes``
+            affected = set(self._weights) | set(self._exposure) | self._touched | self._last_touched
+        else:
+            affected = self._touched | self._last_touched
+
+        added = False
+        for strike in affected:
+            previous = self._exposure.get(strike, 0.0)
+            weight = self._weights.get(strike)
+            if weight is None:
+                self._exposure.pop(strike, None)
+                current = None
+            else:
+                added = added or strike not in self._exposure
+                current = self._exposure[strike] = weight * self._scale
+            if current is not None and previous != 0:
+                change = current - previous
+                self._changes[strike] = change
+                self._rank(strike, change)
+            elif strike in self._changes:
+                del self._changes[strike]
+                self._rank(strike, None)
+
+        if added:
+            # New strikes take their place in chain order
+            end = len(self._order)
+            self._exposure = dict(sorted(self._exposure.items(), key=lambda item: self._order.get(item[0], end)))
+
+        self._last_touched = affected if full else self._touched
+        self._touched = set()
+        self._rescaled_last, self._rescaled = self._rescaled, False
+        self._commits += 1
+        if self._commits % self.resync_every == 0:
+            self._weight_sum = sum(self._weights.values())
+
+        largest_changes = [
+            (strike, self._changes[strike], timestamp) for _, _, strike in self._ranked[:self.top_k]
+        ]
+        return (
+            self.total_gamma_exposure,
+            dict(self._exposure),
+            dict(self._changes),
+            largest_changes,
+            self.spot_price,
+        )
+
+    def reset(self) -> None:
+        self.__init__(self.top_k, self.resync_every)
@@ -6,19 +6,30 @@ the newer Charles Schwab API.  The active broker can be selected with the
 back to the first provider whose configuration is available on the system.
 """
 
-from datetime import datetime, timedelta
+from datetime import datetime
+import argparse
+import functools
+import importlib
 import inspect
 import os
-from typing import Optional, Tuple, Callable, Dict, Any
+import re
+from typing import Optional, Tuple, Callable, Dict, Any, FrozenSet, List
 
 import pytz
-import matplotlib.pyplot as plt
-from selenium import webdriver
-import time as time_module
 
-from gamma_analysis import calculate_gamma_exposure
-from plotter import RealTimeGammaPlotter
-from db_storage import store_raw_options_data
+# matplotlib (GUI output only) and selenium (interactive login only) are
+# imported where they are needed; ``python -X importtime main.py`` shows the
+# cost of what remains.
+from adaptive_schedule import AdaptivePollClock, TradingCalendar
+from alerts import AlertEngine, create_sink, parse_alert_rules
+from dashboard import HeadlessPlotter
+from frame_cache import FrameCache, cache_directory
+from metrics import MetricsFileWriter, MetricsRegistry, SamplingProfiler, install_profiler_signal, serve_metrics
+from db_storage import DEFAULT_DB_PARAMS, SnapshotWriter
+from pipeline import GammaExposurePipeline, PipelinedRunner
+from streaming import BrokerQuoteStream, StreamingChainIngestor, WebsocketQuoteStream
+from token_refresh import TokenRefresher
+from watchlist import ConcurrentChainFetcher, WatchlistJob, parse_watchlist
 
 
 # Charles Schwab uses a loopback HTTPS redirect during OAuth flows.  The
@@ -32,9 +43,13 @@ class BrokerConfigurationError(RuntimeError):
     """Raised when a supported broker configuration cannot be located."""
 
 
+@functools.lru_cache(maxsize=None)
 def _load_broker_client(preferred_broker: Optional[str] = None) -> Tuple[str, object, object, object]:
     """Locate a supported broker configuration and client.
 
+    Successful resolutions are cached, so reconnecting or constructing
+    another scheduler does not probe the imports again.
+
     Parameters
     ----------
     preferred_broker:
@@ -91,54 +106,178 @@ def _load_broker_client(preferred_broker: Optional[str] = None) -> Tuple[str, ob
         "Unable to locate a usable broker configuration.\n" + "\n".join(errors)
     )
 
+
+@functools.lru_cache(maxsize=None)
+def _parameter_names(function: Callable[..., object]) -> FrozenSet[str]:
+    return frozenset(inspect.signature(function).parameters)
+
 class GammaExposureScheduler:
     # Initialize and create dictionaries for temporary data storage and analysis
-    def __init__(self, preferred_broker: Optional[str] = None):
-        self.current_gamma_exposure = {}
-        self.previous_gamma_exposure = {}
-        self.change_in_gamma_per_strike = {}
+    def __init__(self, preferred_broker: Optional[str] = None, render_mode: Optional[str] = None):
         self.client = None
-        self.plotter = RealTimeGammaPlotter()
+        # Shared by every stage so one export covers the whole loop
+        self.metrics = MetricsRegistry()
         broker_name, self.auth_module, self.client_module, self.secrets = _load_broker_client(
             preferred_broker or os.environ.get("BROKER")
         )
+        # ``delta`` stores a keyframe every ``keyframe_interval`` polls and only
+        # the changed contracts in between (see ``snapshot_delta``).
+        self.storage = SnapshotWriter(
+            DEFAULT_DB_PARAMS,
+            storage_mode=os.environ.get("STORAGE_MODE") or getattr(self.secrets, "storage_mode", "full"),
+            keyframe_interval=int(os.environ.get("KEYFRAME_INTERVAL") or getattr(self.secrets, "keyframe_interval", 60)),
+            metrics=self.metrics,
+        )
         self.broker_name = broker_name
         print(f"Using {self.broker_name} broker configuration.")
 
         # Broker specific defaults
         self.option_symbol = getattr(self.secrets, "option_symbol", "$SPX.X")
         self.strike_count = getattr(self.secrets, "strike_count", 50)
+        self.poll_interval = getattr(self.secrets, "poll_interval", 5.0)
+        # Schwab allows 120 market data requests per minute across all symbols
+        self.rate_limit = getattr(self.secrets, "rate_limit", 2.0)
+        self.jobs = self._load_watchlist()
+        # ``adaptive`` polls faster when the chain moves, slower when it is
+        # quiet, backs off on errors and skips holidays; ``fixed`` polls every
+        # ``poll_interval`` seconds.
+        self.poll_mode = os.environ.get("POLL_MODE") or getattr(self.secrets, "poll_mode", "adaptive")
+        self.min_poll_interval = getattr(self.secrets, "min_poll_interval", 1.0)
+        self.max_poll_interval = getattr(self.secrets, "max_poll_interval", 30.0)
+        self.calendar = TradingCalendar(
+            extra_holidays=getattr(self.secrets, "extra_holidays", ()),
+            extra_early_closes=getattr(self.secrets, "extra_early_closes", ()),
+        )
+        # ``poll`` re-downloads the chains every ``poll_interval``; ``stream``
+        # keeps them current from level-one quotes and resyncs over REST.
+        self.ingest_mode = os.environ.get("INGEST_MODE") or getattr(self.secrets, "ingest_mode", "poll")
+        self.stream_interval = getattr(self.secrets, "stream_interval", 0.25)
+        self.resync_interval = getattr(self.secrets, "resync_interval", 300.0)
+        # ``incremental`` diffs each polled chain against the previous one and
+        # re-aggregates only the strikes whose contracts changed.
+        self.analysis_mode = os.environ.get("ANALYSIS_MODE") or getattr(self.secrets, "analysis_mode", "full")
+        # Extra exposures (e.g. ``gamma_oi,delta,vanna,charm``) computed in the same pass
+        exposure_metrics = os.environ.get("EXPOSURE_METRICS") or getattr(self.secrets, "exposure_metrics", ())
+        if isinstance(exposure_metrics, str):
+            exposure_metrics = [name.strip() for name in exposure_metrics.split(",") if name.strip()]
+        self.exposure_metrics = tuple(exposure_metrics)
+        # Rules evaluated on every analysed frame in a worker thread
+        self.alerts = self._alert_engine()
+
+        # Each watchlist job keeps its own analysis state; only the first one is
+        # plotted.  ``retained`` updates artists in place; ``redraw`` rebuilds
+        # every plot each tick.
+        render_mode = render_mode or os.environ.get("RENDER_MODE", "retained")
+        # ``gui`` draws in an interactive window; ``headless`` renders in a
+        # separate Agg process that writes frames and serves a dashboard.
+        self.output_mode = os.environ.get("OUTPUT_MODE") or getattr(self.secrets, "output_mode", "gui")
+        if self.output_mode == "headless":
+            port = os.environ.get("DASHBOARD_PORT") or getattr(self.secrets, "dashboard_port", None)
+            self.plotter = HeadlessPlotter(
+                frame_dir=os.environ.get("FRAME_DIR") or getattr(self.secrets, "frame_dir", None),
+                frame_format=os.environ.get("FRAME_FORMAT") or getattr(self.secrets, "frame_format", "png"),
+                frame_rate=float(os.environ.get("FRAME_RATE") or getattr(self.secrets, "frame_rate", 1.0)),
+                port=int(port) if port else None,
+                render_mode=render_mode,
+            )
+            self.metrics.gauge("headless_frames_dropped", lambda: self.plotter.dropped)
+            # Headless rendering has no GUI event loop to pump
+            self.pump = None
+        else:
+            import matplotlib.pyplot as plt
+            from plotter import create_plotter
+
+            self.plotter = create_plotter(render_mode)
+            # The GUI event loop is pumped on the render thread
+            self.pump = plt.pause
+        # Analysed frames are cached per job on local disk so a restart can
+        # resume the day's plots without the database.
+        cache_root = os.environ.get("FRAME_CACHE_DIR") or getattr(self.secrets, "frame_cache_dir", None)
+        retention_days = int(os.environ.get("FRAME_CACHE_DAYS") or getattr(self.secrets, "frame_cache_days", 5))
+        self.frame_caches: Dict[str, FrameCache] = {
+            job.key: FrameCache(cache_directory(cache_root, job.key), retention_days=retention_days)
+            for job in self.jobs
+        } if cache_root else {}
+        self.pipelines: Dict[str, GammaExposurePipeline] = {
+            job.key: GammaExposurePipeline(
+                self.plotter if index == 0 else None,
+                show=self.output_mode == "gui",
+                incremental=self.analysis_mode == "incremental",
+                metrics=self.metrics,
+                exposure_metrics=self.exposure_metrics,
+                cache=self.frame_caches.get(job.key),
+            )
+            for index, job in enumerate(self.jobs)
+        }
+        self.pipeline = self.pipelines[self.jobs[0].key]
+        for key, pipeline in self.pipelines.items():
+            suffix = "" if pipeline is self.pipeline else "_" + re.sub(r"[^A-Za-z0-9]+", "_", key).strip("_")
+            for name in self.exposure_metrics:
+                # Unavailable (and skipped) until the first chain is analysed
+                self.metrics.gauge(
+                    f"exposure_{name}{suffix}", lambda pipeline=pipeline, name=name: pipeline.exposure_totals[name]
+                )
+        for key, pipeline in self.pipelines.items():
+            restored = pipeline.warm_start()
+            if restored:
+                print(f"Restored {restored} cached frames of {key}")
+        self.fetcher: Optional[ConcurrentChainFetcher] = None
+        self.ingestor: Optional[StreamingChainIngestor] = None
+        self.runner = None
+        self.metrics_server = None
+        self.metrics_file: Optional[MetricsFileWriter] = None
+        self.token_refresher: Optional[TokenRefresher] = None
+
+    def _load_watchlist(self) -> List[WatchlistJob]:
+        """Read jobs from ``WATCHLIST`` or ``secrets.watchlist``; default to 0DTE ``option_symbol``."""
+
+        spec = os.environ.get("WATCHLIST") or getattr(self.secrets, "watchlist", None)
+        if not spec:
+            return [WatchlistJob(self.option_symbol, 0, 0, self.strike_count)]
+        if isinstance(spec, str):
+            return parse_watchlist(spec, self.strike_count)
+        return list(spec)
 
     @staticmethod
     def _filter_supported_kwargs(function: Callable[..., object], raw_kwargs: Dict[str, Any]) -> Dict[str, Any]:
         """Filter keyword arguments to those supported by ``function``."""
 
-        signature = inspect.signature(function)
-        return {key: value for key, value in raw_kwargs.items() if key in signature.parameters}
+        parameters = _parameter_names(function)
+        return {key: value for key, value in raw_kwargs.items() if key in parameters}
+
+    def _client_from_token_file(self):
+        """Create a client from the stored token; ``FileNotFoundError`` when there is none."""
+
+        auth_kwargs = {}
+        redirect_uri = getattr(self.secrets, "redirect_uri", None) or DEFAULT_REDIRECT_URI
+        if redirect_uri:
+            auth_kwargs["redirect_uri"] = redirect_uri
+        if hasattr(self.secrets, "token_encryption_key"):
+            auth_kwargs["encryption_key"] = getattr(self.secrets, "token_encryption_key")
+        if hasattr(self.secrets, "cert_file"):
+            auth_kwargs["cert_file"] = getattr(self.secrets, "cert_file")
+        if len(self.jobs) > 1:
+            # Async clients let the watchlist be fetched concurrently
+            auth_kwargs["asyncio"] = True
+
+        filtered_kwargs = self._filter_supported_kwargs(
+            self.auth_module.client_from_token_file,
+            auth_kwargs,
+        )
+
+        return self.auth_module.client_from_token_file(
+            self.secrets.token_path,
+            self.secrets.api_key,
+            **filtered_kwargs,
+        )
 
     #API auth
     def authenticate(self):
         try:
-            auth_kwargs = {}
-            redirect_uri = getattr(self.secrets, "redirect_uri", None) or DEFAULT_REDIRECT_URI
-            if redirect_uri:
-                auth_kwargs["redirect_uri"] = redirect_uri
-            if hasattr(self.secrets, "token_encryption_key"):
-                auth_kwargs["encryption_key"] = getattr(self.secrets, "token_encryption_key")
-            if hasattr(self.secrets, "cert_file"):
-                auth_kwargs["cert_file"] = getattr(self.secrets, "cert_file")
-
-            filtered_kwargs = self._filter_supported_kwargs(
-                self.auth_module.client_from_token_file,
-                auth_kwargs,
-            )
-
-            self.client = self.auth_module.client_from_token_file(
-                self.secrets.token_path,
-                self.secrets.api_key,
-                **filtered_kwargs,
-            )
+            self.client = self._client_from_token_file()
         except FileNotFoundError:
+            from selenium import webdriver
+
             with webdriver.Chrome() as driver:
                 login_kwargs = {
                     "driver": driver,
@@ -153,6 +292,9 @@ class GammaExposureScheduler:
                     if hasattr(self.secrets, optional_attr):
                         login_kwargs[optional_attr] = getattr(self.secrets, optional_attr)
 
+                if len(self.jobs) > 1:
+                    login_kwargs["asyncio"] = True
+
                 # Remove keys with None values to avoid unexpected keyword errors
                 login_kwargs = {k: v for k, v in login_kwargs.items() if v is not None}
 
@@ -163,83 +305,275 @@ class GammaExposureScheduler:
 
                 self.client = self.auth_module.client_from_login_flow(**filtered_login_kwargs)
 
-    def fetch_and_update_gamma_exposure(self):
-        eastern = pytz.timezone('US/Eastern')
-        now = datetime.now(eastern)
-
-        # If it's Friday after 4 PM, set use_date to the next Monday
-        if now.weekday() == 4 and now.hour >= 16:
-            use_date = (now + timedelta(days=3)).date()
-        # Otherwise, use the next day's date if it's after 4 PM, or today's date if it's before 4 PM
-        else:
-            use_date = now.date() + timedelta(days=1 if now.hour >= 16 else 0)
-
+    def start_token_refresh(self) -> None:
+        """Refresh the access token in the background so no poll waits on it.
+
+        ``token_refresh_margin`` (seconds before expiry, default 300) is read
+        from the secrets module.  When a refresh fails the token file is
+        checked for a token renewed elsewhere; otherwise the refresh is
+        retried with exponential backoff.
+        """
+
+        if self.token_refresher is not None or not TokenRefresher.supports(self.client):
+            return
+        self.token_refresher = TokenRefresher(
+            self.client.session,
+            margin=float(getattr(self.secrets, "token_refresh_margin", 300.0)),
+            on_failure=lambda error: self.reconnect(),
+        ).start()
+        self.metrics.gauge("token_seconds_left", self.token_refresher.seconds_left)
+
+    def stop_token_refresh(self) -> None:
+        if self.token_refresher is not None:
+            self.token_refresher.stop(timeout=5.0)
+            self.token_refresher = None
+
+    def reconnect(self) -> None:
+        """Switch to a client from the token file if it holds a newer, unexpired token.
+
+        Never runs the interactive login flow: this is called on the token
+        refresher's thread.  A token file holding the same or an expired
+        token is left alone, so a dead refresh token does not churn clients;
+        the refresher keeps retrying it with backoff.
+        """
+
+        self.metrics.increment("reconnects")
         try:
-            if self.client:
-                options_source = getattr(self.client_module, "Options", None) or getattr(self.client, "Options", None)
-                contract_type_all = getattr(options_source, "ContractType", None) if options_source else None
-                if contract_type_all is not None:
-                    contract_type_all = getattr(contract_type_all, "ALL", contract_type_all)
-
-                kwargs = {
-                    "symbol": self.option_symbol,
-                    "from_date": use_date,
-                    "to_date": use_date,
-                    "strike_count": self.strike_count,
-                }
-
-                if contract_type_all is not None:
-                    kwargs["contract_type"] = contract_type_all
-
-                r = self.client.get_option_chain(**kwargs)
-                if r.status_code == 200:
-                    data = r.json()
-                    total_gamma_exposure, self.current_gamma_exposure, self.change_in_gamma_per_strike, largest_changes, spot_price = calculate_gamma_exposure(data, self.previous_gamma_exposure)
-                    self.previous_gamma_exposure = self.current_gamma_exposure.copy()
-                    current_timestamp = datetime.now(pytz.timezone('US/Eastern'))
-                    self.plotter.update_plot_gamma(self.current_gamma_exposure)
-                    self.plotter.update_plot_change_in_gamma(self.change_in_gamma_per_strike, largest_changes)
-                    self.plotter.update_total_gamma_exposure_plot(current_timestamp, total_gamma_exposure, spot_price)
-                    self.plotter.show_plots()
-                    pause_duration = 5
-                else:
-                    print(f"Failed to fetch data: {r.status_code}")
-                    pause_duration = 5  # Longer pause when fetch fails
+            client = self._client_from_token_file()
         except Exception as e:
-            print(f"An error occurred: {e}")
-            pause_duration = 5  # Longer pause on error
-        finally:
-            # Always attempt to store data in the database, even if the fetch or plotting fails
-            db_params = {
-                "dbname": "spx_options_data",
-                "user": "postgres",
-                "password": "password",
-                "host": "localhost"
-            }
-            # Make sure to handle the case where data might not be defined due to failed fetch
-            if 'data' in locals():
-                store_raw_options_data(db_params, data, now)
+            self.metrics.increment("reconnect_failures")
+            print(f"Reconnecting failed; log in again by restarting: {e}")
+            return
+        refresher = self.token_refresher
+        if refresher is None or not TokenRefresher.supports(client) or not refresher.is_newer(client.session.token):
+            self.metrics.increment("reconnect_failures")
+            print("The token file holds no newer token; log in again by restarting if refreshing keeps failing")
+            return
+        self.client = client
+        # The same refresher follows the new session (the caller is the refresher itself)
+        refresher.follow(client.session)
+
+    def _contract_type_all(self):
+        options_source = getattr(self.client_module, "Options", None) or getattr(self.client, "Options", None)
+        contract_type_all = getattr(options_source, "ContractType", None) if options_source else None
+        if contract_type_all is not None:
+            contract_type_all = getattr(contract_type_all, "ALL", contract_type_all)
+        return contract_type_all
+
+    def fetch_option_chains(self) -> Optional[List[Tuple[str, Dict[str, Any], datetime]]]:
+        """Fetch every watchlist job concurrently; return ``(key, data, fetched_at)`` per success."""
+
+        if not self.client:
+            return None
+        fetched = []
+        for job, data, fetched_at in self._chain_fetcher().fetch_all():
+            if data is None:
+                self.metrics.increment("failed_fetches")
             else:
-                print("No data to store in database.")
+                fetched.append((job.key, data, fetched_at))
+        if not fetched:
+            # Reported as a failed fetch so the poll clock backs off
+            raise RuntimeError("every option chain request failed")
+        return fetched
+
+    def _chain_fetcher(self) -> ConcurrentChainFetcher:
+        if self.fetcher is None or self.fetcher.client is not self.client:
+            if self.fetcher is not None:
+                self.fetcher.close()  # bound to the client replaced by ``reconnect``
+            self.fetcher = ConcurrentChainFetcher(
+                self.client,
+                self.jobs,
+                rate_limit=self.rate_limit,
+                contract_type=self._contract_type_all(),
+            )
+        return self.fetcher
+
+    def _quote_stream(self):
+        """Return the broker quote stream, or the websocket stand-in named by ``QUOTE_STREAM_URL``."""
+
+        url = os.environ.get("QUOTE_STREAM_URL")
+        if url:
+            return WebsocketQuoteStream(url)
+        package = self.client_module.__name__.split(".")[0]
+        streaming_module = importlib.import_module(f"{package}.streaming")
+        return BrokerQuoteStream(self.client, streaming_module, getattr(self.secrets, "account_id", None))
+
+    def within_trading_hours(self) -> bool:
+        """Whether a session of the trading calendar (holidays and early closes included) is open."""
+
+        return self.calendar.is_open(datetime.now(pytz.timezone('US/Eastern')))
+
+    def _poll_clock(self) -> Optional[AdaptivePollClock]:
+        """Return the adaptive fetch clock, or ``None`` for a fixed ``poll_interval``."""
+
+        if self.poll_mode != "adaptive":
+            return None
+        clock = AdaptivePollClock(
+            interval=self.poll_interval,
+            min_interval=min(self.min_poll_interval, self.poll_interval),
+            max_interval=max(self.max_poll_interval, self.poll_interval),
+            requests_per_poll=len(self.jobs),
+            rate_limit=self.rate_limit,
+            calendar=self.calendar,
+        )
+        self.metrics.gauge("poll_interval_seconds", lambda: clock.interval)
+        self.metrics.gauge("poll_backoff_seconds", lambda: clock.backoff)
+        return clock
+
+    def _alert_engine(self) -> Optional[AlertEngine]:
+        """Build the alert engine from ``ALERT_RULES`` and ``ALERT_SINKS``; ``None`` without rules."""
+
+        rules = os.environ.get("ALERT_RULES") or getattr(self.secrets, "alert_rules", ())
+        if isinstance(rules, str):
+            rules = parse_alert_rules(rules)
+        if not rules:
+            return None
+        # Sinks are targets for ``alerts.create_sink`` or sink objects; stdout by default
+        sinks = os.environ.get("ALERT_SINKS") or getattr(self.secrets, "alert_sinks", "-")
+        if isinstance(sinks, str):
+            sinks = [target.strip() for target in sinks.split(",") if target.strip()]
+        return AlertEngine(
+            rules,
+            [create_sink(sink) if isinstance(sink, str) else sink for sink in sinks],
+            window=int(getattr(self.secrets, "alert_window", 100)),
+            min_samples=int(getattr(self.secrets, "alert_min_samples", 20)),
+            cooldown=float(getattr(self.secrets, "alert_cooldown", 60.0)),
+            metrics=self.metrics,
+        )
 
-            plt.pause(pause_duration)  # Adjust pause based on operation outcome
+    def poll(self) -> Optional[List[Tuple[str, Dict[str, Any], datetime]]]:
+        """Fetch stage of the pipelined loop: fetch only during trading hours."""
 
-    def run(self):
-        self.authenticate()
-        
-        while True:
-            eastern = pytz.timezone('US/Eastern')
-            now = datetime.now(eastern)
-            start_time = now.replace(hour=9, minute=30, second=0, microsecond=0)
-            end_time = now.replace(hour=16, minute=15, second=0, microsecond=0)
-
-            # Check if current time is within the trading hours
-            if start_time <= now <= end_time:
-                self.fetch_and_update_gamma_exposure()
-            else:
-                print("Outside trading hours. Waiting to resume...")
+        if not self.within_trading_hours():
+            print("Outside trading hours. Waiting to resume...")
+            return None
+        return self.fetch_option_chains()
+
+    def poll_stream(self):
+        """Fetch stage when streaming: hand over the chains updated since the last call."""
+
+        if not self.within_trading_hours():
+            return None
+        return self.ingestor.poll()
+
+    def fetch_and_update_gamma_exposure(self):
+        """Run a single fetch, analysis, storage and render cycle synchronously."""
 
-            time_module.sleep(4)  # Sleep until time to run API request again
+        try:
+            fetched = self.fetch_option_chains()
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            return
+        if not fetched:
+            print("No data to store in database.")
+            return
+        for key, data, now in fetched:
+            # Queue for storage first so the snapshot is kept even if plotting fails
+            self.storage.submit(data, now)
+            try:
+                self.pipelines[key].process(data, datetime.now(pytz.timezone('US/Eastern')))
+            except Exception as e:
+                print(f"An error occurred: {e}")
+
+    def start_metrics(self) -> None:
+        """Start the exporters and profiler hook configured by the environment or secrets.
+
+        ``METRICS_PORT`` serves ``/metrics`` (Prometheus), ``/metrics.json``
+        and ``/profile?seconds=N`` on 127.0.0.1; ``METRICS_FILE`` appends a
+        JSON snapshot every ``METRICS_INTERVAL`` seconds to a rotating file;
+        ``PROFILE_DIR`` makes ``SIGUSR1`` toggle the sampling profiler.
+        """
+
+        def setting(name, default=None):
+            return os.environ.get(name.upper()) or getattr(self.secrets, name, default)
+
+        profiler = SamplingProfiler()
+        port = setting("metrics_port")
+        if port:
+            self.metrics_server = serve_metrics(self.metrics, "127.0.0.1", int(port), profiler)
+            print(f"Serving metrics on http://127.0.0.1:{port}/metrics")
+        path = setting("metrics_file")
+        if path:
+            self.metrics_file = MetricsFileWriter(
+                self.metrics, path, interval=float(setting("metrics_interval", 10.0))
+            ).start()
+        profile_dir = setting("profile_dir")
+        if profile_dir and install_profiler_signal(profiler, profile_dir):
+            print(f"Send SIGUSR1 (kill -USR1 {os.getpid()}) to start or stop profiling into {profile_dir}.")
+
+    def stop_metrics(self) -> None:
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+            self.metrics_server = None
+        if self.metrics_file is not None:
+            self.metrics_file.close()
+            self.metrics_file = None
 
-scheduler = GammaExposureScheduler()
-scheduler.run()
+    def run(self):
+        self.start_metrics()
+        with self.metrics.time("authenticate"):
+            self.authenticate()
+        self.start_token_refresh()
+        # Alert rules are evaluated on the engine's own thread
+        observers = [self.alerts.start()] if self.alerts is not None else []
+
+        # Analysis, storage and rendering run as separate stages so none of them
+        # can delay the next fetch.
+        if self.ingest_mode == "stream":
+            # REST snapshots taken at each resync are stored; streamed updates
+            # reach the pipelines as per-strike exposure.
+            self.ingestor = StreamingChainIngestor(
+                self._chain_fetcher(),
+                self._quote_stream(),
+                resync_interval=self.resync_interval,
+                on_snapshot=self.storage.submit,
+            ).start()
+            self.runner = PipelinedRunner(
+                self.poll_stream,
+                pipelines=self.pipelines,
+                interval=self.stream_interval,
+                pump=self.pump,
+                metrics=self.metrics,
+                observers=observers,
+            )
+        else:
+            self.runner = PipelinedRunner(
+                self.poll,
+                pipelines=self.pipelines,
+                storage=self.storage,
+                interval=self.poll_interval,
+                pump=self.pump,
+                metrics=self.metrics,
+                fetch_clock=self._poll_clock(),
+                observers=observers,
+            )
+        try:
+            self.runner.run()
+        finally:
+            self.stop_token_refresh()
+            if self.alerts is not None:
+                self.alerts.stop(timeout=5.0)
+            if self.ingestor is not None:
+                self.ingestor.stop(timeout=5.0)
+            # Flush any queued snapshots before exiting
+            self.storage.close()
+            if self.fetcher is not None:
+                self.fetcher.close()
+            for cache in self.frame_caches.values():
+                cache.close()
+            if isinstance(self.plotter, HeadlessPlotter):
+                self.plotter.close()
+            self.stop_metrics()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Stream gamma exposure analytics from the broker's option chains.")
+    parser.add_argument("--broker", choices=("schwab", "tda"), help="overrides BROKER")
+    parser.add_argument("--render-mode", choices=("retained", "redraw"), help="overrides RENDER_MODE")
+    args = parser.parse_args(argv)
+    GammaExposureScheduler(args.broker, args.render_mode).run()
+
+
+if __name__ == "__main__":
+    # Guarded because the headless render process is spawned and re-imports this module
+    main()
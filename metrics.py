@@ -0,0 +1,409 @@
+"""Lightweight latency and counter bookkeeping for the polling pipeline.
+
+:class:`StageStats` keeps a running summary and a fixed-bucket latency
+histogram per stage, cheap enough to wrap every call on the hot path.  A
+:class:`MetricsRegistry` groups the stages, counters and gauges of one
+process and can be exported as Prometheus text (:func:`serve_metrics`) or
+appended to a rotating JSON-lines file (:class:`MetricsFileWriter`).
+:class:`SamplingProfiler` records the stacks of every thread and can be
+switched on at runtime, from ``/profile`` or a signal, without restarting.
+"""
+
+import bisect
+import collections
+import contextlib
+import json
+import logging
+import logging.handlers
+import math
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Counter, Dict, Iterator, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class StageStats:
+    """Thread-safe running latency summary for one pipeline stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+        self.dropped = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = 0.0
+        # Non-cumulative counts; the last bucket holds everything above LATENCY_BUCKETS[-1]
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self.last_seconds = seconds
+            if seconds > self.max_seconds:
+                self.max_seconds = seconds
+            self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def drop(self, count: int = 1) -> None:
+        with self._lock:
+            self.dropped += count
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.total_seconds / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Estimate the ``q`` quantile, in seconds, as the upper bound of its bucket."""
+
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = q * self.count
+            seen = 0
+            for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+                seen += count
+                if seen >= rank:
+                    return min(bound, self.max_seconds)
+            return self.max_seconds
+
+    def snapshot(self) -> Dict[str, float]:
+        p50, p99 = self.quantile(0.5), self.quantile(0.99)
+        with self._lock:
+            return {
+                "count": self.count,
+                "errors": self.errors,
+                "dropped": self.dropped,
+                "mean_ms": self.mean_seconds * 1000,
+                "p50_ms": p50 * 1000,
+                "p99_ms": p99 * 1000,
+                "max_ms": self.max_seconds * 1000,
+                "last_ms": self.last_seconds * 1000,
+            }
+
+
+class MetricsRegistry:
+    """Stage statistics, counters and gauges shared by the components of one process.
+
+    Stages are created on first use (``registry["fetch"]``), so components
+    can be handed a shared registry or default to a private one.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._stages: Dict[str, StageStats] = {}
+        self._counters: Dict[str, int] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+
+    def __getitem__(self, name: str) -> StageStats:
+        stage = self._stages.get(name)
+        if stage is None:
+            with self._lock:
+                stage = self._stages.setdefault(name, StageStats())
+        return stage
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._stages
+
+    def items(self):
+        return list(self._stages.items())
+
+    @contextlib.contextmanager
+    def time(self, name: str) -> Iterator[None]:
+        """Observe the duration of the ``with`` block in stage ``name``; count it as an error if it raises."""
+
+        stage = self[name]
+        started = self.clock()
+        try:
+            yield
+        except BaseException:
+            stage.error()
+            raise
+        stage.observe(self.clock() - started)
+
+    def increment(self, name: str, count: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + count
+
+    def gauge(self, name: str, read: Callable[[], float]) -> None:
+        """Report ``read()`` as gauge ``name`` whenever the metrics are exported."""
+
+        self._gauges[name] = read
+
+    def counters(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+    def gauges(self) -> Dict[str, float]:
+        values = {}
+        for name, read in list(self._gauges.items()):
+            try:
+                values[name] = float(read())
+            except Exception:
+                continue  # a gauge of a component that has shut down
+        return values
+
+    def snapshot(self) -> Dict:
+        return {
+            "stages": {name: stage.snapshot() for name, stage in self.items()},
+            "counters": self.counters(),
+            "gauges": self.gauges(),
+        }
+
+
+def _prometheus_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def _prometheus_name(name: str) -> str:
+    # Metric names are limited to [a-zA-Z0-9_:]
+    return re.sub(r"[^a-zA-Z0-9_:]", "_", name)
+
+
+def prometheus_text(registry: MetricsRegistry, prefix: str = "gex") -> str:
+    """Render ``registry`` in the Prometheus text exposition format."""
+
+    lines = [
+        f"# HELP {prefix}_stage_seconds Latency of each pipeline stage.",
+        f"# TYPE {prefix}_stage_seconds histogram",
+    ]
+    errors, dropped = [], []
+    for name, stage in registry.items():
+        with stage._lock:
+            buckets, count, total = list(stage.buckets), stage.count, stage.total_seconds
+            errors.append(f'{prefix}_stage_errors_total{{stage="{name}"}} {stage.errors}')
+            dropped.append(f'{prefix}_stage_dropped_total{{stage="{name}"}} {stage.dropped}')
+        cumulative = 0
+        for bound, bucket in zip(LATENCY_BUCKETS, buckets):
+            cumulative += bucket
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {count}')
+        lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {total}')
+        lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {count}')
+    lines += [f"# TYPE {prefix}_stage_errors_total counter", *errors]
+    lines += [f"# TYPE {prefix}_stage_dropped_total counter", *dropped]
+    for name, value in sorted(registry.counters().items()):
+        name = _prometheus_name(f"{prefix}_{name}_total")
+        lines += [f"# TYPE {name} counter", f"{name} {value}"]
+    for name, value in sorted(registry.gauges().items()):
+        name = _prometheus_name(f"{prefix}_{name}")
+        lines += [f"# TYPE {name} gauge", f"{name} {_prometheus_value(value)}"]
+    return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """Sample the stacks of every thread from a background thread.
+
+    Unlike ``cProfile``, which only sees the thread that enabled it, this
+    covers the fetch, analysis, storage and render threads at once, and its
+    overhead is bounded by ``interval``.  Samples are aggregated as collapsed
+    stacks (``frame;frame;frame count``), the input format of flame graph
+    tools.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter[str] = collections.Counter()
+        self.started_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> bool:
+        """Start sampling; return ``False`` if already running."""
+
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self.samples = collections.Counter()
+            self.started_at = time.monotonic()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self) -> str:
+        """Stop sampling and return the collapsed stacks."""
+
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+        return self.collapsed()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def profile(self, seconds: float) -> str:
+        """Sample for ``seconds`` and return the collapsed stacks."""
+
+        if not self.start():
+            raise RuntimeError("The profiler is already running")
+        time.sleep(seconds)
+        return self.stop()
+
+
+def install_profiler_signal(profiler: SamplingProfiler, output_dir: str, signum: Optional[int] = None) -> bool:
+    """Toggle ``profiler`` on ``signum`` (``SIGUSR1``); each stop writes a file to ``output_dir``.
+
+    Returns ``False`` where the signal is unavailable (Windows).
+    """
+
+    signum = signum if signum is not None else getattr(signal, "SIGUSR1", None)
+    if signum is None:
+        return False
+
+    def toggle(received, frame):
+        if profiler.start():
+            print("Sampling profiler started.")
+            return
+        # Writing happens off the signal handler, which interrupts the main thread
+        def write():
+            path = os.path.join(output_dir, f"profile-{datetime.now():%Y%m%d-%H%M%S}.txt")
+            os.makedirs(output_dir, exist_ok=True)
+            with open(path, "w") as handle:
+                handle.write(profiler.stop())
+            print(f"Sampling profile written to {path}.")
+        threading.Thread(target=write, name="profile-writer", daemon=True).start()
+
+    signal.signal(signum, toggle)
+    return True
+
+
+def serve_metrics(
+    registry: MetricsRegistry,
+    host: str,
+    port: int,
+    profiler: Optional[SamplingProfiler] = None,
+    max_profile_seconds: float = 60.0,
+) -> ThreadingHTTPServer:
+    """Serve ``registry`` on ``host:port`` from a daemon thread and return the server.
+
+    ``/metrics`` is Prometheus text and ``/metrics.json`` the same as JSON.
+    With a ``profiler``, ``/profile?seconds=N`` samples for ``N`` seconds
+    (default 10) and returns the collapsed stacks.
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == "/metrics":
+                self._send(prometheus_text(registry).encode(), "text/plain; version=0.0.4")
+            elif url.path == "/metrics.json":
+                self._send(json.dumps(registry.snapshot()).encode(), "application/json")
+            elif url.path == "/profile" and profiler is not None:
+                try:
+                    seconds = float(parse_qs(url.query).get("seconds", ["10"])[0])
+                except ValueError:
+                    self.send_error(400, "seconds must be a number")
+                    return
+                try:
+                    stacks = profiler.profile(min(max(seconds, 0.1), max_profile_seconds))
+                except RuntimeError as e:
+                    self.send_error(409, str(e))
+                    return
+                self._send(stacks.encode(), "text/plain; charset=utf-8")
+            else:
+                self.send_error(404)
+
+        def _send(self, body: bytes, content_type: str) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+class MetricsFileWriter:
+    """Append a JSON snapshot of ``registry`` to ``path`` every ``interval`` seconds.
+
+    The file rotates at ``max_bytes``, keeping ``backup_count`` old files.
+    """
+
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        path: str,
+        interval: float = 10.0,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+    ):
+        self.registry = registry
+        self.interval = interval
+        self._handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "MetricsFileWriter":
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="metrics-file", daemon=True)
+            self._thread.start()
+        return self
+
+    def write(self) -> None:
+        snapshot = {"time": datetime.now().isoformat(), **self.registry.snapshot()}
+        self._handler.emit(logging.makeLogRecord({"msg": json.dumps(snapshot)}))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        # A final snapshot so short runs leave a record
+        self.write()
+        self._handler.close()
@@ -0,0 +1,513 @@
+"""Per-snapshot analysis and rendering shared by live polling and replay.
+
+:class:`GammaExposurePipeline` holds the analysis state and drives the
+plotter.  :class:`PipelinedRunner` runs fetching, analysis, persistence and
+rendering as separate stages connected by bounded queues so that a slow
+database or a slow redraw never delays the next fetch.  One runner can drive
+several pipelines, one per watchlist job, each with independent state.
+"""
+
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from chain_parser import ChainPayload
+from gamma_analysis import (
+    GammaCalculationResult,
+    OptionChainArrays,
+    StrikeExposure,
+    calculate_gamma_exposure,
+    flatten_option_chain,
+    summarize_gamma_exposure,
+    valid_contracts,
+)
+from greek_exposure import EXPOSURE_METRICS, ExposureResult, calculate_exposures
+from incremental_gamma import IncrementalGammaAggregator, StrikeWeightUpdate
+from metrics import MetricsRegistry
+
+
+class AnalysisFrame(NamedTuple):
+    """Analysis output for one snapshot, ready to be rendered."""
+
+    timestamp: datetime
+    total_gamma_exposure: float
+    per_strike_gamma_exposure: Dict[float, float]
+    change_in_gamma_per_strike: Dict[float, float]
+    largest_changes: List[Tuple[float, float, datetime]]
+    spot_price: float
+    fetched_monotonic: float = 0.0
+    exposures: Optional[ExposureResult] = None
+
+
+class GammaExposurePipeline:
+    """Run gamma exposure analysis on successive snapshots and feed the plotter.
+
+    The pipeline owns the state carried between snapshots (the previous
+    per-strike exposure) so that the live scheduler and the offline replayer
+    drive exactly the same code path.
+
+    Parameters
+    ----------
+    plotter:
+        Optional :class:`plotter.RealTimeGammaPlotter`.  When omitted only the
+        analysis runs.
+    show:
+        Call ``plotter.show_plots()`` after every update.  Disable for
+        non-interactive backends.
+    incremental:
+        Analyse full option chains with an
+        :class:`incremental_gamma.IncrementalGammaAggregator`, which only
+        re-aggregates the strikes whose contracts changed.  Streamed
+        :class:`incremental_gamma.StrikeWeightUpdate` inputs always are.
+    metrics:
+        :class:`metrics.MetricsRegistry` receiving the latency of response
+        decoding (``decode``), the analysis (``calculate``) and each plotter
+        update (``plot_*``).  Defaults to a private registry.
+    exposure_metrics:
+        Names from :data:`greek_exposure.EXPOSURE_METRICS` to compute for
+        full chains from the same flattened chain as gamma exposure; frames
+        carry them as :attr:`AnalysisFrame.exposures` and their totals are
+        kept in :attr:`exposure_totals` (and in the frame ``cache``).  They are extra
+        metrics only: the plotted gamma exposure always uses broker gamma.
+        Not available with ``incremental``.
+    cache:
+        Optional :class:`frame_cache.FrameCache` receiving every analysed
+        frame (timed as ``cache_write``); :meth:`warm_start` resumes from it.
+    """
+
+    def __init__(
+        self,
+        plotter=None,
+        show: bool = True,
+        incremental: bool = False,
+        metrics: Optional[MetricsRegistry] = None,
+        exposure_metrics: Sequence[str] = (),
+        cache=None,
+    ):
+        self.plotter = plotter
+        self.show = show
+        self.incremental = incremental
+        if exposure_metrics and incremental:
+            raise ValueError("exposure_metrics require full (non-incremental) analysis")
+        unknown = set(exposure_metrics) - set(EXPOSURE_METRICS)
+        if unknown:
+            raise ValueError(f"Unknown exposure metrics {sorted(unknown)}; expected some of {EXPOSURE_METRICS}")
+        self.exposure_metrics = tuple(dict.fromkeys(exposure_metrics))
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.aggregator = IncrementalGammaAggregator()
+        self.current_gamma_exposure: Dict[float, float] = {}
+        self.previous_gamma_exposure: Dict[float, float] = {}
+        self.change_in_gamma_per_strike: Dict[float, float] = {}
+        self.cache = cache
+        # Chain-wide totals of the latest exposure metrics, e.g. for metrics gauges
+        self.exposure_totals: Dict[str, float] = {}
+        self.processed = 0
+
+    def warm_start(self, day=None) -> int:
+        """Resume the analysis state and plotter history from the frames cached for ``day``.
+
+        ``day`` defaults to today (US/Eastern).  Returns the number of frames restored.
+        """
+
+        if self.cache is None:
+            return 0
+        cached = self.cache.load(day)
+        if cached is None or not len(cached):
+            return 0
+        cached.restore_pipeline(self)
+        if self.plotter is not None:
+            cached.restore_plotter(self.plotter)
+        return len(cached)
+
+    def analyze(self, data, timestamp: Optional[datetime] = None) -> AnalysisFrame:
+        """Analyse ``data`` fetched at ``timestamp`` and advance the state.
+
+        ``data`` is a full option chain (possibly still a raw
+        :class:`chain_parser.ChainPayload`), a :class:`StrikeExposure` already
+        aggregated per strike or a :class:`StrikeWeightUpdate` from streaming
+        ingestion.
+        """
+
+        timestamp = timestamp or datetime.now()
+        exposures = None
+        if isinstance(data, ChainPayload):
+            with self.metrics.time("decode"):
+                # Exposure metrics model the greeks of contracts gamma exposure drops
+                data = data.data if self.incremental else data.arrays(drop_invalid=not self.exposure_metrics)
+        with self.metrics.time("calculate"):
+            if isinstance(data, StrikeWeightUpdate):
+                self.aggregator.apply_update(data)
+                result = self.aggregator.commit(timestamp)
+            elif isinstance(data, StrikeExposure):
+                exposure = data.per_strike_gamma_exposure
+                result = summarize_gamma_exposure(
+                    list(exposure), list(exposure.values()), data.spot_price, self.previous_gamma_exposure, timestamp
+                )
+            elif self.incremental:
+                self.aggregator.apply_snapshot(data)
+                result = self.aggregator.commit(timestamp)
+            else:
+                if self.exposure_metrics:
+                    data = data if isinstance(data, OptionChainArrays) else flatten_option_chain(data, drop_invalid=False)
+                    exposures = calculate_exposures(data, self.exposure_metrics, timestamp)
+                    self.exposure_totals = exposures.totals()
+                    data = valid_contracts(data)
+                # Plotted and stored GEX stays on broker gamma whatever the exposure metrics
+                result = calculate_gamma_exposure(data, self.previous_gamma_exposure, timestamp)
+        total_gamma_exposure, self.current_gamma_exposure, self.change_in_gamma_per_strike, largest_changes, spot_price = result
+        self.previous_gamma_exposure = self.current_gamma_exposure.copy()
+        self.processed += 1
+        frame = AnalysisFrame(timestamp, *result, exposures=exposures)
+        if self.cache is not None:
+            try:
+                with self.metrics.time("cache_write"):
+                    self.cache.append(frame)
+            except Exception as e:
+                # The cache only speeds up restarts; never lose the frame over it
+                self.metrics["cache_write"].error()
+                print(f"An error occurred while caching a frame: {e}")
+        return frame
+
+    def render(self, frame: AnalysisFrame) -> None:
+        """Draw ``frame`` on the plotter, if there is one."""
+
+        if self.plotter is None:
+            return
+        with self.metrics.time("plot_gamma"):
+            self.plotter.update_plot_gamma(frame.per_strike_gamma_exposure)
+        with self.metrics.time("plot_change"):
+            self.plotter.update_plot_change_in_gamma(frame.change_in_gamma_per_strike, frame.largest_changes)
+        with self.metrics.time("plot_total"):
+            self.plotter.update_total_gamma_exposure_plot(frame.timestamp, frame.total_gamma_exposure, frame.spot_price)
+        if self.show:
+            with self.metrics.time("plot_show"):
+                self.plotter.show_plots()
+
+    def process(self, data: Dict, timestamp: Optional[datetime] = None) -> GammaCalculationResult:
+        """Analyse ``data`` fetched at ``timestamp`` and update the plots."""
+
+        frame = self.analyze(data, timestamp)
+        self.render(frame)
+        return tuple(frame[1:6])
+
+
+class LatestValue:
+    """Single-slot mailbox where a new value replaces an unread one (latest wins)."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._value = None
+        self._has_value = False
+        self.replaced = 0
+
+    def put(self, value) -> None:
+        with self._condition:
+            if self._has_value:
+                self.replaced += 1
+            self._value = value
+            self._has_value = True
+            self._condition.notify()
+
+    def take(self, timeout: Optional[float] = None):
+        """Return the pending value, waiting up to ``timeout`` seconds; ``None`` if empty."""
+
+        with self._condition:
+            if not self._has_value and timeout:
+                self._condition.wait(timeout)
+            if not self._has_value:
+                return None
+            value, self._value, self._has_value = self._value, None, False
+            return value
+
+    def __len__(self) -> int:
+        return int(self._has_value)
+
+
+class FixedRateClock:
+    """Tick every ``interval`` seconds on an absolute schedule.
+
+    Deadlines are ``start + n * interval`` so processing time never accumulates
+    as drift.  When a tick overruns past one or more deadlines, the missed
+    ticks are skipped (and counted) instead of firing in a burst.
+
+    :meth:`observe`, :meth:`success` and :meth:`failure` are the feedback
+    hooks of :class:`adaptive_schedule.AdaptivePollClock`; a fixed rate
+    ignores them.
+    """
+
+    def __init__(self, interval: float, clock: Callable[[], float] = time.monotonic):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.interval = interval
+        self.clock = clock
+        self._next = None
+        self.skipped = 0
+
+    def wait(self, stop_event: threading.Event) -> bool:
+        """Sleep until the next deadline; return ``False`` if ``stop_event`` was set."""
+
+        now = self.clock()
+        if self._next is None:
+            self._next = now
+        elif now >= self._next + self.interval:
+            missed = int((now - self._next) // self.interval)
+            self.skipped += missed
+            self._next += missed * self.interval
+        delay = self._next - now
+        self._next += self.interval
+        if delay > 0:
+            return not stop_event.wait(delay)
+        return not stop_event.is_set()
+
+    def observe(self, frame, key: Optional[str] = None) -> None:
+        pass
+
+    def success(self) -> None:
+        pass
+
+    def failure(self) -> None:
+        pass
+
+
+_STOP = object()
+
+
+class PipelinedRunner:
+    """Run fetch, analysis, storage and rendering as decoupled stages.
+
+    * The fetch stage runs on its own thread, driven by ``fetch_clock``
+      (a :class:`FixedRateClock` at ``interval`` unless given), which is
+      told about fetch failures and successes and every analysed frame.
+      ``fetch()`` returns ``(data, fetched_at)`` or ``None`` when there is
+      nothing to process.  When the runner drives
+      several ``pipelines``, ``fetch()`` instead returns an iterable of
+      ``(key, data, fetched_at)`` with ``key`` selecting the pipeline.
+    * Fetched snapshots are handed to ``storage.submit`` (non-blocking) and
+      to the analysis thread through a bounded queue; when the queue is full
+      the oldest snapshot is dropped.  Incremental updates (those with a
+      ``merged`` method) are not lost: a dropped update is folded into the
+      next one for the same pipeline.
+    * Every analysed frame is also passed to ``observer.observe(frame, key)``
+      for each of ``observers`` (e.g. :class:`alerts.AlertEngine`), on the
+      analysis thread; observers must only hand the frame off.
+    * Analysed frames go to a latest-wins slot per pipeline, consumed by
+      :meth:`run` on the calling thread, which is where GUI backends require
+      rendering to happen.
+
+    Per-stage latency, drop counts and queue depths are available from
+    :meth:`stage_stats`; pass a shared ``metrics`` registry to export them
+    (see :mod:`metrics`).  ``end_to_end`` runs from the fetch returning to
+    the frame being drawn.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], Any],
+        pipeline: Optional[GammaExposurePipeline] = None,
+        storage=None,
+        interval: float = 5.0,
+        queue_size: int = 4,
+        pump: Optional[Callable[[float], None]] = None,
+        pump_interval: float = 0.05,
+        clock: Callable[[], float] = time.monotonic,
+        pipelines: Optional[Mapping[str, GammaExposurePipeline]] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        fetch_clock=None,
+        observers: Sequence = (),
+    ):
+        if (pipeline is None) == (pipelines is None):
+            raise ValueError("Pass exactly one of pipeline or pipelines")
+        self.fetch = fetch
+        self.pipeline = pipeline
+        self.pipelines: Dict[Optional[str], GammaExposurePipeline] = dict(pipelines) if pipelines else {None: pipeline}
+        self.storage = storage
+        self.fetch_clock = fetch_clock if fetch_clock is not None else FixedRateClock(interval, clock)
+        self.observers = list(observers)
+        self.pump = pump
+        self.pump_interval = pump_interval
+        self.clock = clock
+        self.stats = metrics if metrics is not None else MetricsRegistry()
+        for name in ("fetch", "analysis", "storage", "render", "end_to_end"):
+            self.stats[name]  # created up front so every stage is reported
+        self._analysis_queue: "queue.Queue" = queue.Queue(maxsize=queue_size * len(self.pipelines))
+        self._frames = {key: LatestValue() for key in self.pipelines}
+        self.stats.gauge("analysis_queue_depth", self._analysis_queue.qsize)
+        self.stats.gauge("render_queue_depth", lambda: sum(len(slot) for slot in self._frames.values()))
+        self.stats.gauge("skipped_fetch_ticks", lambda: self.fetch_clock.skipped)
+        if storage is not None:
+            self.stats.gauge("storage_queue_depth", lambda: getattr(storage, "pending", 0))
+        self._frame_ready = threading.Event()
+        self._carry: Dict[Optional[str], Tuple] = {}
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> "PipelinedRunner":
+        if not self._threads:
+            self._stop.clear()
+            for target, name in ((self._fetch_loop, "fetch"), (self._analysis_loop, "analysis")):
+                thread = threading.Thread(target=target, name=f"pipeline-{name}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        try:
+            self._analysis_queue.put_nowait(_STOP)
+        except queue.Full:
+            pass
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _fetched_items(self, fetched) -> Iterable[Tuple[Optional[str], Dict, datetime]]:
+        if self.pipeline is not None:
+            data, fetched_at = fetched
+            return ((None, data, fetched_at),)
+        return fetched
+
+    def _fetch_loop(self) -> None:
+        while self.fetch_clock.wait(self._stop):
+            self._flush_carry()
+            started = self.clock()
+            try:
+                fetched = self.fetch()
+            except Exception as e:
+                self.stats["fetch"].error()
+                self.fetch_clock.failure()
+                print(f"An error occurred while fetching: {e}")
+                continue
+            self.stats["fetch"].observe(self.clock() - started)
+            self.fetch_clock.success()
+            if fetched is None:
+                continue
+
+            for key, data, fetched_at in self._fetched_items(fetched):
+                if key not in self.pipelines:
+                    print(f"Ignoring snapshot for unknown pipeline {key!r}")
+                    continue
+                if self.storage is not None:
+                    started_storage = self.clock()
+                    if not self.storage.submit(data, fetched_at):
+                        self.stats["storage"].drop()
+                    self.stats["storage"].observe(self.clock() - started_storage)
+                self._enqueue((key, data, fetched_at, self.clock()))
+
+    def _enqueue(self, item) -> None:
+        key = item[0]
+        carried = self._carry.pop(key, None)
+        if carried is not None:
+            item = (key, carried[1].merged(item[1])) + item[2:]
+        while True:
+            try:
+                self._analysis_queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    dropped = self._analysis_queue.get_nowait()
+                except queue.Empty:
+                    continue
+                self.stats["analysis"].drop()
+                dropped_key, dropped_data = dropped[0], dropped[1]
+                if hasattr(dropped_data, "merged") and not self._merge_into_queued(dropped_key, dropped_data):
+                    if dropped_key == key:
+                        item = (key, dropped_data.merged(item[1])) + item[2:]
+                    else:
+                        self._carry[dropped_key] = dropped
+
+    def _flush_carry(self) -> None:
+        """Queue carried-over updates once there is room, so quiet pipelines catch up."""
+
+        for key in list(self._carry):
+            try:
+                self._analysis_queue.put_nowait(self._carry[key])
+            except queue.Full:
+                return
+            del self._carry[key]
+
+    def _merge_into_queued(self, key, data) -> bool:
+        """Fold ``data`` into the oldest queued item for ``key``, if there is one."""
+
+        with self._analysis_queue.mutex:
+            pending = self._analysis_queue.queue
+            for index, queued in enumerate(pending):
+                if queued is not _STOP and queued[0] == key:
+                    pending[index] = (key, data.merged(queued[1])) + queued[2:]
+                    return True
+        return False
+
+    def _analysis_loop(self) -> None:
+        while True:
+            item = self._analysis_queue.get()
+            if item is _STOP or self._stop.is_set():
+                return
+            key, data, fetched_at, fetched_monotonic = item
+            started = self.clock()
+            try:
+                frame = self.pipelines[key].analyze(data, fetched_at)._replace(fetched_monotonic=fetched_monotonic)
+            except Exception as e:
+                self.stats["analysis"].error()
+                print(f"An error occurred during analysis of {key or 'snapshot'}: {e}")
+                continue
+            self.stats["analysis"].observe(self.clock() - started)
+            # A failing observer must neither stop this thread nor cost the frame
+            for observer in [self.fetch_clock, *self.observers]:
+                try:
+                    observer.observe(frame, key)
+                except Exception as e:
+                    print(f"An error occurred in {type(observer).__name__} observing {key or 'snapshot'}: {e}")
+            if len(self._frames[key]):
+                self.stats["render"].drop()
+            self._frames[key].put(frame)
+            self._frame_ready.set()
+
+    def render_pending(self, timeout: Optional[float] = None) -> bool:
+        """Render the latest analysed frame of every pipeline; return whether any was drawn."""
+
+        if timeout and not self._frame_ready.wait(timeout):
+            return False
+        self._frame_ready.clear()
+        rendered = False
+        for key, slot in self._frames.items():
+            frame = slot.take()
+            if frame is None:
+                continue
+            started = self.clock()
+            try:
+                self.pipelines[key].render(frame)
+            except Exception as e:
+                self.stats["render"].error()
+                print(f"An error occurred while rendering: {e}")
+                continue
+            finished = self.clock()
+            self.stats["render"].observe(finished - started)
+            self.stats["end_to_end"].observe(finished - frame.fetched_monotonic)
+            rendered = True
+        return rendered
+
+    def run(self, should_continue: Callable[[], bool] = lambda: True) -> None:
+        """Start the background stages and render on this thread until stopped."""
+
+        self.start()
+        try:
+            while should_continue() and not self._stop.is_set():
+                if self.pump is not None:
+                    self.render_pending()
+                    self.pump(self.pump_interval)  # process GUI events
+                else:
+                    self.render_pending(timeout=self.pump_interval)
+        finally:
+            self.stop()
+
+    def stage_stats(self) -> Dict[str, Dict[str, float]]:
+        """Return per-stage latency summaries and current queue depths."""
+
+        stats = {name: stage.snapshot() for name, stage in self.stats.items()}
+        stats["fetch"]["skipped_ticks"] = self.fetch_clock.skipped
+        stats["analysis"]["queue_depth"] = self._analysis_queue.qsize()
+        stats["render"]["queue_depth"] = sum(len(slot) for slot in self._frames.values())
+        if self.storage is not None:
+            stats["storage"]["queue_depth"] = getattr(self.storage, "pending", 0)
+        return stats
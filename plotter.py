@@ -1,34 +1,34 @@
 import matplotlib.pyplot as plt
 import matplotlib as mpl
 import matplotlib.dates as mdates
+from matplotlib.patches import Patch
 from datetime import datetime
 from collections import deque
 import numpy as np
 
+from rolling_stats import RollingWindowStats
+from timeseries import TimeSeriesStore
+
 # Adjust global font size
 mpl.rcParams.update({'font.size': mpl.rcParams['font.size'] - 4})
 class RealTimeGammaPlotter:
-    def __init__(self):
+    # History retention: 'history_capacity' full-resolution ticks (12h at 5s), then
+    # 'downsample_factor' ticks averaged per archived point for 'archive_capacity' points (one week of minutes)
+    def __init__(self, history_capacity=8640, downsample_factor=12, archive_capacity=10080):
         plt.ion()  # Turn on interactive mode
         self.fig, self.ax = plt.subplots(3, 1, figsize=(14, 24))  # Create 3 subplots: gamma, change in gamma, and total gamma exposure over time
         self.ax2 = self.ax[2].twinx()  # Create a twin y-axis for the spot price on total gamma exposure over time chart
         
-        # Initialize data structures to store time and total gamma exposure
-        self.total_gamma_exposure_times = [] #times 
-        self.total_gamma_exposures = []
-        self.spot_prices = []
+        # Bounded store of time, total gamma exposure and spot price
+        self.history = TimeSeriesStore(
+            ('total_gamma_exposure', 'spot_price'), history_capacity, downsample_factor, archive_capacity
+        )
         self.largest_change_points = deque(maxlen=200)
 
-        # Deques to track strikes of largest positive and negative changes for the last 'x' updates
+        # Rolling statistics of the strikes of the largest positive and negative changes over the last 'x' updates
         deque_length = 100 # mean and std. deviation length /x/
-        self.positive_changes_strikes = deque(maxlen=deque_length)
-        self.negative_changes_strikes = deque(maxlen=deque_length)
-
-        # For historical mean and std tracking
-        self.mean_positive_history = []
-        self.std_positive_history = []
-        self.mean_negative_history = []
-        self.std_negative_history = []
+        self.positive_change_stats = RollingWindowStats(deque_length, history_capacity, downsample_factor, archive_capacity)
+        self.negative_change_stats = RollingWindowStats(deque_length, history_capacity, downsample_factor, archive_capacity)
 
     def init_plots(self):
         self.ax[0].clear()
@@ -79,25 +79,62 @@ class RealTimeGammaPlotter:
                 self.ax[1].bar(strikes_str[index], top_change, color='red')
                 self.ax[1].text(strikes_str[index], top_change, f'{top_change:.2f}', ha='center')
 
-                # Store the largest changes for plotting on the total exposure graph
-                self.largest_change_points.append((timestamp, top_strike, top_change))
-
-                if top_change > 0:
-                    self.positive_changes_strikes.append(top_strike)
-                elif top_change < 0:
-                    self.negative_changes_strikes.append(top_strike)
+                self._record_largest_change(timestamp, top_strike, top_change)
 
         self.ax[1].tick_params(axis='x', rotation=90)
         self.ax[1].legend()
 
+    def _record_largest_change(self, timestamp, top_strike, top_change):
+        # Store the largest changes for plotting on the total exposure graph
+        self.largest_change_points.append((timestamp, top_strike, top_change))
+
+        if top_change > 0:
+            self.positive_change_stats.push(top_strike)
+        elif top_change < 0:
+            self.negative_change_stats.push(top_strike)
+
+    def record_frame(self, time_stamp, largest_changes, total_gamma_exposure, spot_price):
+        """Add a frame to the histories without drawing it.
+
+        Renderers that cap their frame rate call this for the frames they skip,
+        so the time series and change statistics still see every update.
+        """
+        for top_strike, top_change, timestamp in largest_changes:
+            self._record_largest_change(timestamp, top_strike, top_change)
+        self.history.append(time_stamp, total_gamma_exposure, spot_price)
+        for stats in (self.positive_change_stats, self.negative_change_stats):
+            if stats:
+                stats.record(time_stamp)
+
+    def restore_frames(self, times, totals, spots, change_frames, change_times, change_strikes, change_values):
+        """Record a run of earlier frames at once, as :meth:`record_frame` would one by one.
+
+        Used to warm-start from :class:`frame_cache.FrameCache`.  ``times``,
+        ``totals`` and ``spots`` hold one entry per frame; the largest changes
+        are flattened, ``change_frames`` giving the index of each one's frame.
+        """
+        change_values = np.asarray(change_values)
+        change_strikes = np.asarray(change_strikes)
+        change_frames = np.asarray(change_frames)
+        self.history.extend(times, totals, spots)
+        recent = slice(-self.largest_change_points.maxlen, None)
+        self.largest_change_points.extend(zip(
+            np.asarray(change_times, dtype='datetime64[us]')[recent].tolist(),
+            change_strikes[recent].tolist(),
+            change_values[recent].tolist(),
+        ))
+        frames = np.arange(len(times))
+        for stats, selected in ((self.positive_change_stats, change_values > 0), (self.negative_change_stats, change_values < 0)):
+            # Number of this sign's changes recorded up to and including each frame
+            counts = np.searchsorted(change_frames[selected], frames, side='right')
+            stats.extend(change_strikes[selected], times, counts)
+
     def update_total_gamma_exposure_plot(self, time_stamp, total_gamma_exposure, spot_price):
-        self.total_gamma_exposure_times.append(time_stamp)
-        self.total_gamma_exposures.append(total_gamma_exposure)
-        self.spot_prices.append(spot_price)
+        self.history.append(time_stamp, total_gamma_exposure, spot_price)
 
         # plot the total gamma exposure over time on the left axis, plot the spot prices on the right axis
-        self.ax[2].plot(self.total_gamma_exposure_times, self.total_gamma_exposures, 'b-', label='Total Gamma Exposure')
-        self.ax2.plot(self.total_gamma_exposure_times, self.spot_prices, 'g-', label='SPX Spot Price ($)')
+        self.ax[2].plot(*self.history.series('total_gamma_exposure'), 'b-', label='Total Gamma Exposure')
+        self.ax2.plot(*self.history.series('spot_price'), 'g-', label='SPX Spot Price ($)')
 
         # On the right axis, plot dots at strikes for the largest changes 
         for timestamp, strike, change in self.largest_change_points:
@@ -111,27 +148,19 @@ class RealTimeGammaPlotter:
         self.ax2.tick_params(axis='y', labelcolor='green')
 
         # Update and plot historical means and standard deviations
-        if self.positive_changes_strikes:
-            mean_positive = np.mean(list(self.positive_changes_strikes))
-            std_dev_positive = np.std(list(self.positive_changes_strikes))
-            self.mean_positive_history.append(mean_positive)
-            self.std_positive_history.append(std_dev_positive)
-
-            self.ax2.plot(self.total_gamma_exposure_times[-len(self.mean_positive_history):], self.mean_positive_history, 'lightgreen', label='Mean Strike Positive Changes')
-            lower_bound = np.array(self.mean_positive_history) - np.array(self.std_positive_history)
-            upper_bound = np.array(self.mean_positive_history) + np.array(self.std_positive_history)
-            self.ax2.fill_between(self.total_gamma_exposure_times[-len(self.mean_positive_history):], lower_bound, upper_bound, color='lightgreen', alpha=0.3, label='Std Dev Positive Changes')
-
-        if self.negative_changes_strikes:
-            mean_negative = np.mean(list(self.negative_changes_strikes))
-            std_dev_negative = np.std(list(self.negative_changes_strikes))
-            self.mean_negative_history.append(mean_negative)
-            self.std_negative_history.append(std_dev_negative)
-
-            self.ax2.plot(self.total_gamma_exposure_times[-len(self.mean_negative_history):], self.mean_negative_history, 'lightcoral', label='Mean Strike Negative Changes')
-            lower_bound = np.array(self.mean_negative_history) - np.array(self.std_negative_history)
-            upper_bound = np.array(self.mean_negative_history) + np.array(self.std_negative_history)
-            self.ax2.fill_between(self.total_gamma_exposure_times[-len(self.mean_negative_history):], lower_bound, upper_bound, color='lightcoral', alpha=0.3, label='Std Dev Negative Changes')
+        if self.positive_change_stats:
+            self.positive_change_stats.record(time_stamp)
+            times, mean_positive, std_positive = self.positive_change_stats.history()
+
+            self.ax2.plot(times, mean_positive, 'lightgreen', label='Mean Strike Positive Changes')
+            self.ax2.fill_between(times, mean_positive - std_positive, mean_positive + std_positive, color='lightgreen', alpha=0.3, label='Std Dev Positive Changes')
+
+        if self.negative_change_stats:
+            self.negative_change_stats.record(time_stamp)
+            times, mean_negative, std_negative = self.negative_change_stats.history()
+
+            self.ax2.plot(times, mean_negative, 'lightcoral', label='Mean Strike Negative Changes')
+            self.ax2.fill_between(times, mean_negative - std_negative, mean_negative + std_negative, color='lightcoral', alpha=0.3, label='Std Dev Negative Changes')
 
         # Format the x-axis to display dates nicely
         self.ax[2].xaxis.set_major_locator(mdates.AutoDateLocator())
@@ -141,3 +170,230 @@ class RealTimeGammaPlotter:
 
     def show_plots(self):
         plt.show(block=False)
+
+
+class RetainedGammaPlotter(RealTimeGammaPlotter):
+    """Incremental renderer that creates its artists once and updates them in place.
+
+    Bars, lines, bands and the largest-change markers are created a single
+    time and refreshed with ``set_height``/``set_data``/``set_offsets``.  Data
+    artists are animated and blitted over a cached background; the full figure
+    is only redrawn when an axis has to be rescaled or the strike set changes.
+    Axis limits carry headroom so that, most of the time, a tick only repaints
+    the data artists and the per-frame cost stays flat however long the
+    session runs.
+    """
+
+    headroom = 0.1  # fraction of the data range added when an axis is rescaled
+    min_time_lead = 10 / (24 * 60)  # keep at least 10 minutes of room on the time axis
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Interactive mode would schedule a full redraw whenever an artist
+        # changes; this renderer decides itself when a full draw is needed.
+        plt.ioff()
+
+        self._bars = {}  # axis index -> (strikes, BarContainer)
+        self._highlighted = []
+        self._background = None
+        self._layout_changed = True
+
+        self.init_plots()
+        self._create_artists()
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _create_artists(self):
+        self.ax[0].legend(handles=[Patch(color='skyblue', label='Current Gamma Exposure ($Bn)')])
+        self.ax[1].legend(handles=[Patch(color='lightgrey', label='Change in Gamma ($Bn)')])
+        self.change_labels = [
+            self.ax[1].text(0, 0, '', ha='center', visible=False, animated=True)
+            for _ in range(5)
+        ]
+
+        self.total_line, = self.ax[2].plot([], [], 'b-', label='Total Gamma Exposure', animated=True)
+        self.spot_line, = self.ax2.plot([], [], 'g-', label='SPX Spot Price ($)', animated=True)
+        self.change_points = self.ax2.scatter([], [], s=10, marker='o', zorder=5, animated=True)
+        self.mean_lines = {}
+        self.std_bands = {}
+        for key, color, name in (('positive', 'lightgreen', 'Positive'), ('negative', 'lightcoral', 'Negative')):
+            self.mean_lines[key], = self.ax2.plot([], [], color, label=f'Mean Strike {name} Changes', animated=True)
+            self.std_bands[key] = self.ax2.fill_between(
+                [], [], [], color=color, alpha=0.3, label=f'Std Dev {name} Changes', animated=True
+            )
+
+        self.ax[2].legend(loc='upper left')
+        self.ax[2].tick_params(axis='y', labelcolor='blue')
+        self.ax2.legend(loc='upper right')
+        self.ax2.tick_params(axis='y', labelcolor='green')
+        self.ax[2].xaxis_date()
+        self.ax[2].xaxis.set_major_locator(mdates.AutoDateLocator())
+        self.ax[2].xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d %H:%M'))
+
+    def _animated_artists(self):
+        for _, bars in self._bars.values():
+            yield from bars.patches
+        yield from self.change_labels
+        yield self.total_line
+        yield self.spot_line
+        yield from self.std_bands.values()
+        yield from self.mean_lines.values()
+        yield self.change_points
+
+    def _set_bars(self, index, values_per_strike, color):
+        strikes = tuple(sorted(values_per_strike, key=float))
+        heights = [values_per_strike[strike] for strike in strikes]
+        current_strikes, bars = self._bars.get(index, (None, None))
+
+        if strikes != current_strikes:
+            if bars is not None:
+                bars.remove()
+            axis = self.ax[index]
+            bars = axis.bar(range(len(strikes)), heights, color=color, animated=True)
+            axis.set_xticks(range(len(strikes)), [str(strike) for strike in strikes], rotation=90)
+            if strikes:
+                axis.set_xlim(-0.5, len(strikes) - 0.5)
+            self._bars[index] = (strikes, bars)
+            self._layout_changed = True
+            if index == 1:
+                self._highlighted = []
+        else:
+            for rectangle, height in zip(bars.patches, heights):
+                rectangle.set_height(height)
+
+        if heights:
+            self._fit_limits(self.ax[index], min(0.0, min(heights)), max(0.0, max(heights)))
+        return strikes, bars
+
+    def _fit_limits(self, axis, low, high):
+        """Rescale ``axis`` when the data leaves its limits or fills under a quarter of them."""
+
+        if not (np.isfinite(low) and np.isfinite(high)):
+            return
+        current_low, current_high = axis.get_ylim()
+        span = high - low
+        if low >= current_low and high <= current_high and span * 4 >= current_high - current_low:
+            return
+        padding = span * self.headroom or max(abs(high), 1.0) * self.headroom
+        axis.set_ylim(low - padding, high + padding)
+        self._layout_changed = True
+
+    def update_plot_gamma(self, current_gamma_exposure):
+        self._set_bars(0, current_gamma_exposure, 'skyblue')
+
+    def update_plot_change_in_gamma(self, change_in_gamma_per_strike, largest_changes):
+        strikes, bars = self._set_bars(1, change_in_gamma_per_strike, 'lightgrey')
+        positions = {strike: position for position, strike in enumerate(strikes)}
+
+        for position in self._highlighted:
+            bars.patches[position].set_color('lightgrey')
+        self._highlighted = []
+
+        # Annotate largest changes
+        labels = iter(self.change_labels)
+        for top_strike, top_change, timestamp in largest_changes:
+            if top_strike in positions:
+                position = positions[top_strike]
+                bars.patches[position].set_color('red')
+                self._highlighted.append(position)
+                label = next(labels, None)
+                if label is not None:
+                    label.set_position((position, top_change))
+                    label.set_text(f'{top_change:.2f}')
+                    label.set_visible(True)
+
+                self._record_largest_change(timestamp, top_strike, top_change)
+        for label in labels:
+            label.set_visible(False)
+
+    def update_total_gamma_exposure_plot(self, time_stamp, total_gamma_exposure, spot_price):
+        self.history.append(time_stamp, total_gamma_exposure, spot_price)
+        times, totals = self.history.series('total_gamma_exposure')
+        _, spots = self.history.series('spot_price')
+        times = mdates.date2num(times)
+
+        self.total_line.set_data(times, totals)
+        self.spot_line.set_data(times, spots)
+
+        right_low, right_high = float(np.nanmin(spots)), float(np.nanmax(spots))
+        if self.largest_change_points:
+            points = np.array(
+                [(mdates.date2num(timestamp), strike) for timestamp, strike, _ in self.largest_change_points]
+            )
+            colors = ['red' if change < 0 else 'green' for _, _, change in self.largest_change_points]
+            self.change_points.set_offsets(points)
+            self.change_points.set_color(colors)
+            right_low, right_high = min(right_low, points[:, 1].min()), max(right_high, points[:, 1].max())
+
+        for key, stats in (('positive', self.positive_change_stats), ('negative', self.negative_change_stats)):
+            if not stats:
+                continue
+            stats.record(time_stamp)
+            stat_times, mean, std = stats.history()
+            stat_times = mdates.date2num(stat_times)
+            lower, upper = mean - std, mean + std
+            self.mean_lines[key].set_data(stat_times, mean)
+            self.std_bands[key].set_verts([
+                np.column_stack((np.concatenate((stat_times, stat_times[::-1])), np.concatenate((lower, upper[::-1]))))
+            ])
+            right_low, right_high = min(right_low, float(np.nanmin(lower))), max(right_high, float(np.nanmax(upper)))
+
+        self._fit_time_axis(times[0], times[-1])
+        self._fit_limits(self.ax[2], float(np.nanmin(totals)), float(np.nanmax(totals)))
+        self._fit_limits(self.ax2, right_low, right_high)
+        self.render()
+
+    def _fit_time_axis(self, first, last):
+        current_low, current_high = self.ax[2].get_xlim()
+        span = max(last - first, self.min_time_lead)
+        if current_low <= first <= current_low + span * 0.25 and last <= current_high:
+            return
+        self.ax[2].set_xlim(first, last + max(span * 0.25, self.min_time_lead))
+        self._layout_changed = True
+
+    def _draw_animated(self):
+        for artist in self._animated_artists():
+            self.fig.draw_artist(artist)
+
+    def _on_draw(self, event):
+        # Any full draw (ours, a resize, a toolbar action) refreshes the background.
+        canvas = self.fig.canvas
+        if event is not None and event.canvas is not canvas:
+            return
+        if not canvas.supports_blit:
+            # A vector savefig skips animated artists; draw them into its renderer
+            if event is not None:
+                for artist in self._animated_artists():
+                    artist.draw(event.renderer)
+            return
+        self._background = canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_animated()
+
+    def render(self):
+        """Repaint the figure, blitting the data artists when the layout is unchanged."""
+
+        canvas = self.fig.canvas
+        if self._layout_changed or self._background is None or not canvas.supports_blit:
+            self._layout_changed = False
+            canvas.draw()
+        else:
+            canvas.restore_region(self._background)
+            self._draw_animated()
+            canvas.blit(self.fig.bbox)
+        # The frame is current; stop plt.pause from scheduling another full draw.
+        self.fig.stale = False
+
+
+RENDER_MODES = {
+    'redraw': RealTimeGammaPlotter,
+    'retained': RetainedGammaPlotter,
+}
+
+
+def create_plotter(render_mode='retained', **kwargs):
+    """Build a plotter for ``render_mode`` (``'redraw'`` or ``'retained'``)."""
+
+    try:
+        plotter_class = RENDER_MODES[render_mode]
+    except KeyError:
+        raise ValueError(f"Unknown render mode {render_mode!r}; expected one of {sorted(RENDER_MODES)}") from None
+    return plotter_class(**kwargs)
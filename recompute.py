@@ -0,0 +1,537 @@
+"""Parallel recomputation of gamma exposure over the stored snapshot archive.
+
+The ``spx_options_data`` archive is split into fixed time partitions (whole
+UTC days by default).  Each partition is analysed by a worker of a
+``ProcessPoolExecutor``: snapshots are streamed in fetch order through
+:func:`db_storage.iter_raw_snapshots` (a server-side cursor on PostgreSQL)
+and run through :func:`gamma_analysis.calculate_gamma_exposure`, so a change
+to the exposure formula can be applied to weeks of history using every core.
+
+Changes are measured against the previous snapshot of the same symbol, which
+for the first snapshot of a partition lies in the partition before.  Workers
+therefore seed their state with :func:`db_storage.latest_snapshots_before`,
+making every partition independent and the output identical to a serial run
+whatever the number of workers.
+
+Archives written with ``storage_mode="delta"`` are read from
+``spx_options_deltas`` instead (``--deltas``); snapshots are then
+materialized from the nearest keyframe before each partition, which also
+provides the seed.
+
+Results go to the ``gamma_exposure_results`` table or, with ``--output-dir``,
+to one NPZ file per partition.  A partition is recorded as done in the same
+transaction as its results (or by its file appearing), so an interrupted run
+picks up where it stopped; ``--restart`` recomputes everything in the range.
+
+Examples
+--------
+Recompute May on eight cores into NPZ files::
+
+    python recompute.py --db --start 2024-05-01T00:00:00+00:00 --end 2024-06-01T00:00:00+00:00 \\
+        --workers 8 --output-dir gex_may
+
+Recompute a local SQLite archive by hour into the derived table::
+
+    python recompute.py --sqlite options.db --partition-hours 1
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import db_storage
+from gamma_analysis import calculate_gamma_exposure
+
+RESULT_COLUMNS = (
+    "fetched_at",
+    "symbol",
+    "total_gamma_exposure",
+    "spot_price",
+    "per_strike_gamma_exposure",
+    "change_in_gamma_per_strike",
+    "largest_changes",
+)
+
+RESULT_SCHEMA_STATEMENTS = {
+    "pyformat": [
+        """
+        CREATE TABLE IF NOT EXISTS gamma_exposure_results (
+            fetched_at TIMESTAMPTZ NOT NULL,
+            symbol TEXT,
+            total_gamma_exposure DOUBLE PRECISION,
+            spot_price DOUBLE PRECISION,
+            per_strike_gamma_exposure JSONB NOT NULL,
+            change_in_gamma_per_strike JSONB NOT NULL,
+            largest_changes JSONB NOT NULL
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS gamma_exposure_results_fetched_at_idx
+            ON gamma_exposure_results (fetched_at)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS gamma_exposure_checkpoints (
+            partition_start TIMESTAMPTZ NOT NULL,
+            partition_end TIMESTAMPTZ NOT NULL,
+            symbol TEXT NOT NULL,
+            snapshots INTEGER NOT NULL,
+            completed_at TIMESTAMPTZ NOT NULL,
+            PRIMARY KEY (partition_start, partition_end, symbol)
+        )
+        """,
+    ],
+    "qmark": [
+        """
+        CREATE TABLE IF NOT EXISTS gamma_exposure_results (
+            fetched_at TEXT NOT NULL,
+            symbol TEXT,
+            total_gamma_exposure REAL,
+            spot_price REAL,
+            per_strike_gamma_exposure TEXT NOT NULL,
+            change_in_gamma_per_strike TEXT NOT NULL,
+            largest_changes TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS gamma_exposure_results_fetched_at_idx
+            ON gamma_exposure_results (fetched_at)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS gamma_exposure_checkpoints (
+            partition_start TEXT NOT NULL,
+            partition_end TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            snapshots INTEGER NOT NULL,
+            completed_at TEXT NOT NULL,
+            PRIMARY KEY (partition_start, partition_end, symbol)
+        )
+        """,
+    ],
+}
+
+# One microsecond, the timestamp resolution of both databases; partitions are
+# half-open while ``iter_raw_snapshots`` takes an inclusive end.
+_RESOLUTION = timedelta(microseconds=1)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+@dataclass(frozen=True)
+class Partition:
+    """The snapshots with ``start <= fetched_at < end``, optionally of one symbol."""
+
+    start: datetime
+    end: datetime
+    symbol: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        symbol = "".join(c for c in self.symbol if c.isalnum()) if self.symbol else "all"
+        return f"gex_{self.start:%Y%m%dT%H%M%S}_{self.end:%Y%m%dT%H%M%S}_{symbol}"
+
+
+@dataclass
+class PartitionResult:
+    partition: Partition
+    snapshots: int = 0
+    skipped: bool = False
+
+
+def partition_range(start: datetime, end: datetime, width: timedelta, symbol: Optional[str] = None) -> List[Partition]:
+    """Split ``[start, end)`` into partitions aligned to multiples of ``width`` since the epoch.
+
+    Alignment makes partition boundaries, and so checkpoints, independent of
+    the requested range: re-running with a wider range reuses finished work.
+    """
+
+    partitions = []
+    offset = (start - _EPOCH) % width
+    boundary = start - offset
+    while boundary < end:
+        partitions.append(Partition(max(boundary, start), min(boundary + width, end), symbol))
+        boundary += width
+    return partitions
+
+
+def archive_bounds(connection_pool, deltas: bool = False) -> Optional[Tuple[datetime, datetime]]:
+    """Return the first and last ``fetched_at`` in the archive; ``None`` when empty.
+
+    ``deltas`` reads ``spx_options_deltas`` instead of ``spx_options_data``.
+    """
+
+    table = "spx_options_deltas" if deltas else "spx_options_data"
+    rows = db_storage._query(connection_pool, f"SELECT MIN(fetched_at), MAX(fetched_at) FROM {table}", ())
+    first, last = rows[0]
+    if first is None:
+        return None
+    return db_storage._from_db_timestamp(first), db_storage._from_db_timestamp(last)
+
+
+def ensure_result_schema(connection_pool) -> None:
+    conn = connection_pool.getconn()
+    try:
+        cur = conn.cursor()
+        for statement in RESULT_SCHEMA_STATEMENTS[db_storage._paramstyle(connection_pool)]:
+            cur.execute(statement)
+        conn.commit()
+        cur.close()
+    finally:
+        connection_pool.putconn(conn)
+
+
+def _db_value(paramstyle: str, value: Any) -> Any:
+    if isinstance(value, datetime) and paramstyle == "qmark":
+        return db_storage._sqlite_timestamp(value)
+    return value
+
+
+def completed_partitions(connection_pool, partitions: List[Partition]) -> List[bool]:
+    """Return, per partition, whether a checkpoint says its results are stored."""
+
+    paramstyle = db_storage._paramstyle(connection_pool)
+    rows = db_storage._query(
+        connection_pool,
+        "SELECT partition_start, partition_end, symbol FROM gamma_exposure_checkpoints "
+        "WHERE partition_end > %s AND partition_start < %s",
+        (min(p.start for p in partitions), max(p.end for p in partitions)),
+    ) if partitions else []
+    done = {tuple(row) for row in rows}
+    return [
+        (_db_value(paramstyle, p.start), _db_value(paramstyle, p.end), p.symbol or "") in done
+        for p in partitions
+    ]
+
+
+def clear_results(connection_pool, start: datetime, end: datetime, symbol: Optional[str] = None) -> None:
+    """Delete results and checkpoints within ``[start, end)`` so they are recomputed."""
+
+    paramstyle = db_storage._paramstyle(connection_pool)
+    placeholder = "?" if paramstyle == "qmark" else "%s"
+    bounds = (_db_value(paramstyle, start), _db_value(paramstyle, end))
+    conn = connection_pool.getconn()
+    try:
+        cur = conn.cursor()
+        sql = f"DELETE FROM gamma_exposure_results WHERE fetched_at >= {placeholder} AND fetched_at < {placeholder}"
+        params = bounds
+        if symbol is not None:
+            sql += f" AND symbol = {placeholder}"
+            params += (symbol,)
+        cur.execute(sql, params)
+        cur.execute(
+            "DELETE FROM gamma_exposure_checkpoints "
+            f"WHERE partition_start >= {placeholder} AND partition_end <= {placeholder}"
+            + (f" AND symbol = {placeholder}" if symbol is not None else ""),
+            bounds + ((symbol,) if symbol is not None else ()),
+        )
+        conn.commit()
+        cur.close()
+    finally:
+        connection_pool.putconn(conn)
+
+
+def _delta_partition_snapshots(
+    connection_pool, partition: Partition, since: Optional[datetime]
+) -> Tuple[List[Tuple[datetime, Dict]], Iterator[Tuple[datetime, Dict]]]:
+    """Return the seed snapshots and the snapshots of ``partition`` from ``spx_options_deltas``."""
+
+    records = db_storage._delta_records(connection_pool, partition.start, partition.end - _RESOLUTION, partition.symbol)
+    seeds: Dict[Optional[str], Tuple[datetime, Dict]] = {}
+    first: List[Tuple[datetime, Dict]] = []
+    # Records before the partition only rebuild each symbol's state from its keyframe
+    for fetched_at, symbol, data in records:
+        if fetched_at >= partition.start:
+            first.append((fetched_at, data))
+            break
+        if since is None or fetched_at >= since:
+            seeds[symbol] = (fetched_at, data)
+    snapshots = itertools.chain(first, ((fetched_at, data) for fetched_at, _, data in records))
+    return list(seeds.values()), snapshots
+
+
+def analyse_partition(
+    connection_pool, partition: Partition, seed_lookback: Optional[timedelta] = None, deltas: bool = False
+) -> Iterator[Tuple[datetime, Optional[str], Tuple]]:
+    """Yield ``(fetched_at, symbol, GammaCalculationResult)`` for each snapshot of ``partition``.
+
+    Each symbol's changes are measured against its previous snapshot, seeded
+    from the last one stored before the partition (at most ``seed_lookback``
+    earlier).  ``deltas`` reads the delta-encoded archive.
+    """
+
+    previous: Dict[Optional[str], Dict[float, float]] = {}
+    # calculate_gamma_exposure prints every result; silence it for batch runs
+    with contextlib.redirect_stdout(None):
+        since = partition.start - seed_lookback if seed_lookback is not None else None
+        if deltas:
+            seeds, snapshots = _delta_partition_snapshots(connection_pool, partition, since)
+        else:
+            seeds = db_storage.latest_snapshots_before(connection_pool, partition.start, since, partition.symbol)
+            snapshots = db_storage.iter_raw_snapshots(
+                connection_pool, partition.start, partition.end - _RESOLUTION, symbol=partition.symbol
+            )
+        for _, data in seeds:
+            previous[data.get("symbol")] = calculate_gamma_exposure(data)[1]
+        for fetched_at, data in snapshots:
+            symbol = data.get("symbol")
+            result = calculate_gamma_exposure(data, previous.get(symbol), fetched_at)
+            previous[symbol] = result[1]
+            yield fetched_at, symbol, result
+
+
+def _result_row(fetched_at: datetime, symbol: Optional[str], result: Tuple) -> Tuple:
+    total_gamma_exposure, exposure, changes, largest_changes, spot_price = result
+    return (
+        fetched_at,
+        symbol,
+        total_gamma_exposure,
+        spot_price,
+        json.dumps(list(exposure.items())),
+        json.dumps(list(changes.items())),
+        json.dumps([(strike, change) for strike, change, _ in largest_changes]),
+    )
+
+
+def write_partition_rows(connection_pool, partition: Partition, rows: List[Tuple]) -> None:
+    """Replace the stored results of ``partition`` with ``rows`` and checkpoint it, in one transaction."""
+
+    paramstyle = db_storage._paramstyle(connection_pool)
+    placeholder = "?" if paramstyle == "qmark" else "%s"
+    start, end = _db_value(paramstyle, partition.start), _db_value(paramstyle, partition.end)
+    conn = connection_pool.getconn()
+    healthy = False
+    try:
+        cur = conn.cursor()
+        sql = f"DELETE FROM gamma_exposure_results WHERE fetched_at >= {placeholder} AND fetched_at < {placeholder}"
+        params: Tuple = (start, end)
+        if partition.symbol is not None:
+            sql += f" AND symbol = {placeholder}"
+            params += (partition.symbol,)
+        cur.execute(sql, params)
+        columns = ", ".join(RESULT_COLUMNS)
+        if paramstyle == "qmark":
+            cur.executemany(
+                f"INSERT INTO gamma_exposure_results ({columns}) VALUES ({', '.join('?' for _ in RESULT_COLUMNS)})",
+                [(_db_value(paramstyle, row[0]),) + row[1:] for row in rows],
+            )
+        elif rows:
+            db_storage.execute_values(
+                cur, f"INSERT INTO gamma_exposure_results ({columns}) VALUES %s", rows, page_size=1000
+            )
+        cur.execute(
+            "INSERT INTO gamma_exposure_checkpoints (partition_start, partition_end, symbol, snapshots, completed_at) "
+            f"VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})",
+            (start, end, partition.symbol or "", len(rows), _db_value(paramstyle, datetime.now(timezone.utc))),
+        )
+        conn.commit()
+        cur.close()
+        healthy = True
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:  # pragma: no cover - connection already broken
+            pass
+        raise
+    finally:
+        connection_pool.putconn(conn, close=not healthy)
+
+
+def write_partition_npz(path: str, results: List[Tuple[datetime, Optional[str], Tuple]]) -> None:
+    """Write ``results`` to ``path`` as columnar NumPy arrays.
+
+    Per-snapshot arrays (``fetched_at``, ``symbol``, ``total_gamma_exposure``,
+    ``spot_price``) have one entry per snapshot.  ``strike_row``, ``strike``,
+    ``gamma_exposure`` and ``change`` hold one entry per strike of every
+    snapshot, ``strike_row`` indexing the snapshot and ``change`` being NaN
+    where there was no previous exposure.  ``largest_row``, ``largest_strike``
+    and ``largest_change`` hold the top changes, in rank order per snapshot.
+    """
+
+    strike_row, strikes, exposures, changes = [], [], [], []
+    largest_row, largest_strike, largest_change = [], [], []
+    for row, (_, _, (_, exposure, change, largest_changes, _)) in enumerate(results):
+        strike_row.extend([row] * len(exposure))
+        strikes.extend(exposure)
+        exposures.extend(exposure.values())
+        changes.extend(change.get(strike, np.nan) for strike in exposure)
+        for strike, value, _ in largest_changes:
+            largest_row.append(row)
+            largest_strike.append(strike)
+            largest_change.append(value)
+
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as handle:
+        np.savez(
+            handle,
+            fetched_at=db_storage._to_datetime64([fetched_at for fetched_at, _, _ in results]),
+            symbol=np.array([symbol or "" for _, symbol, _ in results], dtype=str),
+            total_gamma_exposure=np.array([result[0] for _, _, result in results], dtype=np.float64),
+            spot_price=np.array([result[4] for _, _, result in results], dtype=np.float64),
+            strike_row=np.array(strike_row, dtype=np.int64),
+            strike=np.array(strikes, dtype=np.float64),
+            gamma_exposure=np.array(exposures, dtype=np.float64),
+            change=np.array(changes, dtype=np.float64),
+            largest_row=np.array(largest_row, dtype=np.int64),
+            largest_strike=np.array(largest_strike, dtype=np.float64),
+            largest_change=np.array(largest_change, dtype=np.float64),
+        )
+    # The file appearing is the checkpoint, so it must never be partial
+    os.replace(temporary, path)
+
+
+def npz_path(output_dir: str, partition: Partition) -> str:
+    return os.path.join(output_dir, partition.name + ".npz")
+
+
+# Worker processes open one connection pool each, in the initializer.
+_worker_pool = None
+
+
+def _open_pool(sqlite: Optional[str], db_params: Optional[Dict[str, Any]]):
+    if sqlite:
+        return db_storage.SQLiteConnectionPool(sqlite)
+    return db_storage.create_connection_pool(db_params or db_storage.DEFAULT_DB_PARAMS, 1, 1)
+
+
+def _init_worker(sqlite: Optional[str], db_params: Optional[Dict[str, Any]]) -> None:
+    global _worker_pool
+    _worker_pool = _open_pool(sqlite, db_params)
+
+
+def recompute_partition(
+    partition: Partition,
+    output_dir: Optional[str] = None,
+    seed_lookback: Optional[timedelta] = None,
+    deltas: bool = False,
+) -> PartitionResult:
+    """Analyse ``partition`` with the worker's pool and store its results (worker entry point)."""
+
+    results = list(analyse_partition(_worker_pool, partition, seed_lookback, deltas))
+    if output_dir:
+        write_partition_npz(npz_path(output_dir, partition), results)
+    else:
+        write_partition_rows(_worker_pool, partition, [_result_row(*result) for result in results])
+    return PartitionResult(partition, len(results))
+
+
+def recompute(
+    partitions: List[Partition],
+    sqlite: Optional[str] = None,
+    db_params: Optional[Dict[str, Any]] = None,
+    output_dir: Optional[str] = None,
+    workers: Optional[int] = None,
+    seed_lookback: Optional[timedelta] = timedelta(days=4),
+    restart: bool = False,
+    deltas: bool = False,
+) -> List[PartitionResult]:
+    """Recompute ``partitions`` in parallel and return their results in partition order.
+
+    Partitions already checkpointed are skipped unless ``restart`` is set.
+    The default ``seed_lookback`` reaches the previous session across a long
+    weekend.  ``deltas`` reads the delta-encoded archive (``spx_options_deltas``).
+    """
+
+    connection_pool = _open_pool(sqlite, db_params)
+    try:
+        if sqlite:
+            # WAL lets a worker commit its results while others are still reading
+            conn = connection_pool.getconn()
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+            finally:
+                connection_pool.putconn(conn)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+            done = [not restart and os.path.exists(npz_path(output_dir, p)) for p in partitions]
+        else:
+            ensure_result_schema(connection_pool)
+            if restart and partitions:
+                clear_results(connection_pool, partitions[0].start, partitions[-1].end, partitions[0].symbol)
+            done = completed_partitions(connection_pool, partitions)
+    finally:
+        connection_pool.closeall()
+
+    results = [PartitionResult(p, skipped=True) for p in partitions]
+    pending = [index for index, skip in enumerate(done) if not skip]
+    if not pending:
+        return results
+    with ProcessPoolExecutor(
+        max_workers=min(workers or os.cpu_count() or 1, len(pending)),
+        initializer=_init_worker,
+        initargs=(sqlite, db_params),
+    ) as executor:
+        futures = [executor.submit(recompute_partition, partitions[i], output_dir, seed_lookback, deltas) for i in pending]
+        # Collected in submission order so progress is reported deterministically
+        for index, future in zip(pending, futures):
+            results[index] = future.result()
+            print(f"{partitions[index].name}: {results[index].snapshots} snapshots")
+    return results
+
+
+def _parse_timestamp(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Recompute gamma exposure over the stored snapshot archive.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--db", action="store_true", help="read snapshots from PostgreSQL (DEFAULT_DB_PARAMS)")
+    source.add_argument("--sqlite", help="read snapshots from this SQLite file")
+    parser.add_argument("--deltas", action="store_true", help="read the delta-encoded table (spx_options_deltas)")
+    parser.add_argument("--symbol", help="recompute only chains of this underlying (e.g. $SPX)")
+    parser.add_argument("--start", type=_parse_timestamp, help="first fetched_at (ISO 8601); default: start of archive")
+    parser.add_argument("--end", type=_parse_timestamp, help="end of the range, exclusive; default: end of archive")
+    parser.add_argument("--partition-hours", type=float, default=24.0, help="partition width in hours (default: a day)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--output-dir", help="write one NPZ file per partition here instead of the derived table")
+    parser.add_argument("--restart", action="store_true", help="ignore checkpoints and recompute the whole range")
+    parser.add_argument(
+        "--seed-lookback-hours", type=float, default=96.0,
+        help="how far before a partition to look for the snapshot its first changes are measured against",
+    )
+    return parser
+
+
+def main(argv=None) -> List[PartitionResult]:
+    args = _build_parser().parse_args(argv)
+    start, end = args.start, args.end
+    if start is None or end is None:
+        connection_pool = _open_pool(args.sqlite, None)
+        try:
+            bounds = archive_bounds(connection_pool, args.deltas)
+        finally:
+            connection_pool.closeall()
+        if bounds is None:
+            print("The archive is empty.")
+            return []
+        start = start or bounds[0]
+        end = end or bounds[1] + _RESOLUTION
+
+    partitions = partition_range(start, end, timedelta(hours=args.partition_hours), args.symbol)
+    results = recompute(
+        partitions,
+        sqlite=args.sqlite,
+        output_dir=args.output_dir,
+        workers=args.workers,
+        seed_lookback=timedelta(hours=args.seed_lookback_hours),
+        restart=args.restart,
+        deltas=args.deltas,
+    )
+    computed = [result for result in results if not result.skipped]
+    print(
+        f"Recomputed {sum(result.snapshots for result in computed)} snapshots in {len(computed)} partitions "
+        f"({len(results) - len(computed)} already done)."
+    )
+    return results
+
+
+if __name__ == "__main__":
+    main()
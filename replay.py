@@ -0,0 +1,217 @@
+"""Offline replay of recorded option chain snapshots.
+
+Recorded snapshots are streamed in ``fetched_at`` order through the same
+:class:`pipeline.GammaExposurePipeline` used by the live scheduler, either as
+fast as possible or at a chosen multiple of real time.  No broker client or
+network access is needed, so a whole session can be re-run in seconds to
+check analysis changes or to produce a reproducible performance workload.
+
+Examples
+--------
+Replay the stored table headlessly, writing a frame every 100 snapshots::
+
+    python replay.py --db --headless --frames-dir frames --frame-every 100
+
+Export a day to a local dump and replay it at 60x real time::
+
+    python replay.py --db --start 2024-05-08T13:30:00+00:00 --export may8.jsonl
+    python replay.py --file may8.jsonl --speed 60
+"""
+
+import argparse
+import json
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from pipeline import GammaExposurePipeline
+
+Snapshot = Tuple[datetime, Dict]
+
+
+def iter_snapshots_from_file(path: str) -> Iterator[Snapshot]:
+    """Yield snapshots from a JSON Lines dump written by :func:`dump_snapshots`.
+
+    Each line holds ``{"fetched_at": <ISO 8601>, "data": <option chain>}``.
+    Lines are yielded in file order, which is ``fetched_at`` order for dumps
+    produced by this module.
+    """
+
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield datetime.fromisoformat(record["fetched_at"]), record["data"]
+
+
+def dump_snapshots(snapshots: Iterable[Snapshot], path: str) -> int:
+    """Write ``snapshots`` to a JSON Lines dump and return the number written."""
+
+    count = 0
+    with open(path, "w", encoding="utf-8") as handle:
+        for fetched_at, data in snapshots:
+            handle.write(json.dumps({"fetched_at": fetched_at.isoformat(), "data": data}))
+            handle.write("\n")
+            count += 1
+    return count
+
+
+@dataclass
+class ReplaySummary:
+    snapshots: int = 0
+    wall_seconds: float = 0.0
+    recorded_seconds: float = 0.0
+
+    @property
+    def seconds_per_snapshot(self) -> float:
+        return self.wall_seconds / self.snapshots if self.snapshots else 0.0
+
+
+class SnapshotReplayer:
+    """Drive a pipeline from recorded snapshots.
+
+    Parameters
+    ----------
+    pipeline:
+        The :class:`GammaExposurePipeline` receiving each snapshot.
+    speed:
+        ``None`` replays as fast as possible; otherwise recorded time is
+        compressed by this factor (``60`` plays an hour in a minute).
+    on_snapshot:
+        Optional callback invoked with ``(index, fetched_at, result)`` after
+        each snapshot, e.g. to save frames.
+    """
+
+    def __init__(
+        self,
+        pipeline: GammaExposurePipeline,
+        speed: Optional[float] = None,
+        on_snapshot: Optional[Callable] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be positive")
+        self.pipeline = pipeline
+        self.speed = speed
+        self.on_snapshot = on_snapshot
+        self.clock = clock
+        self.sleep = sleep
+
+    def run(self, snapshots: Iterable[Snapshot]) -> ReplaySummary:
+        summary = ReplaySummary()
+        started = self.clock()
+        first_fetch: Optional[datetime] = None
+
+        for fetched_at, data in snapshots:
+            if first_fetch is None:
+                first_fetch = fetched_at
+            recorded = (fetched_at - first_fetch).total_seconds()
+            if self.speed is not None:
+                # Schedule against the replay start rather than the previous
+                # snapshot so processing time does not accumulate as drift.
+                delay = started + recorded / self.speed - self.clock()
+                if delay > 0:
+                    self.sleep(delay)
+
+            result = self.pipeline.process(data, fetched_at)
+            if self.on_snapshot is not None:
+                self.on_snapshot(summary.snapshots, fetched_at, result)
+            summary.snapshots += 1
+            summary.recorded_seconds = recorded
+
+        summary.wall_seconds = self.clock() - started
+        return summary
+
+
+def _parse_timestamp(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Replay recorded option chain snapshots.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="JSON Lines dump produced with --export")
+    source.add_argument("--db", action="store_true", help="read snapshots from the database")
+    parser.add_argument("--sqlite", help="read from this SQLite file instead of PostgreSQL")
+    parser.add_argument("--deltas", action="store_true", help="read the delta-encoded table (spx_options_deltas)")
+    parser.add_argument("--symbol", help="replay only chains of this underlying (e.g. $SPX)")
+    parser.add_argument("--start", type=_parse_timestamp, help="first fetched_at to replay (ISO 8601)")
+    parser.add_argument("--end", type=_parse_timestamp, help="last fetched_at to replay (ISO 8601)")
+    parser.add_argument("--speed", type=float, help="real-time multiple; omit to replay as fast as possible")
+    parser.add_argument("--export", help="write the selected snapshots to a JSON Lines dump and exit")
+    parser.add_argument("--headless", action="store_true", help="render with the non-interactive Agg backend")
+    parser.add_argument("--render-mode", choices=("retained", "redraw"), default="retained")
+    parser.add_argument("--no-plot", action="store_true", help="run the analysis only")
+    parser.add_argument("--frames-dir", help="save a PNG frame to this directory (implies rendering)")
+    parser.add_argument("--frame-every", type=int, default=1, help="save one frame every N snapshots")
+    return parser
+
+
+def _open_source(args) -> Iterator[Snapshot]:
+    if args.file:
+        snapshots = iter_snapshots_from_file(args.file)
+        if args.start or args.end or args.symbol:
+            snapshots = (
+                (fetched_at, data)
+                for fetched_at, data in snapshots
+                if (args.start is None or fetched_at >= args.start)
+                and (args.end is None or fetched_at <= args.end)
+                and (args.symbol is None or data.get("symbol") == args.symbol)
+            )
+        return snapshots
+
+    import db_storage
+
+    if args.sqlite:
+        connection_pool = db_storage.SQLiteConnectionPool(args.sqlite)
+    else:
+        connection_pool = db_storage.create_connection_pool(db_storage.DEFAULT_DB_PARAMS)
+    if args.deltas:
+        start = args.start or datetime.min.replace(tzinfo=timezone.utc)
+        end = args.end or datetime.max.replace(tzinfo=timezone.utc)
+        return db_storage.iter_delta_snapshots(connection_pool, start, end, symbol=args.symbol)
+    return db_storage.iter_raw_snapshots(connection_pool, args.start, args.end, symbol=args.symbol)
+
+
+def main(argv=None) -> ReplaySummary:
+    args = _build_parser().parse_args(argv)
+    snapshots = _open_source(args)
+
+    if args.export:
+        count = dump_snapshots(snapshots, args.export)
+        print(f"Exported {count} snapshots to {args.export}.")
+        return ReplaySummary(snapshots=count)
+
+    plotter = None
+    on_snapshot = None
+    if not args.no_plot or args.frames_dir:
+        if args.headless or args.frames_dir:
+            import matplotlib
+
+            matplotlib.use("Agg")
+        from plotter import create_plotter
+
+        plotter = create_plotter(args.render_mode)
+        if args.frames_dir:
+            os.makedirs(args.frames_dir, exist_ok=True)
+
+            def on_snapshot(index, fetched_at, result):
+                if index % args.frame_every == 0:
+                    plotter.fig.savefig(os.path.join(args.frames_dir, f"frame_{index:06d}.png"))
+
+    pipeline = GammaExposurePipeline(plotter, show=not (args.headless or args.frames_dir))
+    summary = SnapshotReplayer(pipeline, speed=args.speed, on_snapshot=on_snapshot).run(snapshots)
+    print(
+        f"Replayed {summary.snapshots} snapshots covering {summary.recorded_seconds:.0f}s "
+        f"in {summary.wall_seconds:.2f}s ({summary.seconds_per_snapshot * 1000:.1f} ms/snapshot)."
+    )
+    return summary
+
+
+if __name__ == "__main__":
+    main()
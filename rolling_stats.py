@@ -0,0 +1,141 @@
+"""Constant-time rolling statistics over a sliding window."""
+
+import math
+from datetime import datetime
+from typing import Tuple
+
+import numpy as np
+
+from timeseries import TimeSeriesStore
+
+
+class RollingWindowStats:
+    """Mean and population standard deviation over the last ``window`` values.
+
+    Uses Welford's update with sliding-window removal, so each :meth:`push` is
+    O(1) regardless of the window size.  The running moments are recomputed
+    exactly once per ``window`` evictions to keep floating point drift bounded
+    (amortized O(1)).
+
+    :meth:`record` appends the current mean and standard deviation to a
+    bounded :class:`timeseries.TimeSeriesStore` for plotting.
+    """
+
+    def __init__(
+        self,
+        window: int,
+        history_capacity: int = 20000,
+        downsample_factor: int = 1,
+        archive_capacity: int = 0,
+    ):
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.window = window
+        self._values = np.zeros(window, dtype=np.float64)
+        self._count = 0
+        self._next = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._evictions = 0
+
+        self.history_store = TimeSeriesStore(
+            ("mean", "std"), history_capacity, downsample_factor, archive_capacity
+        )
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def mean(self) -> float:
+        return self._mean if self._count else math.nan
+
+    @property
+    def variance(self) -> float:
+        return max(self._m2, 0.0) / self._count if self._count else math.nan
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def push(self, value: float) -> None:
+        value = float(value)
+        if self._count < self.window:
+            self._count += 1
+            delta = value - self._mean
+            self._mean += delta / self._count
+            self._m2 += delta * (value - self._mean)
+        else:
+            evicted = self._values[self._next]
+            previous_mean = self._mean
+            self._mean += (value - evicted) / self._count
+            self._m2 += (value - evicted) * (value - self._mean + evicted - previous_mean)
+            self._evictions += 1
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self.window
+
+        if self._evictions >= self.window:
+            self._resync()
+
+    def _resync(self) -> None:
+        values = self._values[:self._count]
+        self._mean = float(values.mean())
+        self._m2 = float(((values - self._mean) ** 2).sum())
+        self._evictions = 0
+
+    def values(self) -> np.ndarray:
+        """Return the values currently in the window, oldest first (copy)."""
+
+        if self._count < self.window:
+            return self._values[:self._count].copy()
+        return np.roll(self._values, -self._next)
+
+    def extend(self, values, record_times=None, record_counts=None) -> None:
+        """Push ``values`` in order, recording the statistics along the way.
+
+        Equivalent to calling :meth:`push` for each value and :meth:`record`
+        at ``record_times[i]`` once the first ``record_counts[i]`` values are
+        in (skipping records while the window is still empty), but the
+        recorded history is computed from cumulative sums in one pass.
+        """
+
+        values = np.asarray(values, dtype=np.float64)
+        window = self.values()
+        if record_times is not None and len(record_times):
+            sequence = np.concatenate((window, values))
+            # Values relative to a reference point keep the cumulative sums well conditioned
+            reference = sequence[0] if len(sequence) else 0.0
+            centred = sequence - reference
+            sums = np.concatenate(([0.0], np.cumsum(centred)))
+            squares = np.concatenate(([0.0], np.cumsum(centred * centred)))
+            ends = len(window) + np.asarray(record_counts, dtype=np.int64)
+            recorded = ends > 0
+            ends = ends[recorded]
+            sizes = np.minimum(ends, self.window)
+            means = (sums[ends] - sums[ends - sizes]) / sizes
+            variances = (squares[ends] - squares[ends - sizes]) / sizes - means * means
+            self.history_store.extend(
+                np.asarray(record_times)[recorded], means + reference, np.sqrt(np.maximum(variances, 0.0))
+            )
+
+        # Only the last ``window`` values remain in the window
+        kept = np.concatenate((window, values))[-self.window:]
+        self._count = self._next = 0
+        self._mean = self._m2 = 0.0
+        self._evictions = 0
+        for value in kept:
+            self.push(value)
+
+    def record(self, timestamp: datetime) -> None:
+        """Append the current mean and standard deviation to the history."""
+
+        self.history_store.append(timestamp, self.mean, self.std)
+
+    def history(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return ``(times, means, stds)`` of the recorded history.
+
+        These are zero-copy views unless older, decimated history is retained.
+        """
+
+        times, means = self.history_store.series("mean")
+        _, stds = self.history_store.series("std")
+        return times, means, stds
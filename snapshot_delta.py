@@ -0,0 +1,141 @@
+"""Delta encoding of consecutive option chain snapshots.
+
+Consecutive chains fetched a few seconds apart are mostly identical, so only
+the first snapshot of every ``keyframe_interval`` is stored in full.  Every
+other snapshot is stored as a delta against its predecessor containing just
+the values that changed; for option chains that means the per-strike contract
+lists whose gamma, volume, price or other fields moved.
+
+Deltas are plain JSON-compatible dictionaries::
+
+    {"set": {key: value}, "sub": {key: delta}, "del": [key], "order": [key]}
+
+``set`` replaces leaf values (or adds new keys), ``sub`` recurses into nested
+dictionaries, ``del`` removes keys and ``order`` restores the key order when
+it cannot be inferred.  Type changes are treated as changes (``1`` versus
+``1.0``) so that ``json.dumps`` of a reconstructed snapshot matches the
+original byte for byte.
+"""
+
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+def _same(old: Any, new: Any) -> bool:
+    """Return ``True`` when ``old`` and ``new`` serialize identically (``NaN`` included)."""
+
+    if type(old) is not type(new):
+        return False
+    if isinstance(new, dict):
+        return list(old) == list(new) and all(_same(old[key], new[key]) for key in new)
+    if isinstance(new, list):
+        return len(old) == len(new) and all(_same(a, b) for a, b in zip(old, new))
+    if isinstance(new, float) and new != new:
+        return old != old
+    return old == new
+
+
+def diff_snapshot(old: Dict, new: Dict) -> Dict:
+    """Return the delta transforming ``old`` into ``new`` (empty if identical)."""
+
+    replaced: Dict[str, Any] = {}
+    nested: Dict[str, Dict] = {}
+    for key, value in new.items():
+        if key not in old:
+            replaced[key] = value
+            continue
+        previous = old[key]
+        if isinstance(value, dict) and isinstance(previous, dict):
+            child = diff_snapshot(previous, value)
+            if child:
+                nested[key] = child
+        elif not _same(previous, value):
+            replaced[key] = value
+
+    delta: Dict[str, Any] = {}
+    if replaced:
+        delta["set"] = replaced
+    if nested:
+        delta["sub"] = nested
+    removed = [key for key in old if key not in new]
+    if removed:
+        delta["del"] = removed
+    inferred_order = [key for key in old if key in new] + [key for key in new if key not in old]
+    if inferred_order != list(new):
+        delta["order"] = list(new)
+    return delta
+
+
+def apply_delta(base: Dict, delta: Dict) -> Dict:
+    """Return a new snapshot equal to ``base`` with ``delta`` applied.
+
+    ``base`` is not modified; unchanged nested values are shared with it.
+    """
+
+    result = dict(base)
+    for key in delta.get("del", ()):
+        result.pop(key, None)
+    for key, child in delta.get("sub", {}).items():
+        result[key] = apply_delta(result.get(key, {}), child)
+    result.update(delta.get("set", {}))
+    order = delta.get("order")
+    if order is not None:
+        result = {key: result[key] for key in order}
+    return result
+
+
+def count_changed_values(delta: Dict) -> int:
+    """Return the number of leaf values replaced, added or removed by ``delta``."""
+
+    return (
+        len(delta.get("set", ()))
+        + len(delta.get("del", ()))
+        + sum(count_changed_values(child) for child in delta.get("sub", {}).values())
+    )
+
+
+def reconstruct(records: Iterable[Tuple[bool, Dict]]) -> Optional[Dict]:
+    """Replay ``(is_keyframe, payload)`` records and return the final snapshot.
+
+    The first record must be a keyframe; later keyframes restart the chain.
+    """
+
+    snapshot: Optional[Dict] = None
+    for is_keyframe, payload in records:
+        if is_keyframe:
+            snapshot = payload
+        elif snapshot is None:
+            raise ValueError("Delta record encountered before any keyframe")
+        else:
+            snapshot = apply_delta(snapshot, payload)
+    return snapshot
+
+
+class SnapshotDeltaEncoder:
+    """Turn a stream of snapshots into keyframes and deltas.
+
+    A keyframe is emitted for the first snapshot, every ``keyframe_interval``
+    snapshots thereafter, and after :meth:`reset` (for example when a stored
+    record was lost and the delta chain would otherwise be broken).
+    """
+
+    def __init__(self, keyframe_interval: int = 60):
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be at least 1")
+        self.keyframe_interval = keyframe_interval
+        self._previous: Optional[Dict] = None
+        self._since_keyframe = 0
+
+    def reset(self) -> None:
+        self._previous = None
+        self._since_keyframe = 0
+
+    def encode(self, snapshot: Dict) -> Tuple[bool, Dict]:
+        """Return ``(is_keyframe, payload)`` for the next snapshot in the stream."""
+
+        previous = self._previous
+        self._previous = snapshot
+        if previous is None or self._since_keyframe + 1 >= self.keyframe_interval:
+            self._since_keyframe = 0
+            return True, snapshot
+        self._since_keyframe += 1
+        return False, diff_snapshot(previous, snapshot)
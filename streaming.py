@@ -0,0 +1,504 @@
+"""Streaming ingestion of level-one option quotes.
+
+Instead of downloading the full chain on every poll, :class:`StreamingChainIngestor`
+fetches each watchlist chain once over REST, subscribes to level-one quotes
+for its contracts and applies the streamed field updates to an in-memory
+:class:`LiveOptionChain`.  Only strikes whose gamma or volume changed are
+re-aggregated, and the chains are periodically re-fetched over REST to
+correct any drift (missed messages, contracts listed after subscribing).
+
+Quotes come from the broker's ``StreamClient`` (:class:`BrokerQuoteStream`)
+or, for local testing, from a websocket stand-in server that replays a
+recorded tick file (:func:`serve_recorded_ticks`, :class:`WebsocketQuoteStream`).
+
+Examples
+--------
+Turn a replay dump into a tick recording and serve it::
+
+    python streaming.py record --dump session.jsonl --out ticks.jsonl
+    python streaming.py serve --ticks ticks.jsonl --port 8765 --speed 10
+
+then run the scheduler with ``INGEST_MODE=stream QUOTE_STREAM_URL=ws://127.0.0.1:8765``.
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import pytz
+
+from chain_parser import ChainPayload
+from gamma_analysis import StrikeExposure, gamma_exposure_scale
+from incremental_gamma import StrikeWeightUpdate
+from watchlist import ConcurrentChainFetcher
+
+# Level-one option fields (as labelled by the schwab-py/tda-api stream
+# clients) mapped to the contract keys of the REST option chain.
+LEVEL_ONE_FIELDS = {
+    "BID_PRICE": "bid",
+    "ASK_PRICE": "ask",
+    "LAST_PRICE": "last",
+    "MARK": "mark",
+    "TOTAL_VOLUME": "totalVolume",
+    "OPEN_INTEREST": "openInterest",
+    "VOLATILITY": "volatility",
+    "DELTA": "delta",
+    "GAMMA": "gamma",
+    "THETA": "theta",
+    "VEGA": "vega",
+    "RHO": "rho",
+}
+
+# Contract fields that feed gamma exposure; updates to other fields do not
+# require re-aggregating the strike.
+EXPOSURE_FIELDS = frozenset(("gamma", "totalVolume"))
+
+
+class LiveOptionChain:
+    """An option chain kept current by streamed quote updates.
+
+    Per-strike ``sign * gamma * volume`` sums are cached so an update only
+    re-aggregates the strikes it touches; exposure for every strike is then
+    the cached sum times :func:`gamma_analysis.gamma_exposure_scale`.
+    :meth:`take_update` hands the strikes changed since the previous call to
+    an :class:`incremental_gamma.IncrementalGammaAggregator`.
+    """
+
+    def __init__(self, data: Dict):
+        self.data: Dict = {}
+        self._weights: Dict[float, float] = {}
+        self.reset(data)
+
+    def reset(self, data: Dict) -> float:
+        """Replace the chain with a REST snapshot; return the largest per-strike drift ($Bn)."""
+
+        previous = self.exposure().per_strike_gamma_exposure if self.data else {}
+        self.data = data
+        self.spot_price = data.get("underlyingPrice", 0)
+        self._contracts: Dict[str, Tuple[float, Dict]] = {}
+        self._by_strike: Dict[float, List[Tuple[int, Dict]]] = {}
+        for map_name, sign in (("callExpDateMap", 1), ("putExpDateMap", -1)):
+            for strike_map in data.get(map_name, {}).values():
+                for strike, options in strike_map.items():
+                    try:
+                        strike_value = float(strike)
+                    except (TypeError, ValueError):
+                        continue
+                    if not math.isfinite(strike_value):
+                        continue
+                    bucket = self._by_strike.setdefault(strike_value, [])
+                    for option in options:
+                        bucket.append((sign, option))
+                        symbol = option.get("symbol")
+                        if symbol:
+                            self._contracts[symbol] = (strike_value, option)
+        self._weights = {}
+        for strike in self._by_strike:
+            weight = self._strike_weight(strike)
+            if weight is not None:
+                self._weights[strike] = weight
+        self._pending: Set[float] = set()
+        self._reset_pending = True
+
+        current = self.exposure().per_strike_gamma_exposure
+        return max(
+            (abs(current.get(strike, 0.0) - previous.get(strike, 0.0)) for strike in current.keys() | previous.keys()),
+            default=0.0,
+        )
+
+    def _strike_weight(self, strike: float) -> Optional[float]:
+        """Sum the valid contracts of ``strike``; ``None`` when it has none.
+
+        Contracts are skipped, and strikes left without any omitted, like the
+        invalid rows of a full calculation (``NaN``/infinite gamma or volume).
+        """
+
+        total = None
+        for sign, option in self._by_strike[strike]:
+            try:
+                weight = sign * float(option["gamma"]) * float(option["totalVolume"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if math.isfinite(weight):
+                total = weight if total is None else total + weight
+        return total
+
+    def symbols(self) -> List[str]:
+        return list(self._contracts)
+
+    def apply(self, quotes: Iterable[Dict]) -> Set[float]:
+        """Apply level-one quote updates; return the strikes whose exposure inputs changed."""
+
+        touched: Set[float] = set()
+        for quote in quotes:
+            if "UNDERLYING_PRICE" in quote:
+                self.spot_price = self.data["underlyingPrice"] = quote["UNDERLYING_PRICE"]
+            entry = self._contracts.get(quote.get("key"))
+            if entry is None:
+                continue
+            strike, option = entry
+            for field, value in quote.items():
+                name = LEVEL_ONE_FIELDS.get(field)
+                if name is None:
+                    continue
+                option[name] = value
+                if name in EXPOSURE_FIELDS:
+                    touched.add(strike)
+        for strike in touched:
+            weight = self._strike_weight(strike)
+            if weight is None:
+                self._weights.pop(strike, None)
+            else:
+                self._weights[strike] = weight
+        self._pending |= touched
+        return touched
+
+    def take_update(self) -> StrikeWeightUpdate:
+        """Return the strike weights changed since the last call (all of them after a reset)."""
+
+        if self._reset_pending:
+            update = StrikeWeightUpdate(dict(self._weights), self.spot_price, reset=True)
+        else:
+            update = StrikeWeightUpdate(
+                {strike: self._weights[strike] for strike in self._pending if strike in self._weights},
+                self.spot_price,
+                tuple(strike for strike in self._pending if strike not in self._weights),
+            )
+        self._pending = set()
+        self._reset_pending = False
+        return update
+
+    def exposure(self) -> StrikeExposure:
+        try:
+            scale = gamma_exposure_scale(float(self.spot_price))
+        except (TypeError, ValueError):
+            scale = 0.0
+        return StrikeExposure(
+            {strike: weight * scale for strike, weight in self._weights.items()},
+            self.spot_price,
+        )
+
+
+class BrokerQuoteStream:
+    """Level-one option quotes from a schwab-py or tda-api ``StreamClient``."""
+
+    def __init__(self, client, streaming_module, account_id: Optional[int] = None):
+        self.client = client
+        self.streaming_module = streaming_module
+        self.account_id = account_id
+        self._stream = None
+        self._pending: List[Dict] = []
+
+    async def connect(self) -> None:
+        self._stream = self.streaming_module.StreamClient(self.client, account_id=self.account_id)
+        await self._stream.login()
+        self._stream.add_level_one_option_handler(lambda message: self._pending.extend(message.get("content", [])))
+
+    async def subscribe(self, symbols: List[str]) -> None:
+        # SUBS replaces the previous subscription set
+        await self._stream.level_one_option_subs(symbols)
+
+    async def receive(self) -> List[Dict]:
+        while not self._pending:
+            await self._stream.handle_message()
+        quotes, self._pending = self._pending, []
+        return quotes
+
+    async def close(self) -> None:
+        if self._stream is not None:
+            await self._stream.logout()
+
+
+class WebsocketQuoteStream:
+    """Level-one option quotes from a websocket stand-in (see :func:`serve_recorded_ticks`)."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._socket = None
+
+    async def connect(self) -> None:
+        import websockets
+
+        self._socket = await websockets.connect(self.url, max_size=None)
+
+    async def subscribe(self, symbols: List[str]) -> None:
+        await self._socket.send(json.dumps({"service": "LEVELONE_OPTIONS", "command": "SUBS", "keys": symbols}))
+
+    async def receive(self) -> List[Dict]:
+        message = json.loads(await self._socket.recv())
+        return message.get("content", [])
+
+    async def close(self) -> None:
+        if self._socket is not None:
+            await self._socket.close()
+
+
+class StreamingChainIngestor:
+    """Maintain watchlist chains from streamed quotes on a background event loop.
+
+    Parameters
+    ----------
+    fetcher:
+        Fetches the REST snapshots used to seed and resync every chain.
+    stream:
+        A quote stream (:class:`BrokerQuoteStream` or :class:`WebsocketQuoteStream`).
+    resync_interval:
+        Seconds between REST resyncs.
+    on_snapshot:
+        Called with ``(data, fetched_at)`` for every REST snapshot, e.g.
+        ``SnapshotWriter.submit`` so resyncs are stored.
+    reconnect_delay:
+        Seconds to wait before reconnecting after the stream fails.
+    """
+
+    def __init__(
+        self,
+        fetcher: ConcurrentChainFetcher,
+        stream,
+        resync_interval: float = 300.0,
+        on_snapshot: Optional[Callable[[Dict, datetime], None]] = None,
+        reconnect_delay: float = 5.0,
+        timezone: str = "US/Eastern",
+    ):
+        self.fetcher = fetcher
+        self.stream = stream
+        self.resync_interval = resync_interval
+        self.on_snapshot = on_snapshot
+        self.reconnect_delay = reconnect_delay
+        self.timezone = pytz.timezone(timezone)
+        self.chains: Dict[str, LiveOptionChain] = {}
+        self._routes: Dict[str, List[str]] = {}
+        self._dirty: Set[str] = set()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self.quotes = 0
+        self.strike_updates = 0
+        self.resyncs = 0
+
+    async def resync(self) -> None:
+        """Re-fetch every chain over REST and resubscribe to its contracts."""
+
+        results = await self.fetcher.fetch_all_async()
+        with self._lock:
+            for job, data, fetched_at in results:
+                if data is None:
+                    continue
+                # The live chain is mutated by quotes; storage keeps the original.
+                # Decoding the response again is cheaper than a deep copy.
+                live = data.decode() if isinstance(data, ChainPayload) else copy.deepcopy(data)
+                chain = self.chains.get(job.key)
+                if chain is None:
+                    self.chains[job.key] = LiveOptionChain(live)
+                else:
+                    drift = chain.reset(live)
+                    print(f"Resynced {job.key}; largest streamed drift {drift:.6f}")
+                self._dirty.add(job.key)
+                if self.on_snapshot is not None:
+                    self.on_snapshot(data, fetched_at)
+            routes: Dict[str, List[str]] = {}
+            for key, chain in self.chains.items():
+                for symbol in chain.symbols():
+                    routes.setdefault(symbol, []).append(key)
+            self._routes = routes
+        self.resyncs += 1
+        self._ready.set()
+        await self.stream.subscribe(sorted(routes))
+
+    def apply(self, quotes: List[Dict]) -> None:
+        """Route quote updates to the chains holding each contract."""
+
+        by_chain: Dict[str, List[Dict]] = {}
+        with self._lock:
+            for quote in quotes:
+                for key in self._routes.get(quote.get("key"), ()):
+                    by_chain.setdefault(key, []).append(quote)
+            for key, chain_quotes in by_chain.items():
+                touched = self.chains[key].apply(chain_quotes)
+                if touched or any("UNDERLYING_PRICE" in quote for quote in chain_quotes):
+                    self._dirty.add(key)
+                self.strike_updates += len(touched)
+        self.quotes += len(quotes)
+
+    def poll(self) -> Optional[List[Tuple[str, StrikeWeightUpdate, datetime]]]:
+        """Return ``(key, update, timestamp)`` for chains updated since the last call."""
+
+        now = datetime.now(self.timezone)
+        with self._lock:
+            updates = [(key, self.chains[key].take_update(), now) for key in self._dirty]
+            self._dirty.clear()
+        return updates or None
+
+    async def _resync_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.resync_interval)
+            try:
+                await self.resync()
+            except Exception as e:
+                print(f"An error occurred during REST resync: {e}")
+
+    async def _stream_loop(self) -> None:
+        while True:
+            try:
+                await self.stream.connect()
+                await self.resync()
+                while True:
+                    self.apply(await self.stream.receive())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Quote stream failed: {e}; reconnecting in {self.reconnect_delay}s")
+                try:
+                    await self.stream.close()
+                except Exception:
+                    pass
+                await asyncio.sleep(self.reconnect_delay)
+
+    async def run_async(self) -> None:
+        resync_task = asyncio.ensure_future(self._resync_loop())
+        try:
+            await self._stream_loop()
+        finally:
+            resync_task.cancel()
+            try:
+                await self.stream.close()
+            except Exception:
+                pass
+
+    def _run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._task = self._loop.create_task(self.run_async())
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    def start(self, wait: Optional[float] = None) -> "StreamingChainIngestor":
+        """Start ingestion on a background thread; optionally wait for the first REST snapshot."""
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="quote-stream", daemon=True)
+            self._thread.start()
+        if wait:
+            self._ready.wait(wait)
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        if self._loop is not None and self._task is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._task.cancel)
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+
+def ticks_from_snapshots(snapshots: Iterable[Tuple[datetime, Dict]]) -> Iterator[Dict]:
+    """Derive a tick recording from consecutive REST snapshots.
+
+    Yields ``{"offset": seconds, "content": [quote, ...]}`` records holding,
+    for every snapshot after the first, the level-one fields that changed.
+    """
+
+    contract_fields = {name: field for field, name in LEVEL_ONE_FIELDS.items()}
+    previous: Dict[str, Dict] = {}
+    previous_spot = None
+    first: Optional[datetime] = None
+    for fetched_at, data in snapshots:
+        first = first or fetched_at
+        content = []
+        spot = data.get("underlyingPrice")
+        current: Dict[str, Dict] = {}
+        for map_name in ("callExpDateMap", "putExpDateMap"):
+            for strike_map in data.get(map_name, {}).values():
+                for options in strike_map.values():
+                    for option in options:
+                        symbol = option.get("symbol")
+                        if not symbol:
+                            continue
+                        current[symbol] = option
+                        if not previous:
+                            continue
+                        old = previous.get(symbol, {})
+                        quote = {
+                            field: option[name]
+                            for name, field in contract_fields.items()
+                            if name in option and option[name] != old.get(name)
+                        }
+                        if quote:
+                            quote["key"] = symbol
+                            content.append(quote)
+        if previous and spot != previous_spot and current:
+            # Like the broker feed, the underlying price rides on option quotes
+            if not content:
+                content.append({"key": next(iter(current))})
+            content[0]["UNDERLYING_PRICE"] = spot
+        if content:
+            yield {"offset": (fetched_at - first).total_seconds(), "content": content}
+        previous, previous_spot = current, spot
+
+
+async def _replay_ticks(websocket, records: List[Dict], speed: float) -> None:
+    request = json.loads(await websocket.recv())
+    keys = set(request.get("keys", []))
+    started = time.monotonic()
+    for record in records:
+        delay = started + record["offset"] / speed - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        content = [quote for quote in record["content"] if quote.get("key") in keys]
+        if content:
+            await websocket.send(json.dumps({"service": "LEVELONE_OPTIONS", "content": content}))
+    await websocket.wait_closed()
+
+
+async def serve_recorded_ticks(path: str, host: str = "127.0.0.1", port: int = 8765, speed: float = 1.0) -> None:
+    """Serve a tick recording to every websocket client that subscribes, until cancelled."""
+
+    import websockets
+
+    with open(path, "r", encoding="utf-8") as handle:
+        records = [json.loads(line) for line in handle if line.strip()]
+    async with websockets.serve(lambda websocket, *_: _replay_ticks(websocket, records, speed), host, port):
+        print(f"Serving {len(records)} tick records on ws://{host}:{port}")
+        await asyncio.Future()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Record or serve level-one option tick recordings.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="derive a tick recording from a replay dump")
+    record.add_argument("--dump", required=True, help="JSON Lines dump written by replay.py --export")
+    record.add_argument("--out", required=True)
+    serve = commands.add_parser("serve", help="serve a tick recording over a websocket")
+    serve.add_argument("--ticks", required=True)
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--speed", type=float, default=1.0, help="real-time multiple")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        from replay import iter_snapshots_from_file
+
+        count = 0
+        with open(args.out, "w", encoding="utf-8") as handle:
+            for record in ticks_from_snapshots(iter_snapshots_from_file(args.dump)):
+                handle.write(json.dumps(record))
+                handle.write("\n")
+                count += 1
+        print(f"Wrote {count} tick records to {args.out}.")
+    else:
+        asyncio.run(serve_recorded_ticks(args.ticks, args.host, args.port, args.speed))
+
+
+if __name__ == "__main__":
+    main()
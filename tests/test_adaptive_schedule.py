@@ -0,0 +1,116 @@
+"""AdaptivePollClock driven on a simulated clock."""
+
+import datetime
+import random
+from types import SimpleNamespace
+
+import pytz
+
+from adaptive_schedule import AdaptivePollClock, TradingCalendar
+from benchmarks.poll_simulation import SimulatedClock, SimulatedStopEvent
+
+EASTERN = pytz.timezone("US/Eastern")
+
+
+def poll_times(sim, clock, seconds, on_tick=None):
+    """Wall times of the fetches ``clock`` allows within ``seconds`` of simulated time."""
+
+    stop = SimulatedStopEvent(sim, sim.elapsed + seconds)
+    times = []
+    while clock.wait(stop):
+        times.append(sim.now())
+        if on_tick is not None:
+            on_tick(len(times))
+    return times
+
+
+def simulated(start, calendar=None, **kwargs):
+    sim = SimulatedClock(EASTERN.localize(start))
+    clock = AdaptivePollClock(
+        calendar=calendar, clock=sim.monotonic, now=sim.now, rng=random.Random(0), **kwargs
+    )
+    return sim, clock
+
+
+def gaps(times):
+    return [(later - earlier).total_seconds() for earlier, later in zip(times, times[1:])]
+
+
+def frame(spot, exposure=1.0, change=0.0):
+    return SimpleNamespace(
+        spot_price=spot,
+        per_strike_gamma_exposure={5000.0: exposure},
+        change_in_gamma_per_strike={5000.0: change} if change else {},
+    )
+
+
+def test_backoff_never_polls_faster_than_the_interval():
+    sim, clock = simulated(datetime.datetime(2024, 5, 8, 10), interval=5.0, error_backoff=1.0)
+    failing = range(3, 9)
+
+    def on_tick(tick):
+        if tick in failing:
+            clock.failure()
+        else:
+            clock.success()
+
+    times = poll_times(sim, clock, 600, on_tick)
+    spacing = gaps(times)
+    assert min(spacing) >= 5.0 - 1e-9
+    backoffs = spacing[2:8]
+    assert backoffs[-1] > 2 * 5.0  # the backoff grows beyond the interval
+    assert spacing[8:12] == [5.0] * 4  # back to the interval after a success
+
+
+def test_rate_budget_caps_requests():
+    sim, clock = simulated(
+        datetime.datetime(2024, 5, 8, 10),
+        interval=1.0, min_interval=0.1, requests_per_poll=4, rate_limit=2.0, budget=0.5,
+    )
+    spot = [5000.0]
+
+    def on_tick(tick):
+        spot[0] += 20.0  # active every tick, so the interval stays at its minimum
+        clock.observe(frame(spot[0]))
+
+    times = poll_times(sim, clock, 600, on_tick)
+    # 0.25 polls per second plus the initial burst
+    assert len(times) <= 600 * 0.25 + clock.burst_polls + 1
+    assert min(gaps(times[10:])) >= 4.0 - 1e-9
+
+
+def test_activity_tightens_and_quiet_relaxes():
+    sim, clock = simulated(datetime.datetime(2024, 5, 8, 10), interval=5.0, min_interval=1.0, max_interval=30.0)
+    spot = [5000.0]
+    poll_times(sim, clock, 600, lambda tick: clock.observe(frame(spot[0])))
+    assert clock.interval == 30.0
+
+    def active(tick):
+        spot[0] += 10.0
+        clock.observe(frame(spot[0]))
+
+    poll_times(sim, clock, 120, active)
+    assert clock.interval == 1.0
+
+
+def test_sleeps_until_the_open_and_stops_at_the_close():
+    calendar = TradingCalendar()
+    sim, clock = simulated(datetime.datetime(2024, 5, 8, 9, 0), calendar=calendar, interval=5.0)
+    times = poll_times(sim, clock, 8 * 3600)
+    assert times[0] == EASTERN.localize(datetime.datetime(2024, 5, 8, 9, 30))
+    assert times[-1] <= EASTERN.localize(datetime.datetime(2024, 5, 8, 16, 15))
+    assert all(calendar.is_open(time) for time in times)
+
+
+def test_early_close_and_holidays():
+    calendar = TradingCalendar()
+    # Black Friday 2024 closes at 13:15; Thanksgiving before it has no session
+    sim, clock = simulated(datetime.datetime(2024, 11, 28, 9, 0), calendar=calendar, interval=60.0, max_interval=60.0)
+    times = poll_times(sim, clock, 2 * 24 * 3600)
+    assert {time.date() for time in times} == {datetime.date(2024, 11, 29)}
+    assert times[0] == EASTERN.localize(datetime.datetime(2024, 11, 29, 9, 30))
+    assert times[-1] <= EASTERN.localize(datetime.datetime(2024, 11, 29, 13, 15))
+    # Christmas Day, a Wednesday in 2024, is slept through to the next session
+    sim, clock = simulated(datetime.datetime(2024, 12, 25, 9, 0), calendar=calendar, interval=60.0, max_interval=60.0)
+    times = poll_times(sim, clock, 25 * 3600)
+    assert times[0] == EASTERN.localize(datetime.datetime(2024, 12, 26, 9, 30))
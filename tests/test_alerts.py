@@ -0,0 +1,145 @@
+"""Alert rule parsing and evaluation."""
+
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from alerts import AlertEngine, AlertRule, JsonLinesSink, parse_alert_rules
+from pipeline import AnalysisFrame
+
+START = datetime(2024, 5, 8, 10, 30)
+
+
+def frame(tick, changes, total=1.0, spot=5000.0, seconds=5):
+    """Frame ``tick`` with the given per-strike changes; exposure is ten times the change."""
+
+    return AnalysisFrame(
+        START + timedelta(seconds=seconds * tick),
+        total,
+        {strike: 10.0 * change for strike, change in changes.items()},
+        changes,
+        [],
+        spot,
+    )
+
+
+def fired(engine, frames, key=None):
+    """Evaluate ``frames`` in order; return ``(tick, rule, strike)`` of every event."""
+
+    return [(tick, event.rule, event.strike) for tick, data in enumerate(frames) for event in engine.evaluate(data, key)]
+
+
+def test_rules_are_parsed_with_names_ranges_and_absolute_values():
+    rules = parse_alert_rules(" |z|>3, big=|change|>0.5,exposure<-2@5000-5400,total<0,flip,spot>5e3@5100, ")
+    assert rules == [
+        AlertRule("|z|>3", "z", "|>|", 3.0),
+        AlertRule("big", "change", "|>|", 0.5),
+        AlertRule("exposure<-2@5000-5400", "exposure", "<", -2.0, (5000.0, 5400.0)),
+        AlertRule("total<0", "total", "<", 0.0),
+        AlertRule("flip", "total", flip=True),
+        AlertRule("spot>5e3@5100", "spot", ">", 5000.0, (5100.0, 5100.0)),
+    ]
+    assert [rule.kind for rule in rules] == ["zscore", "threshold", "threshold", "threshold", "flip", "threshold"]
+    assert [rule.per_strike for rule in rules] == [True, True, True, False, False, False]
+    assert rules[1].describe() == "|change| > 0.5"
+
+
+@pytest.mark.parametrize("spec", ["|change|<1", "gamma>1", "change>>1", "change", "big=|change>1"])
+def test_invalid_rules_are_rejected(spec):
+    with pytest.raises(ValueError):
+        parse_alert_rules(spec)
+
+
+def test_rules_fire_when_they_become_true():
+    engine = AlertEngine(parse_alert_rules("up=change>1,down=exposure<-5@5000-5005"))
+    frames = [
+        frame(0, {5000.0: 2.0, 5005.0: -1.0, 5010.0: -1.0}),
+        frame(1, {5000.0: 3.0, 5005.0: -1.0, 5010.0: -1.0}),
+        frame(2, {5000.0: 0.0, 5005.0: 0.0, 5010.0: -1.0}),
+        frame(3, {5000.0: 2.0, 5005.0: -1.0, 5015.0: 2.0}),
+    ]
+    assert fired(engine, frames) == [
+        (0, "up", 5000.0),
+        (0, "down", 5005.0),
+        (3, "up", 5000.0),
+        (3, "up", 5015.0),
+        (3, "down", 5005.0),
+    ]
+    event = engine.evaluate(frame(4, {5020.0: 1.5}))[0]
+    assert (event.value, event.threshold, event.timestamp) == (1.5, 1.0, START + timedelta(seconds=20))
+    assert event.message == "GEX up: strike 5020 change +1.5 (change > 1)"
+
+
+def test_cooldown_limits_events_per_rule_and_strike():
+    engine = AlertEngine(parse_alert_rules("up=change>1,low=total<0"), cooldown=10.0)
+    # Both conditions become true every other second
+    frames = [
+        frame(tick, {5000.0: 2.0 * (tick % 2 == 0), 5005.0: 2.0 * (tick == 3)}, total=-1.0 if tick % 2 else 1.0, seconds=1)
+        for tick in range(22)
+    ]
+    assert fired(engine, frames) == [
+        (0, "up", 5000.0),
+        (1, "low", None),
+        (3, "up", 5005.0),
+        (10, "up", 5000.0),
+        (11, "low", None),
+        (20, "up", 5000.0),
+        (21, "low", None),
+    ]
+
+
+def test_zscores_use_each_strikes_own_baseline():
+    engine = AlertEngine(parse_alert_rules("|z|>3"), window=6, min_samples=5)
+    history = [1.0, -1.0, 1.0, -1.0, 1.0]
+    frames = [frame(tick, {5000.0: change, 5005.0: 0.5}) for tick, change in enumerate(history)]
+    # Too few samples for 5010, no spread for 5005
+    frames.append(frame(len(frames), {5000.0: 4.0, 5005.0: 50.0, 5010.0: 100.0}))
+    assert fired(engine, frames[:-1]) == []
+    (event,) = engine.evaluate(frames[-1])
+    assert event.strike == 5000.0
+    assert event.value == pytest.approx((4.0 - np.mean(history)) / np.std(history))
+    assert event.message.startswith("GEX |z|>3: strike 5000 change +4 is +3.9 sd")
+
+    # The outlier joins the baseline, so repeating it scores below 2 sd
+    assert engine.evaluate(frame(len(frames), {5000.0: 4.0})) == []
+
+
+def test_flip_fires_on_every_sign_change_of_the_total():
+    engine = AlertEngine(parse_alert_rules("flip,negative=total<0"))
+    totals = [1.0, 2.0, -1.0, -2.0, 3.0, 0.0, -1.0]
+    events = [event for tick, total in enumerate(totals) for event in engine.evaluate(frame(tick, {}, total=total))]
+    assert [(event.rule, event.value) for event in events] == [
+        ("flip", -1.0),
+        ("negative", -1.0),
+        ("flip", 3.0),
+        ("negative", -1.0),
+    ]
+    assert all(event.strike is None for event in events)
+    assert events[0].threshold == 0.0
+    # Each pipeline keeps its own previous total
+    assert engine.evaluate(frame(9, {}, total=5.0), key="NDX") == []
+    assert [event.rule for event in engine.evaluate(frame(10, {}, total=-5.0), key="NDX")] == ["flip", "negative"]
+
+
+def test_engine_evaluates_queued_frames_on_its_worker(tmp_path):
+    class Failing:
+        def emit(self, events):
+            raise OSError("unreachable")
+
+        def close(self):
+            pass
+
+    path = tmp_path / "alerts.jsonl"
+    engine = AlertEngine(parse_alert_rules("up=change>1"), sinks=[Failing(), JsonLinesSink(str(path))]).start()
+    for tick in range(4):
+        engine.observe(frame(tick, {5000.0: 2.0 * (tick % 2 == 0)}), key="SPX")
+    engine.stop(timeout=10.0)
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(line["key"], line["strike"], line["timestamp"]) for line in lines] == [
+        ("SPX", 5000.0, START.isoformat()),
+        ("SPX", 5000.0, (START + timedelta(seconds=10)).isoformat()),
+    ]
+    assert engine.metrics.counters()["alerts_emitted"] == 2
@@ -0,0 +1,84 @@
+"""Parity of the raw-response decoders with flattening the decoded chain."""
+
+import json
+
+import numpy as np
+import pytest
+
+import chain_parser
+from benchmarks.synthetic import SyntheticChain
+from chain_parser import ChainPayload, parse_chain_arrays
+from gamma_analysis import flatten_option_chain
+
+
+def awkward_chain():
+    """A synthetic chain with the oddities seen in broker responses."""
+
+    data = SyntheticChain(strikes=15, expiries=2, seed=31).snapshot()
+    calls = next(iter(data["callExpDateMap"].values()))
+    puts = next(iter(data["putExpDateMap"].values()))
+    strikes = list(calls)
+    calls[strikes[0]][0]["gamma"] = "NaN"
+    calls[strikes[1]][0]["totalVolume"] = None
+    calls[strikes[2]][0]["gamma"] = -999.0
+    calls[strikes[3]][0]["volatility"] = "NaN"
+    calls[strikes[4]][0]["totalVolume"] = 12
+    puts[strikes[5]][0].pop("openInterest")
+    puts[strikes[6]][0].pop("delta")
+    puts[strikes[7]][0]["gamma"] = "0.0125"
+    calls["not a strike"] = calls[strikes[8]]
+    return data
+
+
+def assert_same_arrays(parsed, expected):
+    assert parsed._fields == expected._fields
+    for name in ("strike", "gamma", "volume", "open_interest", "implied_volatility", "delta", "sign", "expiry"):
+        np.testing.assert_array_equal(getattr(parsed, name), getattr(expected, name), err_msg=name)
+        assert getattr(parsed, name).dtype == getattr(expected, name).dtype, name
+    assert parsed.expiries == expected.expiries
+    assert parsed.spot_price == expected.spot_price
+    assert parsed.symbol == expected.symbol
+
+
+BACKENDS = ["json"]
+if chain_parser.orjson is not None:
+    BACKENDS.append("orjson")
+if chain_parser.msgspec is not None:
+    BACKENDS += ["msgspec", "msgspec-typed"]
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    """Force one decoding path of ``parse_chain_arrays``."""
+
+    name = request.param
+    if name != "msgspec-typed":
+        monkeypatch.setattr(chain_parser, "_chain_decoder", None)
+    if name == "json":
+        monkeypatch.setattr(chain_parser, "loads", json.loads)
+    elif name == "orjson":
+        monkeypatch.setattr(chain_parser, "loads", chain_parser.orjson.loads)
+    elif name == "msgspec":
+        monkeypatch.setattr(chain_parser, "loads", chain_parser.msgspec.json.Decoder().decode)
+    return name
+
+
+@pytest.mark.parametrize("chain", ["synthetic", "awkward"])
+def test_parse_chain_arrays_matches_flatten(backend, chain):
+    data = SyntheticChain(strikes=25, expiries=3, seed=30).snapshot() if chain == "synthetic" else awkward_chain()
+    raw = json.dumps(data).encode()
+    assert_same_arrays(parse_chain_arrays(raw), flatten_option_chain(json.loads(raw)))
+
+
+def test_unexpected_shapes_fall_back_to_the_generic_path(backend):
+    raw = b'{"symbol": "$SPX", "underlyingPrice": 5000, "callExpDateMap": {"2024-05-08:0": {"5000.0": [{"gamma": 0.01, "totalVolume": 3, "extra": [1]}]}}, "putExpDateMap": {"2024-05-08:0": {"5000.0": [{"gamma": {"bad": 1}, "totalVolume": 2}]}}}'
+    assert_same_arrays(parse_chain_arrays(raw), flatten_option_chain(json.loads(raw)))
+
+
+def test_payload_keeps_the_response_bytes():
+    raw = json.dumps(SyntheticChain(strikes=5, seed=32).snapshot()).encode()
+    payload = ChainPayload(raw)
+    assert payload.text == raw.decode()
+    assert payload.data is payload.data
+    assert payload.decode() == payload.data and payload.decode() is not payload.data
+    assert_same_arrays(payload.arrays(), flatten_option_chain(json.loads(raw)))
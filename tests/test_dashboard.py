@@ -0,0 +1,91 @@
+"""Headless rendering and the dashboard HTTP server."""
+
+import json
+import math
+import queue
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+import pytest
+
+from dashboard import HeadlessPlotter, LatestFrame, RenderConfig, render_worker, serve_dashboard
+
+START = datetime(2024, 5, 8, 10, 30)
+
+
+def frames(count):
+    for index in range(count):
+        timestamp = START + timedelta(seconds=index)
+        exposure = {5000.0: 1.5 + index, 5005.0: -0.5}
+        changes = {5000.0: 1.0, 5005.0: 0.0} if index else {}
+        largest = [(5000.0, 1.0, timestamp)] if index else []
+        total = math.nan if index == 1 else 1.0 + index
+        yield timestamp, exposure, changes, largest, total, 5000.0 + index
+
+
+def test_render_worker_writes_the_latest_frame_and_series(tmp_path):
+    pending = queue.Queue()
+    for frame in frames(3):
+        pending.put(frame)
+    pending.put(None)
+    render_worker(pending, RenderConfig(frame_dir=str(tmp_path), frame_rate=1000.0))
+
+    assert (tmp_path / "latest.png").read_bytes().startswith(b"\x89PNG")
+    series = json.loads((tmp_path / "series.json").read_text())
+    assert series["timestamp"] == (START + timedelta(seconds=2)).isoformat()
+    assert series["per_strike_gamma_exposure"] == [[5000.0, 3.5], [5005.0, -0.5]]
+    assert series["largest_changes"] == [[5000.0, 1.0, (START + timedelta(seconds=2)).isoformat()]]
+    # Every frame reaches the history, and NaN becomes null
+    assert series["history"]["total_gamma_exposure"] == [1.0, None, 3.0]
+    assert series["history"]["spot_price"] == [5000.0, 5001.0, 5002.0]
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def get(url, headers=None):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers or {}), timeout=5) as response:
+            return response.status, dict(response.headers), response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, dict(error.headers), b""
+
+
+def test_dashboard_serves_the_latest_frame_with_etags():
+    latest = LatestFrame()
+    server = serve_dashboard(latest, "127.0.0.1", 0)
+    base = "http://127.0.0.1:%d" % server.server_address[1]
+    try:
+        status, _, page = get(base + "/")
+        assert status == 200 and b'src="frame"' in page
+        assert get(base + "/frame")[0] == 404
+
+        latest.publish(0, b"first", "image/png", b'{"frame": 0}')
+        status, headers, body = get(base + "/frame?123")
+        assert (status, headers["Content-Type"], body) == (200, "image/png", b"first")
+        assert get(base + "/frame", {"If-None-Match": headers["ETag"]})[0] == 304
+        assert get(base + "/series.json")[2] == b'{"frame": 0}'
+
+        latest.publish(1, b"second", "image/png", b'{"frame": 1}')
+        status, _, body = get(base + "/frame", {"If-None-Match": headers["ETag"]})
+        assert (status, body) == (200, b"second")
+        assert get(base + "/missing")[0] == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_headless_plotter_renders_in_a_separate_process(tmp_path):
+    with pytest.raises(ValueError):
+        HeadlessPlotter(frame_format="gif")
+    plotter = HeadlessPlotter(frame_dir=str(tmp_path), frame_format="svg", frame_rate=1000.0, keep_frames=True)
+    try:
+        for timestamp, exposure, changes, largest, total, spot in frames(2):
+            plotter.update_plot_gamma(exposure)
+            plotter.update_plot_change_in_gamma(changes, largest)
+            plotter.update_total_gamma_exposure_plot(timestamp, total, spot)
+    finally:
+        plotter.close(timeout=60.0)
+    assert plotter.dropped == 0
+    rendered = sorted(path.name for path in tmp_path.glob("frame_*.svg"))
+    assert rendered and rendered[0] == "frame_000000.svg"
+    assert json.loads((tmp_path / "series.json").read_text())["spot_price"] == 5001.0
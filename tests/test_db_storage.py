@@ -0,0 +1,57 @@
+"""Background snapshot writer against the SQLite stand-in."""
+
+import threading
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.synthetic import SyntheticChain
+from chain_parser import ChainPayload
+from db_storage import SnapshotWriter, SQLiteConnectionPool, iter_raw_snapshots, load_contract_history
+
+START = datetime(2024, 5, 8, 14, 30, tzinfo=timezone.utc)
+
+
+def writer(path=":memory:", **kwargs):
+    return SnapshotWriter(connection_pool=SQLiteConnectionPool(str(path)), **kwargs)
+
+
+def test_close_flushes_queued_snapshots(tmp_path):
+    database = tmp_path / "snapshots.db"
+    snapshots = writer(database, normalize=False)
+    chains = SyntheticChain(strikes=20, seed=1)
+    for tick in range(5):
+        assert snapshots.submit(chains.step(), START + timedelta(seconds=tick))
+    snapshots.close()
+    assert snapshots.stored == 5
+    assert len(list(iter_raw_snapshots(SQLiteConnectionPool(str(database))))) == 5
+
+
+def test_close_does_not_hang_when_the_writer_thread_is_gone():
+    snapshots = writer(max_queue=2, normalize=False)
+    snapshots._thread = threading.Thread(target=lambda: None)
+    snapshots._thread.start()
+    snapshots._thread.join()
+    snapshots._queue.put_nowait(({}, START))
+    snapshots._queue.put_nowait(({}, START))
+    assert not snapshots.submit({}, START)
+
+    closed = threading.Thread(target=snapshots.close, daemon=True)
+    closed.start()
+    closed.join(5.0)
+    assert not closed.is_alive()
+
+
+def test_malformed_chains_are_stored_raw_without_contract_rows(tmp_path):
+    database = tmp_path / "snapshots.db"
+    snapshots = writer(database)
+    chains = SyntheticChain(strikes=20, seed=2)
+    broken = chains.step()
+    del next(iter(next(iter(broken["callExpDateMap"].values())).values()))[0]["gamma"]
+    snapshots.submit(broken, START)
+    snapshots.submit(ChainPayload(b'{"symbol": "$SPX", "callExpDateMap": {"2024-05-08:0": {"5000.0": [{"gamma": [1]}]}}}'), START + timedelta(seconds=1))
+    snapshots.submit(chains.step(), START + timedelta(seconds=2))
+    snapshots.close()
+
+    pool = SQLiteConnectionPool(str(database))
+    assert [data.get("symbol") for _, data in iter_raw_snapshots(pool)] == ["$SPX"] * 3
+    contracts = load_contract_history(pool, START - timedelta(minutes=1), START + timedelta(minutes=1))
+    assert set(contracts["fetched_at"].tolist()) == {(START + timedelta(seconds=2)).replace(tzinfo=None)}
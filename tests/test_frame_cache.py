@@ -0,0 +1,185 @@
+"""Frame cache round trips, crash safety, day rollover and warm starts."""
+
+import datetime
+import math
+import os
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import SyntheticChain
+from frame_cache import EASTERN, FORMAT_VERSION, TABLES, FrameCache
+from pipeline import GammaExposurePipeline
+from timeseries import to_datetime64
+
+NOW = datetime.datetime(2024, 5, 8, 10, 30)
+
+
+def open_cache(directory, **kwargs):
+    # NOW is long past the default retention
+    return FrameCache(str(directory), retention_days=100000, **kwargs)
+
+
+def analyze(pipeline, chains, count, start=NOW):
+    return [pipeline.analyze(chains.step(), start + timedelta(seconds=5 * tick)) for tick in range(count)]
+
+
+def assert_same_frame(cached, index, frame):
+    exposure, change = cached.per_strike(index)
+    assert cached.time[index] == to_datetime64(frame.timestamp)
+    assert cached.total_gamma_exposure[index] == frame.total_gamma_exposure
+    assert cached.spot_price[index] == frame.spot_price
+    assert exposure == frame.per_strike_gamma_exposure
+    assert change == frame.change_in_gamma_per_strike
+
+
+def test_appended_frames_load_back_unchanged(tmp_path):
+    cache = open_cache(tmp_path)
+    frames = analyze(GammaExposurePipeline(cache=cache), SyntheticChain(strikes=25, seed=21), 6)
+    cache.close()
+
+    cached = open_cache(tmp_path).load(NOW.date())
+    assert len(cached) == len(frames)
+    for index, frame in enumerate(frames):
+        assert_same_frame(cached, index, frame)
+    largest = [change for frame in frames for change in frame.largest_changes]
+    assert list(zip(cached.change_strike.tolist(), cached.change.tolist(), cached.change_time.tolist())) == largest
+    assert cached.change_frames().tolist() == [i for i, frame in enumerate(frames) for _ in frame.largest_changes]
+    # Metrics the pipeline does not compute are NaN
+    assert np.isnan(cached.exposure_gamma).all()
+    assert open_cache(tmp_path).load(NOW.date() + timedelta(days=1)) is None
+
+
+def test_index_finds_the_last_frame_at_or_before_a_time(tmp_path):
+    cache = open_cache(tmp_path)
+    analyze(GammaExposurePipeline(cache=cache), SyntheticChain(strikes=10, seed=22), 4)
+    cache.close()
+
+    cached = cache.load(NOW.date())
+    assert cached.index(NOW - timedelta(seconds=1)) == -1
+    assert cached.index(NOW) == 0
+    assert cached.index(NOW + timedelta(seconds=7)) == 1
+    assert cached.index(NOW + timedelta(seconds=15)) == 3
+    assert cached.index(NOW + timedelta(hours=1)) == 3
+
+
+def test_partially_written_frame_is_not_loaded(tmp_path):
+    cache = open_cache(tmp_path)
+    pipeline = GammaExposurePipeline(cache=cache)
+    chains = SyntheticChain(strikes=15, seed=23)
+    frames = analyze(pipeline, chains, 3)
+    counts = tmp_path / NOW.date().isoformat() / "rows.i8"
+    committed = counts.read_bytes()
+    # A process killed after writing the columns but before the counts
+    analyze(pipeline, chains, 1, start=NOW + timedelta(minutes=1))
+    cache.close()
+    counts.write_bytes(committed)
+
+    cached = open_cache(tmp_path).load(NOW.date())
+    assert len(cached) == 3
+    assert_same_frame(cached, -1, frames[-1])
+
+    # The next append overwrites the uncommitted rows
+    cache = open_cache(tmp_path)
+    later = analyze(GammaExposurePipeline(cache=cache), chains, 1, start=NOW + timedelta(minutes=2))
+    cache.close()
+    cached = cache.load(NOW.date())
+    assert len(cached) == 4
+    assert_same_frame(cached, 2, frames[-1])
+    assert_same_frame(cached, 3, later[0])
+
+
+def test_days_in_another_format_are_ignored_and_replaced(tmp_path):
+    day = tmp_path / NOW.date().isoformat()
+    day.mkdir()
+    np.array([FORMAT_VERSION - 1] + [0] * len(TABLES), dtype=np.int64).tofile(str(day / "rows.i8"))
+    (day / "stale.bin").write_bytes(b"\0" * 16)
+
+    cache = open_cache(tmp_path)
+    assert cache.load(NOW.date()) is None
+    frames = analyze(GammaExposurePipeline(cache=cache), SyntheticChain(strikes=10, seed=24), 2)
+    cache.close()
+    assert not (day / "stale.bin").exists()
+    assert_same_frame(cache.load(NOW.date()), 1, frames[1])
+
+
+def test_each_session_day_gets_its_own_files(tmp_path):
+    cache = open_cache(tmp_path)
+    pipeline = GammaExposurePipeline(cache=cache)
+    chains = SyntheticChain(strikes=10, seed=25)
+    analyze(pipeline, chains, 2)
+    # 20:30 US/Eastern on the same day, and the morning after
+    late = analyze(pipeline, chains, 1, start=EASTERN.localize(NOW.replace(hour=20)))
+    next_day = analyze(pipeline, chains, 2, start=NOW + timedelta(days=1))
+    cache.close()
+
+    assert cache.days() == [NOW.date(), NOW.date() + timedelta(days=1)]
+    assert len(cache.load(NOW.date())) == 3
+    assert_same_frame(cache.load(NOW.date()), 2, late[0])
+    cached = cache.load(NOW.date() + timedelta(days=1))
+    assert len(cached) == 2
+    assert_same_frame(cached, 0, next_day[0])
+
+
+def test_days_past_retention_are_evicted(tmp_path):
+    today = datetime.datetime.now(EASTERN).replace(hour=10, minute=30, tzinfo=None)
+    cache = FrameCache(str(tmp_path), retention_days=4)
+    pipeline = GammaExposurePipeline(cache=cache)
+    chains = SyntheticChain(strikes=10, seed=26)
+    for days_ago in (6, 3, 0):
+        analyze(pipeline, chains, 1, start=today - timedelta(days=days_ago))
+    # Starting today evicted the day six days back, but not the one being written before it
+    assert cache.days() == [(today - timedelta(days=3)).date(), today.date()]
+    cache.close()
+    (tmp_path / "notes").mkdir()
+
+    reopened = FrameCache(str(tmp_path), retention_days=2)
+    assert reopened.days() == [today.date()]
+    assert os.path.isdir(tmp_path / "notes")
+
+
+def test_warm_start_restores_the_pipeline_and_plotter(tmp_path):
+    pytest.importorskip("matplotlib")
+    import matplotlib.pyplot as plt
+
+    from plotter import RealTimeGammaPlotter
+
+    chains = SyntheticChain(strikes=20, seed=27)
+    metrics = ("gamma", "charm")
+    live = GammaExposurePipeline(exposure_metrics=metrics, cache=open_cache(tmp_path))
+    live_plotter = RealTimeGammaPlotter()
+    restored_plotter = RealTimeGammaPlotter()
+    try:
+        for frame in analyze(live, chains, 8):
+            live_plotter.record_frame(frame.timestamp, frame.largest_changes, frame.total_gamma_exposure, frame.spot_price)
+        live.cache.close()
+
+        restarted = GammaExposurePipeline(
+            plotter=restored_plotter, show=False, exposure_metrics=metrics, cache=open_cache(tmp_path)
+        )
+        assert restarted.warm_start(NOW.date()) == 8
+        assert restarted.current_gamma_exposure == live.current_gamma_exposure
+        assert restarted.change_in_gamma_per_strike == live.change_in_gamma_per_strike
+        assert restarted.exposure_totals == live.exposure_totals
+        assert all(math.isfinite(total) for total in restarted.exposure_totals.values())
+
+        for name in ("total_gamma_exposure", "spot_price"):
+            for restored, expected in zip(restored_plotter.history.series(name), live_plotter.history.series(name)):
+                np.testing.assert_array_equal(restored, expected)
+        assert list(restored_plotter.largest_change_points) == list(live_plotter.largest_change_points)
+        for name in ("positive_change_stats", "negative_change_stats"):
+            restored, expected = getattr(restored_plotter, name), getattr(live_plotter, name)
+            assert restored.values().tolist() == expected.values().tolist()
+            (restored_times, *restored_columns), (expected_times, *expected_columns) = restored.history(), expected.history()
+            np.testing.assert_array_equal(restored_times, expected_times)
+            np.testing.assert_allclose(restored_columns, expected_columns)
+
+        # The first frame after the restart is diffed against the cached one
+        restarted.plotter = None
+        data = chains.step()
+        after = NOW + timedelta(minutes=1)
+        assert restarted.analyze(data, after)[:6] == live.analyze(data, after)[:6]
+    finally:
+        plt.close(live_plotter.fig)
+        plt.close(restored_plotter.fig)
@@ -0,0 +1,109 @@
+"""Parity of the vectorized gamma exposure calculation with the per-contract loop."""
+
+import datetime
+import json
+import math
+
+import pytest
+
+from benchmarks.synthetic import SyntheticChain
+from chain_parser import parse_chain_arrays
+from gamma_analysis import calculate_gamma_exposure, flatten_option_chain
+
+NOW = datetime.datetime(2024, 5, 8, 10, 30)
+
+
+def per_contract_gamma_exposure(data, previous_gamma_exposure=None):
+    """The original per-contract implementation, kept as the reference."""
+
+    previous_gamma_exposure = previous_gamma_exposure or {}
+    per_strike = {}
+    changes = {}
+    spot_price = data.get("underlyingPrice", 0)
+
+    def add(multiplier, strike, gamma, volume):
+        try:
+            exposure = multiplier * spot_price * gamma * volume * 100 * spot_price * 0.01 / 1000000000
+            strike_value = float(strike)
+            per_strike[strike_value] = per_strike.get(strike_value, 0.0) + exposure
+            if previous_gamma_exposure.get(strike_value, 0) != 0:
+                changes[strike_value] = per_strike[strike_value] - previous_gamma_exposure[strike_value]
+        except Exception:
+            pass
+
+    for map_name, multiplier in (("callExpDateMap", 1), ("putExpDateMap", -1)):
+        for strikes in data.get(map_name, {}).values():
+            for strike, options in strikes.items():
+                for option in options:
+                    add(multiplier, strike, option["gamma"], option["totalVolume"])
+
+    largest = sorted(changes.items(), key=lambda item: abs(item[1]), reverse=True)[:5]
+    return sum(per_strike.values()), per_strike, changes, [strike for strike, _ in largest], spot_price
+
+
+def chain(spot, calls, puts=()):
+    """A one-expiry chain from ``(strike, gamma, volume)`` triples."""
+
+    def strike_map(rows):
+        strikes = {}
+        for strike, gamma, volume in rows:
+            strikes.setdefault(strike, []).append({"gamma": gamma, "totalVolume": volume})
+        return {"2024-05-08:0": strikes}
+
+    return {"symbol": "$SPX", "underlyingPrice": spot, "callExpDateMap": strike_map(calls), "putExpDateMap": strike_map(puts)}
+
+
+def assert_matches_reference(data, previous=None):
+    total, per_strike, changes, largest, spot = calculate_gamma_exposure(data, previous, NOW)
+    expected_total, expected_per_strike, expected_changes, expected_largest, expected_spot = (
+        per_contract_gamma_exposure(data, previous)
+    )
+    assert math.isfinite(total)
+    assert total == pytest.approx(expected_total, rel=1e-12, abs=1e-15)
+    assert per_strike.keys() == expected_per_strike.keys()
+    for strike, value in expected_per_strike.items():
+        assert per_strike[strike] == pytest.approx(value, rel=1e-12, abs=1e-15)
+    assert changes.keys() == expected_changes.keys()
+    for strike, value in expected_changes.items():
+        assert changes[strike] == pytest.approx(value, rel=1e-9, abs=1e-15)
+    assert [strike for strike, _, _ in largest] == expected_largest
+    assert all(timestamp == NOW for _, _, timestamp in largest)
+    assert spot == expected_spot
+
+
+@pytest.mark.parametrize("strikes, expiries", [(50, 1), (500, 3)])
+def test_synthetic_session_matches_reference(strikes, expiries):
+    chains = SyntheticChain(strikes=strikes, expiries=expiries, seed=7)
+    previous = None
+    for data in [chains.snapshot()] + [chains.step() for _ in range(5)]:
+        assert_matches_reference(data, previous)
+        previous = per_contract_gamma_exposure(data, previous)[1]
+
+
+@pytest.mark.parametrize("missing", [None, "NaN"])
+def test_contracts_without_gamma_or_volume_are_dropped(missing):
+    data = chain(
+        5000.25,
+        calls=[("5000.0", missing, 10), ("5000.0", 0.01, 20), ("5010.0", 0.02, missing)],
+        puts=[("5010.0", 0.03, 5), ("4990.0", missing, missing)],
+    )
+    assert_matches_reference(data)
+    assert set(calculate_gamma_exposure(data, None, NOW)[1]) == {5000.0, 5010.0}
+
+
+def test_integer_spot_price():
+    data = chain(5000, calls=[("5000.0", 0.01, 20), ("5005.0", 0.02, 3)], puts=[("4995.0", 0.015, 7)])
+    assert_matches_reference(data, {5000.0: 0.5, 4995.0: -0.25})
+
+
+def test_non_finite_strike_is_dropped():
+    data = chain(5000.5, calls=[("nan", 0.01, 20), ("5000.0", 0.01, 20)])
+    assert list(calculate_gamma_exposure(data, None, NOW)[1]) == [5000.0]
+
+
+def test_decoded_chain_matches_flattened_chain():
+    data = chain(5000, calls=[("5000.0", 0.01, 20), ("5010.0", None, 5)], puts=[("5000.0", "NaN", 2), ("4990.0", 0.02, 1)])
+    parsed = parse_chain_arrays(json.dumps(data).encode())
+    flattened = flatten_option_chain(data)
+    for name in ("strike", "gamma", "volume", "sign"):
+        assert getattr(parsed, name).tolist() == getattr(flattened, name).tolist()
@@ -0,0 +1,142 @@
+"""Black-Scholes greeks and exposure metrics against closed-form references."""
+
+import datetime
+import math
+
+import numpy as np
+import pytest
+
+import greek_exposure
+from benchmarks.synthetic import SyntheticChain
+from gamma_analysis import calculate_gamma_exposure
+from greek_exposure import BlackScholesGreeks, black_scholes_greeks, calculate_exposures, expiry_years
+
+
+def cdf(x):
+    return 0.5 * (1.0 + math.erf(x / math.sqrt(2.0)))
+
+
+def reference(spot, strike, years, sigma, is_call, rate=0.0, dividend=0.0):
+    """Textbook Black-Scholes delta and gamma for one contract."""
+
+    d1 = (math.log(spot / strike) + (rate - dividend + 0.5 * sigma ** 2) * years) / (sigma * math.sqrt(years))
+    carry = math.exp(-dividend * years)
+    delta = carry * (cdf(d1) if is_call else cdf(d1) - 1.0)
+    gamma = carry * math.exp(-0.5 * d1 ** 2) / math.sqrt(2.0 * math.pi) / (spot * sigma * math.sqrt(years))
+    return delta, gamma
+
+
+@pytest.fixture(params=["scipy", "fallback"])
+def norm_cdf(request, monkeypatch):
+    """Run with scipy's ``ndtr`` (when installed) and with the polynomial approximation."""
+
+    if request.param == "fallback":
+        monkeypatch.setattr(greek_exposure, "_ndtr", None)
+    elif greek_exposure._ndtr is None:
+        pytest.skip("scipy is not installed")
+    return request.param
+
+
+def greeks(spot, strike, years, sigma, is_call, rate=0.0, dividend=0.0):
+    """Greeks of one contract as floats."""
+
+    result = black_scholes_greeks(spot, [strike], [years], [sigma], [is_call], rate, dividend)
+    return BlackScholesGreeks(*(float(column[0]) for column in result))
+
+
+def test_known_values(norm_cdf):
+    # Hull, Options, Futures and Other Derivatives: S=49, K=50, r=5%, sigma=20%, 20 weeks
+    call = greeks(49.0, 50.0, 0.3846, 0.20, True, rate=0.05)
+    assert call.delta == pytest.approx(0.522, abs=5e-4)
+    assert call.gamma == pytest.approx(0.066, abs=5e-4)
+    put = greeks(49.0, 50.0, 0.3846, 0.20, False, rate=0.05)
+    assert put.delta == pytest.approx(0.522 - 1.0, abs=5e-4)
+
+    # At the money, one year, no carry: d1 = sigma / 2
+    atm = greeks(100.0, 100.0, 1.0, 0.20, True)
+    assert atm.delta == pytest.approx(cdf(0.1), abs=1e-7)
+    assert atm.gamma == pytest.approx(math.exp(-0.005) / math.sqrt(2.0 * math.pi) / 20.0, rel=1e-12)
+    # vanna = -pdf(d1) * d2 / sigma with d2 = -sigma / 2
+    assert atm.vanna == pytest.approx(math.exp(-0.005) / math.sqrt(2.0 * math.pi) * 0.5, rel=1e-12)
+
+
+@pytest.mark.parametrize("strike", [80.0, 100.0, 125.0])
+@pytest.mark.parametrize("rate, dividend", [(0.0, 0.0), (0.05, 0.0), (0.03, 0.02)])
+def test_matches_the_closed_form_and_put_call_parity(norm_cdf, strike, rate, dividend):
+    for is_call in (True, False):
+        result = greeks(100.0, strike, 0.25, 0.3, is_call, rate, dividend)
+        delta, gamma = reference(100.0, strike, 0.25, 0.3, is_call, rate, dividend)
+        assert result.delta == pytest.approx(delta, abs=1e-7)
+        assert result.gamma == pytest.approx(gamma, rel=1e-12)
+    call = greeks(100.0, strike, 0.25, 0.3, True, rate, dividend)
+    put = greeks(100.0, strike, 0.25, 0.3, False, rate, dividend)
+    assert call.delta > 0 > put.delta
+    assert call.delta - put.delta == pytest.approx(math.exp(-dividend * 0.25), abs=1e-7)
+    assert call.gamma == put.gamma > 0
+    assert call.vanna == put.vanna
+
+
+@pytest.mark.parametrize("is_call", [True, False])
+def test_vanna_and_charm_units(is_call):
+    """Vanna is d(delta)/d(sigma) per unit of volatility; charm is d(delta)/dt per year of elapsed time."""
+
+    step = 1e-5
+    base = greeks(100.0, 105.0, 0.1, 0.25, is_call, 0.04, 0.01)
+    vol_up = greeks(100.0, 105.0, 0.1, 0.25 + step, is_call, 0.04, 0.01)
+    vol_down = greeks(100.0, 105.0, 0.1, 0.25 - step, is_call, 0.04, 0.01)
+    assert base.vanna == pytest.approx((vol_up.delta - vol_down.delta) / (2 * step), rel=1e-5)
+    # Time passing shortens the time to expiry
+    later = greeks(100.0, 105.0, 0.1 - step, 0.25, is_call, 0.04, 0.01)
+    earlier = greeks(100.0, 105.0, 0.1 + step, 0.25, is_call, 0.04, 0.01)
+    assert base.charm == pytest.approx((later.delta - earlier.delta) / (2 * step), rel=1e-5)
+
+
+def test_invalid_inputs_are_nan():
+    result = black_scholes_greeks(100.0, [100.0, 100.0], [0.0, 0.5], [0.2, -1.0], [True, False])
+    assert all(np.isnan(column).all() for column in result)
+
+
+def test_expiry_years_is_measured_to_the_close():
+    as_of = datetime.datetime(2024, 5, 8, 10, 0)
+    years = expiry_years(["2024-05-08:0", "2024-05-09:1", "2024-05-07:0"], as_of)
+    assert years[0] == pytest.approx(6.0 / (365.0 * 24.0))
+    assert years[1] == pytest.approx(30.0 / (365.0 * 24.0))
+    assert years[2] == greek_exposure.MIN_YEARS
+
+
+def test_broker_gamma_exposure_matches_calculate_gamma_exposure():
+    data = SyntheticChain(strikes=30, expiries=2, seed=40).snapshot()
+    result = calculate_exposures(data, ("gamma",), datetime.datetime(2024, 5, 8, 10, 0))
+    expected = calculate_gamma_exposure(data, None, datetime.datetime(2024, 5, 8, 10, 0))
+    assert result.totals()["gamma"] == pytest.approx(expected[0], rel=1e-12)
+    by_strike = result.by_strike()
+    assert by_strike["strike"].tolist() == list(expected[1])
+    assert by_strike["gamma"] == pytest.approx(list(expected[1].values()), rel=1e-9, abs=1e-15)
+
+
+def test_unusable_broker_greeks_are_modelled():
+    as_of = datetime.datetime(2024, 5, 8, 10, 0)
+    data = SyntheticChain(strikes=10, seed=41).snapshot()
+    calls = next(iter(data["callExpDateMap"].values()))
+    strike = list(calls)[4]
+    contract = calls[strike][0]
+    modelled = dict(contract)
+
+    def gamma_exposure(option):
+        calls[strike][0] = option
+        by_strike = calculate_exposures(data, ("gamma", "gamma_oi"), as_of).by_strike()
+        return by_strike[by_strike["strike"] == float(strike)][0]
+
+    for sentinel in ("NaN", -999.0, None):
+        modelled["gamma"] = sentinel
+        row = gamma_exposure(dict(modelled))
+        assert row["gamma"] != 0.0 and math.isfinite(row["gamma"])
+        assert np.sign(row["gamma"]) == np.sign(gamma_exposure(dict(contract))["gamma"])
+
+    # Invalid volume or open interest only removes the metrics weighted by it
+    for field, metric, other in (("totalVolume", "gamma", "gamma_oi"), ("openInterest", "gamma_oi", "gamma")):
+        for bad in ("NaN", -5):
+            option = dict(contract, **{field: bad})
+            row, reference_row = gamma_exposure(option), gamma_exposure(dict(contract, **{field: 0}))
+            assert row[metric] == reference_row[metric]
+            assert row[other] == gamma_exposure(dict(contract))[other]
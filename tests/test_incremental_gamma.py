@@ -0,0 +1,91 @@
+"""Equivalence of the incremental aggregator with the full calculation."""
+
+import copy
+import datetime
+import math
+
+import pytest
+
+from benchmarks.synthetic import SyntheticChain
+from gamma_analysis import calculate_gamma_exposure, gamma_exposure_scale
+from incremental_gamma import IncrementalGammaAggregator, StrikeWeightUpdate
+
+NOW = datetime.datetime(2024, 5, 8, 10, 30)
+
+
+def assert_same_result(result, expected):
+    total, per_strike, changes, largest, spot = result
+    expected_total, expected_per_strike, expected_changes, expected_largest, expected_spot = expected
+    assert total == pytest.approx(expected_total, rel=1e-9, abs=1e-12)
+    assert list(per_strike) == list(expected_per_strike)
+    assert list(per_strike.values()) == pytest.approx(list(expected_per_strike.values()), rel=1e-9, abs=1e-12)
+    assert changes.keys() == expected_changes.keys()
+    for strike, change in expected_changes.items():
+        assert changes[strike] == pytest.approx(change, rel=1e-6, abs=1e-12)
+    assert [strike for strike, _, _ in largest] == [strike for strike, _, _ in expected_largest]
+    assert spot == expected_spot
+
+
+def drop_strikes(data, count):
+    """Remove the first ``count`` strikes of every expiry, as a re-centred chain would."""
+
+    data = copy.deepcopy(data)
+    for map_name in ("callExpDateMap", "putExpDateMap"):
+        for strike_map in data[map_name].values():
+            for strike in list(strike_map)[:count]:
+                del strike_map[strike]
+    return data
+
+
+def session(ticks=12, hold_spot_at=()):
+    chains = SyntheticChain(strikes=40, expiries=2, seed=11)
+    snapshots = []
+    for tick in range(ticks):
+        data = chains.step()
+        if tick in hold_spot_at:
+            data["underlyingPrice"] = snapshots[-1]["underlyingPrice"]
+        if tick >= 6:
+            data = drop_strikes(data, 2 if tick < 9 else 3)
+        snapshots.append(data)
+    return snapshots
+
+
+@pytest.mark.parametrize("hold_spot_at", [(), (7, 8, 10)])
+def test_snapshots_match_full_calculation(hold_spot_at):
+    aggregator = IncrementalGammaAggregator()
+    previous = None
+    for data in session(hold_spot_at=hold_spot_at):
+        expected = calculate_gamma_exposure(data, previous, NOW)
+        aggregator.apply_snapshot(data)
+        assert_same_result(aggregator.commit(NOW), expected)
+        previous = expected[1]
+
+
+def test_resync_updates_match_full_calculation():
+    aggregator = IncrementalGammaAggregator()
+    previous = None
+    for data in session():
+        expected = calculate_gamma_exposure(data, previous, NOW)
+        scale = gamma_exposure_scale(data["underlyingPrice"])
+        weights = {strike: exposure / scale for strike, exposure in expected[1].items()}
+        aggregator.apply_update(StrikeWeightUpdate(weights, data["underlyingPrice"], reset=True))
+        assert_same_result(aggregator.commit(NOW), expected)
+        previous = expected[1]
+
+
+def test_non_finite_weights_remove_the_strike(capsys):
+    aggregator = IncrementalGammaAggregator()
+    aggregator.set_spot(5000.0)
+    aggregator.set_strike_weight(5000.0, 2.0)
+    aggregator.set_strike_weight(5005.0, -1.0)
+    aggregator.update_contract("a", 5010.0, 3.0)
+    aggregator.commit(NOW)
+
+    aggregator.set_strike_weight(5005.0, math.nan)
+    aggregator.set_strike_weight(5015.0, math.inf)
+    aggregator.update_contract("a", 5010.0, -math.inf)
+    total, per_strike, _, _, _ = aggregator.commit(NOW)
+    assert list(per_strike) == [5000.0]
+    assert total == pytest.approx(2.0 * gamma_exposure_scale(5000.0))
+    # Results are returned, not printed
+    assert capsys.readouterr().out == ""
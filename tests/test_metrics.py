@@ -0,0 +1,121 @@
+"""Stage statistics and the Prometheus text export."""
+
+import json
+import math
+import re
+import urllib.request
+
+import pytest
+
+from metrics import LATENCY_BUCKETS, MetricsRegistry, prometheus_text, serve_metrics
+
+# One sample line of the text exposition format 0.0.4
+SAMPLE = re.compile(
+    r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)'
+    r'(?:\{(?P<labels>[a-zA-Z_][a-zA-Z0-9_]*="[^"\\]*"(?:,[a-zA-Z_][a-zA-Z0-9_]*="[^"\\]*")*)\})?'
+    r' (?P<value>NaN|[+-]Inf|-?[0-9.]+(?:e[+-]?[0-9]+)?)$'
+)
+FAMILY_SUFFIXES = ("_bucket", "_sum", "_count")
+
+
+def parse(text):
+    """Return ``{family: (type, [(name, labels, value)])}``, checking the format line by line."""
+
+    assert text.endswith("\n")
+    families = {}
+    current = None
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert kind in ("counter", "gauge", "histogram")
+            assert name not in families, f"{name} declared twice"
+            families[name] = (kind, [])
+            current = name
+            continue
+        match = SAMPLE.match(line)
+        assert match, f"not a sample line: {line!r}"
+        name = match["name"]
+        family = name
+        if families[current][0] == "histogram":
+            family = next((name[:-len(suffix)] for suffix in FAMILY_SUFFIXES if name.endswith(suffix)), name)
+        assert family == current, f"{name} outside its family"
+        labels = dict(re.findall(r'([a-zA-Z_][a-zA-Z0-9_]*)="([^"]*)"', match["labels"] or ""))
+        families[current][1].append((name, labels, float(match["value"])))
+    return families
+
+
+def registry_with_data():
+    ticks = iter([0.0, 0.003, 1.0, 1.2, 5.0, 25.0, 30.0, 30.0])
+    registry = MetricsRegistry(clock=lambda: next(ticks))
+    for _ in range(3):
+        with registry.time("fetch"):
+            pass
+    with pytest.raises(RuntimeError):
+        with registry.time("calculate"):
+            raise RuntimeError("boom")
+    registry["storage"].drop(2)
+    registry.increment("reconnect_failures")
+    registry.increment("reconnect_failures", 2)
+    registry.gauge("queue_depth", lambda: 7)
+    registry.gauge("exposure.vanna-total", lambda: math.nan)
+    registry.gauge("spot", lambda: math.inf)
+    registry.gauge("closed", lambda: 1 / 0)
+    return registry
+
+
+def test_prometheus_text_is_well_formed():
+    families = parse(prometheus_text(registry_with_data()))
+
+    kind, samples = families["gex_stage_seconds"]
+    assert kind == "histogram"
+    fetch = [(name, labels, value) for name, labels, value in samples if labels["stage"] == "fetch"]
+    buckets = [(labels["le"], value) for name, labels, value in fetch if name.endswith("_bucket")]
+    assert [le for le, _ in buckets] == [str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"]
+    counts = [value for _, value in buckets]
+    assert counts == sorted(counts) and counts[-1] == 3
+    # 3 ms, 200 ms and 20 s
+    assert counts[LATENCY_BUCKETS.index(0.005)] == 1 and counts[LATENCY_BUCKETS.index(0.25)] == 2
+    assert dict((name, value) for name, _, value in fetch if not name.endswith("_bucket")) == {
+        "gex_stage_seconds_sum": pytest.approx(20.203),
+        "gex_stage_seconds_count": 3,
+    }
+
+    errors = {labels["stage"]: value for _, labels, value in families["gex_stage_errors_total"][1]}
+    assert errors == {"fetch": 0, "calculate": 1, "storage": 0}
+    dropped = {labels["stage"]: value for _, labels, value in families["gex_stage_dropped_total"][1]}
+    assert dropped["storage"] == 2
+    assert families["gex_reconnect_failures_total"] == ("counter", [("gex_reconnect_failures_total", {}, 3)])
+    assert families["gex_queue_depth"][1][0][2] == 7
+    assert math.isnan(families["gex_exposure_vanna_total"][1][0][2])
+    assert families["gex_spot"][1][0][2] == math.inf
+    assert "gex_closed" not in families
+
+
+def test_empty_registry_still_exports():
+    families = parse(prometheus_text(MetricsRegistry(), prefix="test"))
+    assert families["test_stage_seconds"] == ("histogram", [])
+
+
+def test_quantiles_are_bucket_upper_bounds():
+    registry = registry_with_data()
+    snapshot = registry.snapshot()["stages"]["fetch"]
+    assert snapshot["count"] == 3
+    assert snapshot["p50_ms"] == pytest.approx(250.0)
+    assert snapshot["p99_ms"] == pytest.approx(20000.0)
+    assert snapshot["max_ms"] == pytest.approx(20000.0)
+
+
+def test_metrics_server_serves_text_and_json():
+    server = serve_metrics(registry_with_data(), "127.0.0.1", 0)
+    base = "http://127.0.0.1:%d" % server.server_address[1]
+    try:
+        with urllib.request.urlopen(base + "/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            parse(response.read().decode())
+        with urllib.request.urlopen(base + "/metrics.json", timeout=5) as response:
+            assert json.loads(response.read())["counters"] == {"reconnect_failures": 3}
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,85 @@
+"""Analysis pipeline behaviour."""
+
+import json
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import SyntheticChain
+from chain_parser import ChainPayload
+from frame_cache import FrameCache
+from pipeline import GammaExposurePipeline, PipelinedRunner
+
+NOW = datetime(2024, 5, 8, 10, 30)
+
+
+def with_unusable_greeks(data):
+    """Give a few contracts a NaN or sentinel gamma and a NaN volume, as brokers sometimes send."""
+
+    calls = next(iter(data["callExpDateMap"].values()))
+    strikes = list(calls)
+    calls[strikes[2]][0]["gamma"] = "NaN"
+    calls[strikes[4]][0]["gamma"] = -999.0
+    calls[strikes[6]][0]["totalVolume"] = None
+    return data
+
+
+def test_exposure_metrics_do_not_change_gamma_exposure():
+    chains = SyntheticChain(strikes=30, expiries=2, seed=12)
+    plain = GammaExposurePipeline()
+    with_metrics = GammaExposurePipeline(exposure_metrics=("gamma", "vanna", "charm"))
+    with_payloads = GammaExposurePipeline(exposure_metrics=("gamma", "vanna", "charm"))
+    for tick in range(4):
+        data = with_unusable_greeks(chains.step())
+        timestamp = NOW + timedelta(seconds=tick)
+        expected = plain.analyze(data, timestamp)
+        frame = with_metrics.analyze(data, timestamp)
+        assert frame[1:6] == expected[1:6]
+        assert set(frame.exposures.totals()) == {"gamma", "vanna", "charm"}
+        assert with_metrics.exposure_totals == frame.exposures.totals()
+        from_payload = with_payloads.analyze(ChainPayload(json.dumps(data).encode()), timestamp)
+        assert from_payload[1:6] == expected[1:6]
+        assert from_payload.exposures.totals() == pytest.approx(frame.exposures.totals())
+
+
+def test_exposure_totals_are_cached_and_restored(tmp_path):
+    def open_cache():
+        # NOW is long past the default retention
+        return FrameCache(str(tmp_path), retention_days=100000)
+
+    chains = SyntheticChain(strikes=20, seed=14)
+    pipeline = GammaExposurePipeline(exposure_metrics=("delta", "vanna"), cache=open_cache())
+    for tick in range(3):
+        pipeline.analyze(chains.step(), NOW + timedelta(seconds=tick))
+    pipeline.cache.close()
+
+    cached = open_cache().load(NOW.date())
+    assert cached.exposure_vanna[-1] == pipeline.exposure_totals["vanna"]
+    assert np.isnan(cached.exposure_charm).all()
+    restarted = GammaExposurePipeline(exposure_metrics=("delta", "vanna"), cache=open_cache())
+    assert restarted.warm_start(NOW.date()) == 3
+    assert restarted.exposure_totals == pipeline.exposure_totals
+
+
+def test_failing_observer_does_not_stop_the_analysis_thread():
+    chains = SyntheticChain(strikes=20, seed=13)
+    snapshots = iter([(chains.step(), NOW + timedelta(seconds=tick)) for tick in range(5)])
+    seen = []
+
+    class Failing:
+        def observe(self, frame, key):
+            raise RuntimeError("sink unavailable")
+
+    class Recording:
+        def observe(self, frame, key):
+            seen.append(frame.timestamp)
+
+    runner = PipelinedRunner(
+        lambda: next(snapshots, None), GammaExposurePipeline(), interval=0.01, observers=[Failing(), Recording()]
+    )
+    deadline = time.monotonic() + 10
+    runner.run(lambda: len(seen) < 5 and time.monotonic() < deadline)
+    assert len(seen) == 5
+    assert runner.pipeline.processed == 5
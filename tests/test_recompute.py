@@ -0,0 +1,46 @@
+"""Recomputation over full and delta-encoded archives."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import recompute
+from benchmarks.synthetic import SyntheticChain
+from db_storage import SnapshotWriter, SQLiteConnectionPool
+
+START = datetime(2024, 5, 8, 14, 30, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """The same interleaved two-symbol session stored in full and delta-encoded."""
+
+    spx = SyntheticChain(strikes=12, symbol="$SPX", seed=8)
+    spy = SyntheticChain(strikes=12, symbol="SPY", spot=520.0, strike_step=1.0, seed=9)
+    snapshots = [chain for _ in range(15) for chain in (spx.step(), spy.step())]
+    pools = {}
+    for storage_mode in ("full", "delta"):
+        database = str(tmp_path / f"{storage_mode}.db")
+        writer = SnapshotWriter(
+            connection_pool=SQLiteConnectionPool(database),
+            normalize=False,
+            storage_mode=storage_mode,
+            keyframe_interval=4,
+        )
+        for tick, data in enumerate(snapshots):
+            writer.submit(data, START + timedelta(seconds=tick))
+        writer.close()
+        pools[storage_mode] = SQLiteConnectionPool(database)
+    return pools
+
+
+@pytest.mark.parametrize("symbol", [None, "SPY"])
+def test_delta_archive_recomputes_like_the_full_archive(archive, symbol):
+    assert recompute.archive_bounds(archive["delta"], deltas=True) == recompute.archive_bounds(archive["full"])
+    partitions = recompute.partition_range(START, START + timedelta(seconds=30), timedelta(seconds=7), symbol)
+    for partition in partitions:
+        full = list(recompute.analyse_partition(archive["full"], partition))
+        delta = list(recompute.analyse_partition(archive["delta"], partition, deltas=True))
+        assert full
+        assert [row[:2] for row in delta] == [row[:2] for row in full]
+        assert [row[2][:3] for row in delta] == [row[2][:3] for row in full]
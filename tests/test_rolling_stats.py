@@ -0,0 +1,73 @@
+"""Rolling window statistics against NumPy over the same sliding window."""
+
+import math
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from rolling_stats import RollingWindowStats
+
+START = datetime(2024, 5, 8, 14, 30, tzinfo=timezone.utc)
+
+
+def test_push_matches_numpy_over_the_sliding_window():
+    window = 25
+    stats = RollingWindowStats(window)
+    # Offset values and a level shift make drift visible if the resync is skipped
+    values = np.random.default_rng(0).normal(1e6, 50.0, 4 * window + 7)
+    values[60:] += 1e4
+    for count, value in enumerate(values, start=1):
+        stats.push(value)
+        expected = values[max(0, count - window):count]
+        assert len(stats) == len(expected)
+        np.testing.assert_array_equal(stats.values(), expected)
+        assert stats.mean == pytest.approx(expected.mean(), rel=1e-12)
+        assert stats.std == pytest.approx(expected.std(), rel=1e-6, abs=1e-6)
+
+
+def test_resync_restores_the_exact_moments():
+    window = 10
+    stats = RollingWindowStats(window)
+    values = np.random.default_rng(1).normal(0.0, 1.0, 3 * window)
+    for value in values[:2 * window - 1]:
+        stats.push(value)
+    assert stats._evictions == window - 1
+    stats.push(values[2 * window - 1])
+    assert stats._evictions == 0
+    expected = values[window:2 * window]
+    assert stats.mean == expected.mean()
+    assert stats._m2 == ((expected - expected.mean()) ** 2).sum()
+
+
+def test_empty_window_is_nan():
+    stats = RollingWindowStats(3)
+    assert math.isnan(stats.mean) and math.isnan(stats.std)
+    with pytest.raises(ValueError):
+        RollingWindowStats(0)
+
+
+def test_extend_records_the_same_history_as_push():
+    window = 8
+    values = np.random.default_rng(2).normal(100.0, 3.0, 40)
+    counts = np.array([0, 1, 5, 8, 9, 20, 33, 40])
+    times = [START + timedelta(seconds=int(count)) for count in counts]
+
+    pushed = RollingWindowStats(window)
+    pushed.push(99.0)
+    pushed.record(times[0])
+    for count, value in enumerate(values, start=1):
+        pushed.push(value)
+        if count in counts:
+            pushed.record(times[list(counts).index(count)])
+
+    extended = RollingWindowStats(window)
+    extended.push(99.0)
+    extended.extend(values, times, counts)
+
+    np.testing.assert_array_equal(extended.values(), pushed.values())
+    pushed_times, pushed_means, pushed_stds = pushed.history()
+    extended_times, means, stds = extended.history()
+    np.testing.assert_array_equal(extended_times, pushed_times)
+    np.testing.assert_allclose(means, pushed_means, rtol=1e-12)
+    np.testing.assert_allclose(stds, pushed_stds, rtol=1e-6, atol=1e-9)
@@ -0,0 +1,104 @@
+"""Round trip of delta-encoded snapshots through SQLite."""
+
+import copy
+import json
+import math
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.synthetic import SyntheticChain
+from db_storage import (
+    SnapshotWriter,
+    SQLiteConnectionPool,
+    iter_delta_snapshots,
+    reconstruct_snapshot,
+)
+from snapshot_delta import SnapshotDeltaEncoder, diff_snapshot, reconstruct
+
+START = datetime(2024, 5, 8, 14, 30, tzinfo=timezone.utc)
+
+
+def store(database, snapshots, keyframe_interval=4):
+    writer = SnapshotWriter(
+        connection_pool=SQLiteConnectionPool(str(database)),
+        normalize=False,
+        storage_mode="delta",
+        keyframe_interval=keyframe_interval,
+    )
+    for tick, data in enumerate(snapshots):
+        writer.submit(data, START + timedelta(seconds=tick))
+    writer.close()
+    return SQLiteConnectionPool(str(database))
+
+
+def edited_session():
+    """Polls of one chain including added, removed and reordered strikes and int/float changes."""
+
+    chains = SyntheticChain(strikes=12, seed=3)
+    snapshots = [chains.snapshot()] + [chains.step() for _ in range(9)]
+    calls = next(iter(snapshots[3]["callExpDateMap"].values()))
+    calls["9999.0"] = calls.pop(next(iter(calls)))
+    snapshots[4]["underlyingPrice"] = 5200
+    puts = next(iter(snapshots[6]["putExpDateMap"].values()))
+    puts.pop(next(iter(puts)))
+    snapshots[7] = dict(reversed(list(snapshots[7].items())))
+    return snapshots
+
+
+def test_encoder_round_trip_is_byte_for_byte():
+    snapshots = edited_session()
+    encoder = SnapshotDeltaEncoder(keyframe_interval=4)
+    records = []
+    for data in snapshots:
+        records.append(json.loads(json.dumps(encoder.encode(data))))
+        assert json.dumps(reconstruct(records)) == json.dumps(data)
+    assert [is_keyframe for is_keyframe, _ in records] == [True, False, False, False] * 2 + [True, False]
+
+
+def test_nan_values_are_unchanged():
+    old = {"gamma": math.nan, "volume": 1}
+    assert diff_snapshot(old, {"gamma": math.nan, "volume": 1}) == {}
+    assert diff_snapshot(old, {"gamma": 0.5, "volume": 1}) == {"set": {"gamma": 0.5}}
+
+
+def test_stored_snapshots_reconstruct_byte_for_byte(tmp_path):
+    snapshots = edited_session()
+    pool = store(tmp_path / "deltas.db", snapshots)
+    for tick, data in enumerate(snapshots):
+        at = START + timedelta(seconds=tick)
+        assert json.dumps(reconstruct_snapshot(pool, at)) == json.dumps(data)
+    streamed = list(iter_delta_snapshots(pool, START + timedelta(seconds=5), START + timedelta(seconds=8)))
+    assert [fetched_at for fetched_at, _ in streamed] == [START + timedelta(seconds=tick) for tick in range(5, 9)]
+    assert [json.dumps(data) for _, data in streamed] == [json.dumps(data) for data in snapshots[5:9]]
+    assert reconstruct_snapshot(pool, START - timedelta(seconds=1)) is None
+
+
+def test_watchlist_symbols_are_encoded_separately(tmp_path):
+    spx = SyntheticChain(strikes=10, symbol="$SPX", seed=4)
+    spy = SyntheticChain(strikes=10, symbol="SPY", spot=520.0, strike_step=1.0, seed=5)
+    snapshots = [chain for _ in range(6) for chain in (spx.step(), spy.step())]
+    pool = store(tmp_path / "deltas.db", snapshots, keyframe_interval=3)
+
+    for symbol in ("$SPX", "SPY"):
+        stored = [(tick, json.dumps(data)) for tick, data in enumerate(snapshots) if data["symbol"] == symbol]
+        streamed = iter_delta_snapshots(pool, START, START + timedelta(minutes=1), symbol=symbol)
+        assert [json.dumps(data) for _, data in streamed] == [text for _, text in stored]
+        streamed = iter_delta_snapshots(pool, START + timedelta(seconds=7), START + timedelta(minutes=1), symbol=symbol)
+        assert [json.dumps(data) for _, data in streamed] == [text for tick, text in stored if tick >= 7]
+        latest = [text for tick, text in stored if tick <= 6][-1]
+        assert json.dumps(reconstruct_snapshot(pool, START + timedelta(seconds=6), symbol)) == latest
+
+    streamed = iter_delta_snapshots(pool, START + timedelta(seconds=5), START + timedelta(minutes=1))
+    assert [json.dumps(data) for _, data in streamed] == [json.dumps(data) for data in snapshots[5:]]
+
+
+def test_snapshot_that_cannot_be_serialized_does_not_corrupt_later_deltas(tmp_path):
+    chains = SyntheticChain(strikes=10, seed=6)
+    snapshots = [chains.snapshot()] + [chains.step() for _ in range(5)]
+    # Same contracts as the next poll, so a diff against it would omit them
+    broken = copy.deepcopy(snapshots[3])
+    broken["note"] = object()
+    pool = store(tmp_path / "deltas.db", snapshots[:3] + [broken] + snapshots[3:], keyframe_interval=10)
+
+    streamed = list(iter_delta_snapshots(pool, START, START + timedelta(minutes=1)))
+    assert len(streamed) == len(snapshots)
+    assert [json.dumps(data) for _, data in streamed] == [json.dumps(data) for data in snapshots]
@@ -0,0 +1,63 @@
+"""Streamed quote updates against the full calculation of the same chains."""
+
+import copy
+import datetime
+import math
+
+from benchmarks.synthetic import SyntheticChain
+from gamma_analysis import calculate_gamma_exposure
+from incremental_gamma import IncrementalGammaAggregator
+from streaming import LiveOptionChain, ticks_from_snapshots
+from tests.test_incremental_gamma import assert_same_result
+
+NOW = datetime.datetime(2024, 5, 8, 10, 30)
+
+
+def invalidate(data, strike, partial_strike):
+    """Give every contract of ``strike`` and one contract of ``partial_strike`` a NaN gamma."""
+
+    for map_name in ("callExpDateMap", "putExpDateMap"):
+        for strike_map in data[map_name].values():
+            for option in strike_map.get(strike, []):
+                option["gamma"] = math.nan
+    next(iter(data["putExpDateMap"].values()))[partial_strike][0]["totalVolume"] = math.inf
+    return data
+
+
+def session(ticks=10):
+    chains = SyntheticChain(strikes=30, expiries=2, seed=21)
+    snapshots = [chains.snapshot()]
+    strikes = list(next(iter(snapshots[0]["callExpDateMap"].values())))
+    for tick in range(ticks):
+        data = chains.step()
+        if tick >= 4:
+            invalidate(data, strikes[3], strikes[10])
+        snapshots.append(data)
+    return snapshots
+
+
+def test_streamed_quotes_match_full_calculation():
+    snapshots = session()
+    times = [NOW + datetime.timedelta(seconds=tick) for tick in range(len(snapshots))]
+    ticks = list(ticks_from_snapshots(zip(times, snapshots)))
+    assert len(ticks) == len(snapshots) - 1
+
+    live = LiveOptionChain(copy.deepcopy(snapshots[0]))
+    aggregator = IncrementalGammaAggregator()
+    aggregator.apply_update(live.take_update())
+    expected = calculate_gamma_exposure(snapshots[0], None, NOW)
+    assert_same_result(aggregator.commit(NOW), expected)
+
+    for data, record in zip(snapshots[1:], ticks):
+        live.apply(record["content"])
+        update = live.take_update()
+        aggregator.apply_update(update)
+        expected = calculate_gamma_exposure(data, expected[1], NOW)
+        assert_same_result(aggregator.commit(NOW), expected)
+        assert live.exposure().per_strike_gamma_exposure.keys() == expected[1].keys()
+        assert all(math.isfinite(weight) for weight in update.weights.values())
+
+    # A REST resync of the same chain reports no drift
+    assert live.reset(copy.deepcopy(snapshots[-1])) == 0.0
+    aggregator.apply_update(live.take_update())
+    assert_same_result(aggregator.commit(NOW), calculate_gamma_exposure(snapshots[-1], expected[1], NOW))
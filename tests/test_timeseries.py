@@ -0,0 +1,90 @@
+"""Ring buffers and the two-tier time series store."""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from timeseries import RingBuffer, TimeSeriesStore
+
+START = datetime(2024, 5, 8, 14, 30)
+
+
+def test_ring_buffer_wraps_around():
+    buffer = RingBuffer(5)
+    appended = []
+    for value in range(13):
+        buffer.append(value)
+        appended.append(value)
+        np.testing.assert_array_equal(buffer.view(), appended[-5:])
+        assert buffer.first() == appended[-5:][0] and buffer.last() == value
+    with pytest.raises(ValueError):
+        buffer.view()[0] = 1.0
+
+
+def test_ring_buffer_extend_matches_append():
+    for sizes in ([3, 4, 1], [12], [2, 9, 5]):
+        extended, appended = RingBuffer(7), RingBuffer(7)
+        values = np.arange(sum(sizes), dtype=np.float64)
+        start = 0
+        for size in sizes:
+            extended.extend(values[start:start + size])
+            start += size
+        for value in values:
+            appended.append(value)
+        np.testing.assert_array_equal(extended.view(), appended.view())
+        assert len(extended) == 7
+
+
+def fill(store, count, start=0):
+    for index in range(start, start + count):
+        store.append(START + timedelta(seconds=index), float(index), float(-index))
+
+
+def test_archive_averages_evicted_rows():
+    store = TimeSeriesStore(("a", "b"), capacity=6, downsample_factor=3, archive_capacity=4)
+    fill(store, 6 + 3 * 5)
+    # 15 evicted rows make 5 archive rows; the archive keeps the last 4
+    archived = np.arange(15, dtype=np.float64).reshape(5, 3)[1:]
+    np.testing.assert_array_equal(store.archive.column("a"), archived.mean(axis=1))
+    np.testing.assert_array_equal(store.archive.column("b"), -archived.mean(axis=1))
+    assert store.archive.times()[0] == np.datetime64(START + timedelta(seconds=3), "us")
+    np.testing.assert_array_equal(store.column("a"), np.arange(15, 21))
+
+
+def test_extend_matches_append_with_an_archive():
+    appended = TimeSeriesStore(("a", "b"), capacity=6, downsample_factor=3, archive_capacity=4)
+    extended = TimeSeriesStore(("a", "b"), capacity=6, downsample_factor=3, archive_capacity=4)
+    fill(appended, 29)
+    for start, stop in ((0, 4), (4, 5), (5, 17), (17, 29)):
+        extended.extend(
+            [START + timedelta(seconds=index) for index in range(start, stop)],
+            np.arange(start, stop, dtype=np.float64),
+            b=-np.arange(start, stop, dtype=np.float64),
+        )
+    for name in ("a", "b"):
+        np.testing.assert_array_equal(extended.column(name), appended.column(name))
+        np.testing.assert_array_equal(extended.archive.column(name), appended.archive.column(name))
+    np.testing.assert_array_equal(extended.archive.times(), appended.archive.times())
+
+
+def test_series_stitches_the_archive_and_the_pending_rows():
+    store = TimeSeriesStore(("a", "b"), capacity=6, downsample_factor=3, archive_capacity=4)
+    times, values = store.series("a")
+    assert len(times) == len(values) == 0
+    for index in range(40):
+        fill(store, 1, start=index)
+        times, values = store.series("a")
+        if not len(store.archive):
+            np.testing.assert_array_equal(values, store.column("a"))
+            continue
+        # Rows waiting to be averaged stay visible at full resolution
+        recent = np.arange(index + 1, dtype=np.float64)[-(store.capacity + store._pending_rows):]
+        np.testing.assert_array_equal(values, np.concatenate((store.archive.column("a"), recent)))
+        np.testing.assert_array_equal(store.series("b")[1], -np.concatenate((store.archive.column("a"), recent)))
+        assert len(times) == len(values) and np.all(np.diff(times) > np.timedelta64(0))
+
+    store.clear()
+    assert len(store.series("a")[0]) == 0
+    fill(store, 12)
+    np.testing.assert_array_equal(store.series("a")[1], np.concatenate((store.archive.column("a"), np.arange(6, 12))))
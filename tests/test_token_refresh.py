@@ -0,0 +1,57 @@
+"""Background token refresh and reconnecting from the token file."""
+
+import main
+from metrics import MetricsRegistry
+from token_refresh import TokenRefresher
+
+NOW = 1700000000.0
+
+
+class Session:
+    def __init__(self, access_token, expires_at):
+        self.token = {"access_token": access_token, "refresh_token": "refresh", "expires_at": expires_at}
+        self.metadata = {"token_endpoint": "https://broker.example/token"}
+
+
+class Client:
+    def __init__(self, session):
+        self.session = session
+
+
+class DeadRefreshToken(TokenRefresher):
+    def refresh(self):
+        raise RuntimeError("invalid_grant")
+
+
+def test_failed_refreshes_back_off_exponentially():
+    refresher = DeadRefreshToken(Session("a", NOW + 10), check_interval=30.0, max_backoff=200.0, clock=lambda: NOW)
+    assert [refresher._check() for _ in range(5)] == [30.0, 60.0, 120.0, 200.0, 200.0]
+    assert refresher.failures == 5
+
+    refresher.follow(Session("b", NOW + 3600))
+    assert refresher.consecutive_failures == 0
+    assert refresher._check() == 30.0
+
+
+def test_only_a_newer_unexpired_token_is_followed(monkeypatch):
+    scheduler = main.GammaExposureScheduler.__new__(main.GammaExposureScheduler)
+    scheduler.metrics = MetricsRegistry()
+    scheduler.client = Client(Session("a", NOW + 10))
+    scheduler.token_refresher = DeadRefreshToken(scheduler.client.session, clock=lambda: NOW)
+    scheduler.token_refresher.on_failure = lambda error: scheduler.reconnect()
+    original = scheduler.client
+    token_file = [Session("a", NOW + 10), Session("b", NOW - 1), Session("c", NOW + 1800)]
+    monkeypatch.setattr(scheduler, "_client_from_token_file", lambda: Client(token_file[0]))
+
+    # The token file holds the token that failed to refresh, then an expired one: keep retrying
+    for expected_delay in (30.0, 60.0):
+        assert scheduler.token_refresher._check() == expected_delay
+        assert scheduler.client is original
+        token_file.pop(0)
+
+    # A token renewed elsewhere is picked up by the same refresher
+    refresher = scheduler.token_refresher
+    assert refresher._check() == 30.0
+    assert scheduler.client.session is token_file[0]
+    assert scheduler.token_refresher is refresher and refresher.session is token_file[0]
+    assert scheduler.metrics.counters() == {"reconnects": 3, "reconnect_failures": 2}
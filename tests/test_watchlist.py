@@ -0,0 +1,97 @@
+"""Watchlist parsing, the shared token bucket and concurrent fetching."""
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from watchlist import AsyncTokenBucket, ConcurrentChainFetcher, WatchlistJob, parse_watchlist
+
+
+class ManualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_parse_watchlist():
+    assert parse_watchlist("$SPX:0-0, SPY:0-7,QQQ,,IWM:3", strike_count=20) == [
+        WatchlistJob("$SPX", 0, 0, 20),
+        WatchlistJob("SPY", 0, 7, 20),
+        WatchlistJob("QQQ", 0, 0, 20),
+        WatchlistJob("IWM", 3, 3, 20),
+    ]
+    with pytest.raises(ValueError):
+        parse_watchlist("SPY:7-0")
+
+
+def test_token_bucket_allows_a_burst_then_the_rate():
+    clock = ManualClock()
+    bucket = AsyncTokenBucket(rate=2.0, capacity=3, clock=clock)
+    assert [bucket._take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket._take() == pytest.approx(0.5)
+    clock.now += 0.25
+    assert bucket._take() == pytest.approx(0.25)
+    clock.now += 0.25
+    assert bucket._take() == 0.0
+    # Idle time refills up to the burst size only
+    clock.now += 60.0
+    assert [bucket._take() for _ in range(4)][-1] == pytest.approx(0.5)
+
+
+def test_acquire_spaces_requests_at_the_rate(monkeypatch):
+    clock = ManualClock()
+    bucket = AsyncTokenBucket(rate=4.0, capacity=1, clock=clock)
+    starts = []
+
+    async def sleep(delay):
+        clock.now += delay
+
+    async def requests():
+        for _ in range(9):
+            await bucket.acquire()
+            starts.append(clock.now)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    asyncio.run(requests())
+    assert starts == pytest.approx([index / 4.0 for index in range(9)])
+
+
+def response(symbol):
+    return SimpleNamespace(status_code=200, content=('{"symbol": "%s"}' % symbol).encode())
+
+
+def test_synchronous_clients_run_in_worker_threads():
+    threads = set()
+
+    def get_option_chain(symbol, **kwargs):
+        threads.add(threading.get_ident())
+        return response(symbol)
+
+    client = SimpleNamespace(get_option_chain=get_option_chain)
+    fetcher = ConcurrentChainFetcher(client, parse_watchlist("$SPX,SPY:0-7"), rate_limit=100.0, burst=10)
+    try:
+        results = fetcher.fetch_all()
+    finally:
+        fetcher.close()
+    assert [(job.symbol, data.data["symbol"]) for job, data, _ in results] == [("$SPX", "$SPX"), ("SPY", "SPY")]
+    assert threading.get_ident() not in threads
+
+
+def test_asynchronous_clients_are_awaited_and_failures_isolated():
+    async def get_option_chain(symbol, **kwargs):
+        if symbol == "QQQ":
+            raise ConnectionError("reset")
+        return response(symbol)
+
+    client = SimpleNamespace(get_option_chain=get_option_chain)
+    fetcher = ConcurrentChainFetcher(client, parse_watchlist("$SPX,QQQ"), rate_limit=100.0, burst=10)
+    try:
+        results = fetcher.fetch_all()
+    finally:
+        fetcher.close()
+    assert results[0][1].data["symbol"] == "$SPX"
+    assert results[1][1] is None
@@ -0,0 +1,291 @@
+"""Fixed-capacity, NumPy-backed time series containers."""
+
+from datetime import datetime, timezone
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def to_datetime64(timestamp) -> np.datetime64:
+    """Convert ``timestamp`` to a naive UTC ``datetime64[us]``.
+
+    Matplotlib interprets naive ``datetime64`` values as UTC, which matches how
+    it plots timezone-aware ``datetime`` objects.
+    """
+
+    if isinstance(timestamp, datetime) and timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(timestamp, "us")
+
+
+class RingBuffer:
+    """Fixed-capacity history backed by a preallocated NumPy array.
+
+    Every value is written twice, ``capacity`` slots apart, so the most recent
+    ``len(self)`` values are always available as one contiguous slice and
+    :meth:`view` never copies.
+    """
+
+    def __init__(self, capacity: int, dtype=np.float64):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=dtype)
+        self._total = 0
+
+    def __len__(self) -> int:
+        return min(self._total, self.capacity)
+
+    def append(self, value) -> None:
+        index = self._total % self.capacity
+        self._data[index] = value
+        self._data[index + self.capacity] = value
+        self._total += 1
+
+    def extend(self, values) -> None:
+        """Append ``values`` in order; equivalent to, but much faster than, one :meth:`append` each."""
+
+        values = np.asarray(values)
+        skipped = max(len(values) - self.capacity, 0)
+        kept = values[skipped:]
+        index = (self._total + skipped + np.arange(len(kept))) % self.capacity
+        self._data[index] = kept
+        self._data[index + self.capacity] = kept
+        self._total += len(values)
+
+    def view(self) -> np.ndarray:
+        """Return the stored values, oldest first, as a read-only view."""
+
+        size = len(self)
+        start = (self._total - size) % self.capacity
+        view = self._data[start:start + size]
+        view.flags.writeable = False
+        return view
+
+    def first(self):
+        if not self._total:
+            raise IndexError("RingBuffer is empty")
+        return self._data[(self._total - len(self)) % self.capacity]
+
+    def last(self):
+        if not self._total:
+            raise IndexError("RingBuffer is empty")
+        return self._data[(self._total - 1) % self.capacity]
+
+    def clear(self) -> None:
+        self._total = 0
+
+
+class TimeSeriesStore:
+    """Bounded time series of ``datetime64`` timestamps and ``float64`` columns.
+
+    The most recent ``capacity`` rows are kept at full resolution in ring
+    buffers, so memory stays flat however long the process runs and
+    :meth:`times`/:meth:`column` return zero-copy contiguous views.
+
+    When ``downsample_factor`` is greater than one, rows evicted from the
+    recent tier are not discarded: every ``downsample_factor`` of them are
+    averaged into one row of an archive tier holding up to
+    ``archive_capacity`` decimated rows.  :meth:`series` stitches both tiers
+    together for plotting.  The stitched arrays are rebuilt only when the
+    archive gains a row (once per ``downsample_factor`` appends); rows
+    appended in between are copied onto their end.
+
+    Parameters
+    ----------
+    columns:
+        Names of the float columns.
+    capacity:
+        Number of full-resolution rows retained.
+    downsample_factor, archive_capacity:
+        Decimation ratio and size of the optional archive tier.
+    """
+
+    def __init__(
+        self,
+        columns: Sequence[str],
+        capacity: int = 20000,
+        downsample_factor: int = 1,
+        archive_capacity: int = 0,
+    ):
+        self.columns = tuple(columns)
+        self.capacity = capacity
+        self._times = RingBuffer(capacity, dtype="datetime64[us]")
+        self._values: Dict[str, RingBuffer] = {name: RingBuffer(capacity) for name in self.columns}
+
+        self.downsample_factor = downsample_factor
+        self.archive: Optional[TimeSeriesStore] = None
+        if downsample_factor > 1 and archive_capacity > 0:
+            self.archive = TimeSeriesStore(self.columns, archive_capacity)
+            self._pending_time: Optional[np.datetime64] = None
+            self._pending_sums = np.zeros(len(self.columns))
+            self._pending_counts = np.zeros(len(self.columns))
+            self._pending_rows = 0
+        # (archive rows, rows appended) when built, stitched length and arrays; see ``series``
+        self._stitched: Optional[Tuple[int, int, int, Dict[str, np.ndarray]]] = None
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+    def append(self, timestamp, *values: float, **named_values: float) -> None:
+        """Append one row; values are given positionally or by column name.
+
+        Columns left out are stored as ``NaN``.
+        """
+
+        if len(values) > len(self.columns):
+            raise ValueError(f"Expected at most {len(self.columns)} values, got {len(values)}")
+        row = dict(zip(self.columns, values))
+        for name, value in named_values.items():
+            if name not in self._values:
+                raise KeyError(f"Unknown column {name!r}")
+            row[name] = value
+
+        if self.archive is not None and len(self._times) == self.capacity:
+            self._archive_oldest()
+
+        self._times.append(to_datetime64(timestamp))
+        for name, buffer in self._values.items():
+            buffer.append(row.get(name, np.nan))
+
+    def extend(self, timestamps, *columns, **named_columns) -> None:
+        """Append many rows at once, with the same result as :meth:`append` per row.
+
+        ``timestamps`` is a sequence of datetimes or a ``datetime64`` array;
+        columns are equal-length arrays given positionally or by name and,
+        as with :meth:`append`, columns left out are ``NaN``.
+        """
+
+        if isinstance(timestamps, np.ndarray) and np.issubdtype(timestamps.dtype, np.datetime64):
+            times = timestamps.astype("datetime64[us]")
+        else:
+            times = np.array([to_datetime64(timestamp) for timestamp in timestamps], dtype="datetime64[us]")
+        if len(columns) > len(self.columns):
+            raise ValueError(f"Expected at most {len(self.columns)} columns, got {len(columns)}")
+        given = dict(zip(self.columns, columns))
+        for name, values in named_columns.items():
+            if name not in self._values:
+                raise KeyError(f"Unknown column {name!r}")
+            given[name] = values
+        values = np.full((len(times), len(self.columns)), np.nan)
+        for position, name in enumerate(self.columns):
+            if name in given:
+                values[:, position] = given[name]
+
+        overflow = len(self) + len(times) - self.capacity
+        if self.archive is not None and overflow > 0:
+            # The rows pushed out of the recent tier: the oldest stored ones, then new ones
+            current = np.column_stack([self._values[name].view() for name in self.columns])
+            evicted_times = np.concatenate((self._times.view(), times))[:overflow]
+            evicted = np.concatenate((current.reshape(-1, len(self.columns)), values))[:overflow]
+            self._archive_rows(evicted_times, evicted)
+
+        self._times.extend(times)
+        for position, buffer in enumerate(self._values.values()):
+            buffer.extend(values[:, position])
+
+    def _archive_rows(self, times: np.ndarray, values: np.ndarray) -> None:
+        """Feed evicted rows to the archive tier in bulk (see :meth:`_archive_oldest`)."""
+
+        factor = self.downsample_factor
+        start = 0
+        # Complete a partially filled archive row first
+        while start < len(times) and self._pending_rows:
+            self._add_pending(times[start], values[start])
+            start += 1
+        groups = (len(times) - start) // factor
+        if groups:
+            block = values[start:start + groups * factor].reshape(groups, factor, -1)
+            finite = np.isfinite(block)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = np.where(finite, block, 0.0).sum(axis=1) / finite.sum(axis=1)
+            self.archive.extend(times[start:start + groups * factor:factor], *means.T)
+            start += groups * factor
+        for index in range(start, len(times)):
+            self._add_pending(times[index], values[index])
+
+    def _archive_oldest(self) -> None:
+        evicted = np.array([self._values[name].first() for name in self.columns])
+        self._add_pending(self._times.first(), evicted)
+
+    def _add_pending(self, timestamp: np.datetime64, evicted: np.ndarray) -> None:
+        if self._pending_rows == 0:
+            self._pending_time = timestamp
+        finite = np.isfinite(evicted)
+        self._pending_sums[finite] += evicted[finite]
+        self._pending_counts[finite] += 1
+        self._pending_rows += 1
+
+        if self._pending_rows == self.downsample_factor:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = self._pending_sums / self._pending_counts
+            self.archive.append(self._pending_time, *means.tolist())
+            self._pending_sums[:] = 0.0
+            self._pending_counts[:] = 0.0
+            self._pending_rows = 0
+
+    def times(self) -> np.ndarray:
+        """Zero-copy view of the full-resolution timestamps, oldest first."""
+
+        return self._times.view()
+
+    def column(self, name: str) -> np.ndarray:
+        """Zero-copy view of the full-resolution values of ``name``, oldest first."""
+
+        return self._values[name].view()
+
+    def last(self, name: str) -> float:
+        return float(self._values[name].last())
+
+    def series(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(times, values)`` across the archive and recent tiers."""
+
+        if self.archive is None or not len(self.archive):
+            return self.times(), self.column(name)
+        stitched = self._stitch()
+        length = stitched[2]
+        return stitched[3]["_times"][:length], stitched[3][name][:length]
+
+    def _stitch(self) -> Tuple[int, int, int, Dict[str, np.ndarray]]:
+        archived, appended = self.archive._times._total, self._times._total
+        if self._stitched is not None and self._stitched[0] == archived:
+            _, built, length, arrays = self._stitched
+            added = appended - built
+            if 0 <= added <= len(self) and length + added <= len(arrays["_times"]):
+                # Rows evicted since the build stay visible until they are archived
+                if added:
+                    arrays["_times"][length:length + added] = self._times.view()[-added:]
+                    for name, buffer in self._values.items():
+                        arrays[name][length:length + added] = buffer.view()[-added:]
+                self._stitched = (archived, appended, length + added, arrays)
+                return self._stitched
+
+        length = len(self.archive) + len(self)
+        size = length + self.downsample_factor
+        arrays = {"_times": np.empty(size, dtype="datetime64[us]")}
+        arrays["_times"][:length] = np.concatenate((self.archive.times(), self.times()))
+        for name in self.columns:
+            arrays[name] = np.empty(size)
+            arrays[name][:length] = np.concatenate((self.archive.column(name), self.column(name)))
+        self._stitched = (archived, appended, length, arrays)
+        return self._stitched
+
+    def clear(self) -> None:
+        self._times.clear()
+        for buffer in self._values.values():
+            buffer.clear()
+        if self.archive is not None:
+            self.archive.clear()
+            self._stitched = None
+            self._pending_sums[:] = 0.0
+            self._pending_counts[:] = 0.0
+            self._pending_rows = 0
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the preallocated buffers, including the archive."""
+
+        total = self._times._data.nbytes + sum(buffer._data.nbytes for buffer in self._values.values())
+        if self.archive is not None:
+            total += self.archive.nbytes
+        return total
@@ -0,0 +1,164 @@
+"""Background refresh of the broker's OAuth access token.
+
+``schwab-py`` and ``tda-api`` clients refresh an expired access token inside
+the request that notices it, so one poll every half hour pays for a token
+round trip.  :class:`TokenRefresher` watches the token of the client's
+``authlib`` session from a daemon thread and refreshes it ``margin`` seconds
+before it expires.  The refresh uses a separate synchronous ``authlib``
+client (the session may be asynchronous and bound to another thread's
+event loop), installs the new token on the session and hands it to the
+session's ``update_token`` hook, which persists the token file.
+"""
+
+import threading
+import time
+from typing import Callable, Optional
+
+
+class TokenRefresher:
+    """Keep ``session.token`` fresh ahead of its expiry.
+
+    Parameters
+    ----------
+    session:
+        The ``authlib`` OAuth2 session of a broker client (``client.session``).
+    margin:
+        Refresh once the access token expires within this many seconds.
+    check_interval:
+        Seconds between expiry checks and before the first retry of a failed
+        refresh.
+    max_backoff:
+        Upper bound of the retry delay, which doubles with every consecutive
+        failure so a revoked refresh token is not hammered.
+    on_failure:
+        Called with the exception when a refresh fails, e.g. to pick up a
+        token renewed elsewhere with :meth:`follow`.
+    """
+
+    def __init__(
+        self,
+        session,
+        margin: float = 300.0,
+        check_interval: float = 30.0,
+        max_backoff: float = 600.0,
+        token_endpoint: Optional[str] = None,
+        on_failure: Optional[Callable[[Exception], None]] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.session = session
+        self.margin = margin
+        self.check_interval = check_interval
+        self.max_backoff = max_backoff
+        self.token_endpoint = token_endpoint or session.metadata.get("token_endpoint")
+        self.on_failure = on_failure
+        self.clock = clock
+        self.refreshed = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self._client = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def supports(client) -> bool:
+        """Return whether ``client`` has a session whose token can be refreshed here."""
+
+        session = getattr(client, "session", None)
+        token = getattr(session, "token", None)
+        return (
+            bool(token)
+            and "expires_at" in token
+            and "refresh_token" in token
+            and bool(getattr(session, "metadata", {}).get("token_endpoint"))
+        )
+
+    def seconds_left(self) -> float:
+        """Seconds until the current access token expires."""
+
+        return float(self.session.token["expires_at"]) - self.clock()
+
+    def is_newer(self, token: Optional[dict]) -> bool:
+        """Return whether ``token`` is another access token than the session's and not yet expired."""
+
+        if not token or "expires_at" not in token or "refresh_token" not in token:
+            return False
+        return (
+            token.get("access_token") != self.session.token.get("access_token")
+            and float(token["expires_at"]) > self.clock()
+        )
+
+    def follow(self, session) -> None:
+        """Keep the token of ``session`` fresh from now on, e.g. after the client was recreated."""
+
+        with self._lock:
+            self.session = session
+            self.consecutive_failures = 0
+
+    def start(self) -> "TokenRefresher":
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="token-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop refreshing; may be called from ``on_failure`` on the refresh thread itself."""
+
+        self._stop.set()
+        if self._thread is not None:
+            if self._thread is not threading.current_thread():
+                self._thread.join(timeout)
+            self._thread = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._check()):
+            pass
+
+    def _check(self) -> float:
+        """Refresh the token if it is due; return the seconds to wait before the next check."""
+
+        if self.seconds_left() <= self.margin:
+            try:
+                self.refresh()
+            except Exception as e:
+                self.failures += 1
+                self.consecutive_failures += 1
+                print(f"Failed to refresh the access token: {e}")
+                if self.on_failure is not None:
+                    self.on_failure(e)
+                if self.consecutive_failures:  # ``on_failure`` may have followed a new session
+                    return min(self.check_interval * 2.0 ** (self.consecutive_failures - 1), self.max_backoff)
+            else:
+                self.consecutive_failures = 0
+        # Wake up in time for the next refresh, checking at least every check_interval
+        return min(self.check_interval, max(self.seconds_left() - self.margin, 1.0))
+
+    def refresh(self) -> dict:
+        """Refresh the access token now and install it on the session."""
+
+        with self._lock:
+            if self._client is None:
+                # Installed with the broker SDKs; imported here to keep startup fast
+                from authlib.integrations.httpx_client import OAuth2Client
+
+                self._client = OAuth2Client(
+                    self.session.client_id,
+                    self.session.client_secret,
+                    token_endpoint_auth_method=getattr(
+                        self.session, "token_endpoint_auth_method", "client_secret_basic"
+                    ),
+                )
+            current = self.session.token
+            token = self._client.refresh_token(self.token_endpoint, refresh_token=current["refresh_token"])
+            # Some token endpoints only return a new refresh token when rotating it
+            token.setdefault("refresh_token", current["refresh_token"])
+            self.session.token = token
+            update_token = getattr(self.session, "update_token", None)
+            if update_token is not None:
+                update_token(token, refresh_token=current["refresh_token"])
+            self.refreshed += 1
+            return token
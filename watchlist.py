@@ -0,0 +1,197 @@
+"""Concurrent option chain fetching for a watchlist of symbols and expiry ranges.
+
+A watchlist is a list of :class:`WatchlistJob` entries, each naming an
+underlying and a range of expirations expressed in days from the current
+session (``0`` is 0DTE).  :class:`ConcurrentChainFetcher` fetches every job
+in one poll with ``asyncio``, sharing an :class:`AsyncTokenBucket` so the
+broker's rate limit is respected however many jobs are configured.
+
+Both the asynchronous clients of schwab-py/tda-api (``asyncio=True``) and the
+regular synchronous clients are supported; synchronous calls run in worker
+threads so they still overlap.
+"""
+
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import pytz
+
+from chain_parser import ChainPayload
+
+
+@dataclass(frozen=True)
+class WatchlistJob:
+    """One option chain request repeated on every poll.
+
+    ``min_days``/``max_days`` select expirations relative to the current
+    session date, e.g. ``0, 0`` for 0DTE or ``0, 35`` for everything through
+    the next monthly expiration.
+    """
+
+    symbol: str
+    min_days: int = 0
+    max_days: int = 0
+    strike_count: int = 50
+
+    @property
+    def key(self) -> str:
+        return f"{self.symbol}:{self.min_days}-{self.max_days}"
+
+    def date_range(self, session_date: date) -> Tuple[date, date]:
+        return session_date + timedelta(days=self.min_days), session_date + timedelta(days=self.max_days)
+
+
+def parse_watchlist(spec: str, strike_count: int = 50) -> List[WatchlistJob]:
+    """Parse ``"$SPX:0-0,SPY:0-7,QQQ"`` into jobs (a missing range means 0DTE)."""
+
+    jobs = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        symbol, _, days = entry.rpartition(":") if ":" in entry else (entry, "", "")
+        min_days, max_days = 0, 0
+        if days:
+            low, _, high = days.partition("-")
+            min_days = int(low)
+            max_days = int(high) if high else min_days
+        if max_days < min_days:
+            raise ValueError(f"Invalid expiry range in watchlist entry {entry!r}")
+        jobs.append(WatchlistJob(symbol, min_days, max_days, strike_count))
+    return jobs
+
+
+def session_date(now: datetime) -> date:
+    """Return the date whose expirations are current at ``now`` (US/Eastern)."""
+
+    # If it's Friday after 4 PM, use the next Monday
+    if now.weekday() == 4 and now.hour >= 16:
+        return (now + timedelta(days=3)).date()
+    # Otherwise, use the next day's date if it's after 4 PM, or today's date if it's before 4 PM
+    return now.date() + timedelta(days=1 if now.hour >= 16 else 0)
+
+
+class AsyncTokenBucket:
+    """Token bucket limiting request starts to ``rate`` per second with bursts of ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        if rate <= 0 or capacity < 1:
+            raise ValueError("rate must be positive and capacity at least 1")
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Consume a token if available; otherwise return the seconds to wait."""
+
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    async def acquire(self) -> None:
+        while True:
+            delay = self._take()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+
+FetchResult = Tuple[WatchlistJob, Optional[ChainPayload], datetime]
+
+
+class ConcurrentChainFetcher:
+    """Fetch the option chains of every watchlist job concurrently.
+
+    Parameters
+    ----------
+    client:
+        Broker client exposing ``get_option_chain``; coroutine methods are
+        awaited directly and synchronous ones run in threads.
+    jobs:
+        The watchlist.
+    rate_limit, burst:
+        Requests per second and burst size shared by all jobs.  Schwab allows
+        120 market data requests per minute, hence the default of 2/s.
+    contract_type:
+        Value passed as ``contract_type`` (usually ``Options.ContractType.ALL``).
+    """
+
+    def __init__(
+        self,
+        client,
+        jobs: Sequence[WatchlistJob],
+        rate_limit: float = 2.0,
+        burst: int = 4,
+        contract_type: Any = None,
+        timezone: str = "US/Eastern",
+    ):
+        self.client = client
+        self.jobs = list(jobs)
+        self.limiter = AsyncTokenBucket(rate_limit, burst)
+        self.contract_type = contract_type
+        self.timezone = pytz.timezone(timezone)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def _fetch_job(self, job: WatchlistJob, now: datetime) -> FetchResult:
+        from_date, to_date = job.date_range(session_date(now))
+        kwargs = {
+            "symbol": job.symbol,
+            "from_date": from_date,
+            "to_date": to_date,
+            "strike_count": job.strike_count,
+        }
+        if self.contract_type is not None:
+            kwargs["contract_type"] = self.contract_type
+
+        await self.limiter.acquire()
+        fetched_at = datetime.now(self.timezone)
+        try:
+            method = self.client.get_option_chain
+            if inspect.iscoroutinefunction(method):
+                response = await method(**kwargs)
+            else:
+                # ``asyncio.to_thread`` needs Python 3.9
+                loop = asyncio.get_running_loop()
+                response = await loop.run_in_executor(None, functools.partial(method, **kwargs))
+        except Exception as e:
+            print(f"An error occurred fetching {job.key}: {e}")
+            return job, None, fetched_at
+        if response.status_code != 200:
+            print(f"Failed to fetch data for {job.key}: {response.status_code}")
+            return job, None, fetched_at
+        # Decoded lazily by the consumers; storage keeps the bytes as they are
+        return job, ChainPayload(response.content), fetched_at
+
+    async def fetch_all_async(self) -> List[FetchResult]:
+        now = datetime.now(self.timezone)
+        return list(await asyncio.gather(*(self._fetch_job(job, now) for job in self.jobs)))
+
+    def fetch_all(self) -> List[FetchResult]:
+        """Fetch every job once, blocking until all have completed.
+
+        A single event loop is reused across calls because asynchronous broker
+        clients keep connections bound to the loop they were first used on.
+        """
+
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(self.fetch_all_async())
+
+    def close(self) -> None:
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.close()
+        self._loop = None